@@ -0,0 +1,42 @@
+"""created and updated
+
+Revision ID: 7d2f0c9a4b1e
+Revises: 52136d73dbf9
+Create Date: 2026-10-18 09:12:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2f0c9a4b1e'
+down_revision = '52136d73dbf9'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('authors', 'books')
+
+
+def upgrade():
+    for table in TABLES:
+        for column in ('created', 'updated'):
+            op.add_column(
+                table, sa.Column(column, sa.DateTime(), nullable=True)
+            )
+        op.execute(
+            sa.table(table, sa.column('created'), sa.column('updated'))
+            .update()
+            .values(
+                created=sa.func.current_timestamp(),
+                updated=sa.func.current_timestamp(),
+            )
+        )
+
+
+def downgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated')
+            batch_op.drop_column('created')
@@ -0,0 +1,62 @@
+"""books_authors primary key and reverse index
+
+Revision ID: c4e1a9d2b7f3
+Revises: 7d2f0c9a4b1e
+Create Date: 2026-10-18 14:37:05.126384
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e1a9d2b7f3'
+down_revision = '7d2f0c9a4b1e'
+branch_labels = None
+depends_on = None
+
+
+def copy_links(source, target, where=''):
+    """Copy the distinct links of one association table to another."""
+    op.execute(
+        'INSERT INTO {target} (book_id, author_id) '
+        'SELECT DISTINCT book_id, author_id FROM {source} {where}'.format(
+            source=source, target=target, where=where
+        )
+    )
+
+
+def upgrade():
+    # The table is rebuilt rather than altered, so that duplicate and
+    # incomplete links, which the primary key forbids, are dropped.
+    op.create_table('books_authors_keyed',
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['author_id'], ['authors.id'], ),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ),
+    sa.PrimaryKeyConstraint('book_id', 'author_id', name='pk_books_authors')
+    )
+    copy_links(
+        'books_authors', 'books_authors_keyed',
+        'WHERE book_id IS NOT NULL AND author_id IS NOT NULL',
+    )
+    op.drop_table('books_authors')
+    op.rename_table('books_authors_keyed', 'books_authors')
+    op.create_index(
+        'ix_books_authors_author_id',
+        'books_authors',
+        ['author_id', 'book_id'],
+    )
+
+
+def downgrade():
+    op.drop_index('ix_books_authors_author_id', table_name='books_authors')
+    op.create_table('books_authors_unkeyed',
+    sa.Column('author_id', sa.Integer(), nullable=True),
+    sa.Column('book_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['authors.id'], ),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], )
+    )
+    copy_links('books_authors', 'books_authors_unkeyed')
+    op.drop_table('books_authors')
+    op.rename_table('books_authors_unkeyed', 'books_authors')
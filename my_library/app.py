@@ -5,16 +5,27 @@ To run Flask directly, ``export FLASK_APP=my_library.main:app``
 
 from __future__ import absolute_import, unicode_literals
 
+from collections import OrderedDict
 from inspect import isclass
 
 from flask import Flask
 from flask_migrate import Migrate
-from flask_sqlalchemy import SQLAlchemy
 
+from . import cli
+from .compression import Compression
 from .config import Config, ConfVar
 from .db import models
+from .db.identity import IdentityCache
+from .db.missing import MissingIds
+from .db.pool import pool_options
+from .db.routing import Router, RoutingSQLAlchemy, replica_binds
+from .db.sqlite import sqlite_pragmas
+from .db.timing import QueryTimer
 from .db.models.base import Base
+from .json_backend import EXTENSION as JSON_BACKEND, get_backend
+from .metrics import Metrics
 from .resources import api
+from .resources.cache import ResponseCache
 from .spec.auto import autospec_model
 
 
@@ -43,6 +54,13 @@ def get_db_conf(load=True):
         ConfVar('host', 'local/local.sqlite', type_=str),
         ConfVar('port', None, type_=str),
         ConfVar('engine', 'sqlite'),
+        ConfVar('replica_hosts', None, type_=str),
+        ConfVar('replica_window', 5.0),
+        ConfVar('pool_size', None, type_=int),
+        ConfVar('pool_max_overflow', None, type_=int),
+        ConfVar('pool_recycle', None, type_=int),
+        ConfVar('pool_timeout', None, type_=float),
+        ConfVar('pool_pre_ping', False),
         prefix='DB'
     )
     if load:
@@ -50,6 +68,50 @@ def get_db_conf(load=True):
     return conf
 
 
+def get_sqlite_conf(load=True):
+    """Return a SQLite tuning configuration instance.
+
+    Pragmas left unset take the values of the ``profile``, if any.
+
+    :param bool load: if True, load the config before returning
+    :returns: an optionally loaded config with SQLite values
+    :rtype: .config.Config
+    """
+    conf = Config(
+        ConfVar('profile', 'default'),
+        ConfVar('journal_mode', None, type_=str),
+        ConfVar('synchronous', None, type_=str),
+        ConfVar('mmap_size', None, type_=int),
+        ConfVar('cache_size', None, type_=int),
+        ConfVar('busy_timeout', None, type_=int),
+        ConfVar('read_only', False),
+        prefix='SQLITE'
+    )
+    if load:
+        conf.load()
+    return conf
+
+
+def get_cache_conf(load=True):
+    """Return a response cache configuration instance.
+
+    :param bool load: if True, load the config before returning
+    :returns: an optionally loaded config with response cache values
+    :rtype: .config.Config
+    """
+    conf = Config(
+        ConfVar('enabled', False),
+        ConfVar('size', 1024),
+        ConfVar('ttl', 60.0),
+        ConfVar('identity_size', 0),
+        ConfVar('missing_size', 0),
+        prefix='CACHE'
+    )
+    if load:
+        conf.load()
+    return conf
+
+
 def get_flask_conf(load=True):
     """Return a Flask configuration instance.
 
@@ -76,6 +138,8 @@ def get_logging_conf(load=True):
     """
     conf = Config(
         ConfVar('LEVEL', 'INFO'),
+        ConfVar('SLOW_QUERY_MS', None, type_=float),
+        ConfVar('SERVER_TIMING', True),
         prefix='LOG'
     )
     if load:
@@ -83,17 +147,119 @@ def get_logging_conf(load=True):
     return conf
 
 
-def setup_database(app, db_conf):
-    """Create the DB engine and scoped session, autospec models."""
+def get_compression_conf(load=True):
+    """Return a response compression configuration instance.
+
+    :param bool load: if True, load the config before returning
+    :returns: an optionally loaded config with compression values
+    :rtype: .config.Config
+    """
+    conf = Config(
+        ConfVar('level', 6),
+        ConfVar('min_size', 500),
+        ConfVar('cache_size', 256),
+        prefix='COMPRESS'
+    )
+    if load:
+        conf.load()
+    return conf
+
+
+def get_metrics_conf(load=True):
+    """Return a metrics configuration instance.
+
+    :param bool load: if True, load the config before returning
+    :returns: an optionally loaded config with metrics values
+    :rtype: .config.Config
+    """
+    conf = Config(
+        ConfVar('enabled', True),
+        ConfVar('path', '/metrics'),
+        prefix='METRICS'
+    )
+    if load:
+        conf.load()
+    return conf
+
+
+def get_json_conf(load=True):
+    """Return a JSON encoding configuration instance.
+
+    :param bool load: if True, load the config before returning
+    :returns: an optionally loaded config with JSON values
+    :rtype: .config.Config
+    """
+    conf = Config(
+        ConfVar('backend', 'auto'),
+        prefix='JSON'
+    )
+    if load:
+        conf.load()
+    return conf
+
+
+def setup_database(app, db_conf, sqlite_conf=None):
+    """Create the DB engine and scoped session, autospec models.
+
+    If ``replica_hosts`` are configured, read-only queries of resources
+    are routed to them (see :mod:`.db.routing`). The ``pool_*``
+    settings configure the connection pools of server databases (see
+    :mod:`.db.pool`).
+
+    SQLite connections are tuned by the SQLite config (see
+    :mod:`.db.sqlite`). If it's ``read_only`` and there are no
+    replicas, read-only queries of resources are routed to read-only
+    connections to the same database file.
+
+    Model specs encode JSON with the app's JSON backend, if it has one
+    (see :mod:`.json_backend`).
+    """
+    if sqlite_conf is None:
+        sqlite_conf = get_sqlite_conf()
     app.config['SQLALCHEMY_DATABASE_URI'] = db_uri(db_conf)
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    db = SQLAlchemy(app, metadata=Base.metadata)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = pool_options(db_conf)
+    replicas = replica_uris(db_conf)
+    window = db_conf.get('replica_window')
+    read_only = (
+        sqlite_conf.get('read_only')
+        and db_conf.get('engine') == 'sqlite'
+        and not replicas
+    )
+    if read_only:
+        replicas = [app.config['SQLALCHEMY_DATABASE_URI']]
+        window = 0.0
+    app.config['SQLALCHEMY_BINDS'] = replica_binds(replicas)
+    pragmas = sqlite_pragmas(sqlite_conf)
+    app.config['SQLITE_PRAGMAS'] = {
+        bind: pragmas
+        for bind in [None] + list(app.config['SQLALCHEMY_BINDS'])
+    }
+    if read_only:
+        for bind in app.config['SQLALCHEMY_BINDS']:
+            app.config['SQLITE_PRAGMAS'][bind] = OrderedDict(
+                pragmas, query_only='ON'
+            )
+    db = RoutingSQLAlchemy(app, metadata=Base.metadata)
+
+    if replicas:
+        Router(
+            sorted(app.config['SQLALCHEMY_BINDS']), window=window
+        ).init_app(app)
+
+        @app.teardown_request
+        def write_to_primary(exc):
+            db.session().write_to_primary()
 
     for name, model in vars(models).items():
         if name.startswith('_'):
             continue
         if isclass(model) and issubclass(model, Base):
-            autospec_model(model, db.session)
+            autospec_model(
+                model,
+                db.session,
+                json_module=app.extensions.get(JSON_BACKEND),
+            )
 
     Migrate(app=app, db=db)
 
@@ -105,18 +271,43 @@ def create_app():
     app = Flask(__name__)
 
     db_conf = get_db_conf()
+    sqlite_conf = get_sqlite_conf()
+    cache_conf = get_cache_conf()
     flask_conf = get_flask_conf()
     logging_conf = get_logging_conf()
+    compression_conf = get_compression_conf()
+    metrics_conf = get_metrics_conf()
+    json_conf = get_json_conf()
 
     for key, value in flask_conf:
         app.config[key] = value
 
     app.config['db'] = db_conf
+    app.config['sqlite'] = sqlite_conf
+    app.config['cache'] = cache_conf
     app.config['logging'] = logging_conf
+    app.config['compression'] = compression_conf
+    app.config['metrics'] = metrics_conf
+    app.config['json'] = json_conf
+
+    get_backend(json_conf.get('backend')).init_app(app)
 
-    app.db = setup_database(app, db_conf)
+    app.db = setup_database(app, db_conf, sqlite_conf)
+    QueryTimer.from_conf(logging_conf).init_app(app, app.db.flask_sqla)
 
     api.register(app)
+    cli.register(app)
+    if metrics_conf.get('enabled'):
+        Metrics.from_conf(metrics_conf).init_app(app)
+
+    if cache_conf.get('enabled'):
+        ResponseCache.from_conf(cache_conf).init_app(app)
+    if cache_conf.get('identity_size') > 0:
+        IdentityCache.from_conf(cache_conf).init_app(app)
+    if cache_conf.get('missing_size') > 0:
+        MissingIds.from_conf(cache_conf).init_app(app)
+
+    Compression.from_conf(compression_conf).init_app(app)
 
     return app
 
@@ -130,3 +321,18 @@ def db_uri(db_conf):
     return '{engine}://{user}:{password}@{host}:{port}/{name}'.format(
         **dict(db_conf)
     )
+
+
+def replica_uris(db_conf):
+    """Return the URIs of the replica databases, given the database config.
+
+    Replicas are configured as a comma-delimited list of hosts, and
+    share all other settings with the primary.
+    """
+    hosts = db_conf.get('replica_hosts')
+    if not hosts:
+        return []
+    return [
+        db_uri(dict(dict(db_conf), host=host.strip()))
+        for host in hosts.split(',') if host.strip()
+    ]
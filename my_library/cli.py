@@ -0,0 +1,190 @@
+"""Flask CLI commands, registered alongside Flask-Migrate's ``db``."""
+
+from __future__ import absolute_import, division, unicode_literals
+
+import gzip
+import io
+from timeit import default_timer
+
+import click
+from flask import current_app as app
+from flask.cli import with_appcontext
+
+from .db.bulk import CREATED, INVALID, UPDATED
+from .db.models.base import Base
+from .export import FORMATS, Exporter
+from .importer import Importer, read_csv, read_ndjson
+
+
+def get_model(name):
+    """Return the model with the given class or table name.
+
+    :raises click.BadParameter: if there is no such model
+    """
+    models = {}
+    for model in vars(app.db.models).values():
+        if isinstance(model, type) and issubclass(model, Base):
+            if model is not Base and hasattr(model, '__table__'):
+                models[model.__name__.lower()] = model
+                models[model.__table__.name.lower()] = model
+    try:
+        return models[name.lower()]
+    except KeyError:
+        raise click.BadParameter(
+            'expected one of {}'.format(', '.join(sorted(models))),
+            param_hint='MODEL',
+        )
+
+
+def format_from_path(path):
+    """Return the export format implied by a path's extension."""
+    if path.endswith('.gz'):
+        path = path[:-3]
+    return 'csv' if path.endswith('.csv') else 'ndjson'
+
+
+@click.command('export')
+@click.argument('model')
+@click.argument('output', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', 'format_', type=click.Choice(FORMATS),
+              help='The output format. Defaults to csv for .csv (or '
+                   '.csv.gz) files, and ndjson otherwise.')
+@click.option('--gzip/--no-gzip', 'compress', default=None,
+              help='Whether to gzip the output. Defaults to whether the '
+                   'output ends with .gz.')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='The number of rows loaded and written at a time.')
+@click.option('--resume', is_flag=True,
+              help='Resume an interrupted export from its checkpoint.')
+@with_appcontext
+def export_command(model, output, format_, compress, batch_size, resume):
+    """Export all rows of MODEL to OUTPUT, or - for stdout.
+
+    MODEL is a model class or table name, e.g. ``books``. Rows are
+    dumped as in the API's representations, in id order, as NDJSON or
+    CSV. A checkpoint is kept beside the output while exporting, from
+    which an interrupted export may be resumed with ``--resume``.
+    """
+    model = get_model(model)
+    format_ = format_ or format_from_path(output)
+    if compress is None:
+        compress = output.endswith('.gz')
+    exporter = Exporter(
+        app.db.session, model, format_, compress, batch_size
+    )
+    start = default_timer()
+
+    def progress(last_id, offset, rows):
+        click.echo(
+            'Exported {} rows, up to id {}.'.format(rows, last_id), err=True
+        )
+
+    with app.test_request_context():
+        if output == '-':
+            stream = click.get_binary_stream('stdout')
+            count = exporter.write(stream)
+        else:
+            try:
+                count = exporter.export(output, resume, progress)
+            except ValueError as exc:
+                raise click.ClickException(str(exc))
+    elapsed = default_timer() - start
+    click.echo(
+        'Exported {} {} rows in {:.1f} s ({:.0f} rows/s).'.format(
+            count,
+            model.__name__,
+            elapsed,
+            count / elapsed if elapsed else 0,
+        ),
+        err=True,
+    )
+
+
+def open_input(path):
+    """Open a file, gzipped if it ends with ``.gz``, or - for stdin."""
+    if path == '-':
+        return click.get_text_stream('stdin')
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(
+            gzip.open(path, 'rb'), encoding='utf-8', newline=''
+        )
+    return io.open(path, encoding='utf-8', newline='')
+
+
+@click.command('import')
+@click.argument('model')
+@click.argument('input_', metavar='INPUT',
+                type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', 'format_', type=click.Choice(FORMATS),
+              help='The input format. Defaults to csv for .csv (or '
+                   '.csv.gz) files, and ndjson otherwise.')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='The number of items loaded and written at a time.')
+@click.option('--transaction-size', default=10000, show_default=True,
+              help='The number of items written in each transaction.')
+@click.option('--links/--no-links', default=True, show_default=True,
+              help='Whether to import many-to-many links.')
+@click.option('--skip', default=0,
+              help='The number of items to skip, e.g. those committed '
+                   'by an interrupted import.')
+@with_appcontext
+def import_command(model, input_, format_, batch_size, transaction_size,
+                   links, skip):
+    """Import the items of INPUT, or - for stdin, into MODEL's table.
+
+    MODEL is a model class or table name, e.g. ``books``. Items are
+    NDJSON lines or CSV rows, as exported. Items with existing ids are
+    updated, and others inserted. Related items without ids (e.g.
+    authors of books) are found by their nested fields (e.g. name),
+    or created.
+    """
+    model = get_model(model)
+    format_ = format_ or format_from_path(input_)
+    importer = Importer(
+        app.db.session, model, batch_size, transaction_size, links
+    )
+    start = default_timer()
+
+    def rate(count):
+        elapsed = default_timer() - start
+        return count / elapsed if elapsed else 0
+
+    def progress(count):
+        click.echo(
+            'Committed {} items ({:.0f} rows/s).'.format(count, rate(count)),
+            err=True,
+        )
+
+    with open_input(input_) as lines:
+        if format_ == 'csv':
+            items = read_csv(lines, model)
+        else:
+            items = read_ndjson(lines)
+        counts = importer.run(items, skip, progress)
+    total = counts[CREATED] + counts[UPDATED] + counts[INVALID]
+    click.echo(
+        'Imported {} {} items in {:.1f} s ({:.0f} rows/s): {} created, '
+        '{} updated, {} invalid, {} related rows created.'.format(
+            total,
+            model.__name__,
+            default_timer() - start,
+            rate(total),
+            counts[CREATED],
+            counts[UPDATED],
+            counts[INVALID],
+            counts['related'],
+        ),
+        err=True,
+    )
+    for index, errors in importer.errors:
+        click.echo('Item {}: {}'.format(index, errors), err=True)
+
+
+#: The commands added to the app's CLI.
+COMMANDS = (export_command, import_command)
+
+
+def register(app):
+    """Add the commands to the app's CLI."""
+    for command in COMMANDS:
+        app.cli.add_command(command)
@@ -0,0 +1,169 @@
+"""Compress responses negotiated through ``Accept-Encoding``.
+
+Responses are compressed with ``gzip`` or ``deflate`` from the
+standard library's ``zlib``. Compressed bodies of responses carrying
+an ETag are cached, keyed by the ETag, so a representation is
+compressed only once for as long as it is current.
+
+Since a compressed body differs from the uncompressed one, strong
+ETags are made weak when a body is compressed. Conditional requests
+compare ETags weakly, so either form of the ETag matches.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import zlib
+from collections import OrderedDict
+from threading import Lock
+
+from flask import request
+
+
+EXTENSION = 'compression'
+
+GZIP = 'gzip'
+DEFLATE = 'deflate'
+
+WBITS = {
+    GZIP: 16 + zlib.MAX_WBITS,
+    DEFLATE: zlib.MAX_WBITS,
+}
+
+
+class Compression(object):
+    """Compress responses in an ``after_request`` hook.
+
+    :cvar mimetypes: the mimetypes of responses which may be compressed
+    :cvar encodings: the supported encodings, in order of preference
+    """
+
+    mimetypes = (
+        'application/json',
+        'application/msgpack',
+        'application/x-msgpack',
+        'application/x-ndjson',
+        'text/csv',
+        'text/html',
+        'text/plain',
+    )
+    encodings = (GZIP, DEFLATE)
+
+    def __init__(self, level=6, min_size=500, cache_size=256):
+        """Instantiate the compression.
+
+        :param int level: the ``zlib`` compression level, from 1 to 9.
+            Responses are not compressed if the level is 0.
+        :param int min_size: the size in bytes of the smallest body to
+            compress
+        :param int cache_size: the maximum number of compressed bodies
+            to cache
+        """
+        self.level = level
+        self.min_size = min_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = Lock()
+
+    @classmethod
+    def from_conf(cls, conf):
+        """Instantiate the compression from a compression config."""
+        return cls(
+            level=conf.get('level'),
+            min_size=conf.get('min_size'),
+            cache_size=conf.get('cache_size'),
+        )
+
+    def init_app(self, app):
+        """Compress the app's responses."""
+        app.extensions[EXTENSION] = self
+        app.after_request(self.after_request)
+
+    def encoding(self):
+        """Return the best encoding the client accepts, or None."""
+        return request.accept_encodings.best_match(self.encodings)
+
+    def compressor(self, encoding):
+        """Return a new compression object for the encoding."""
+        return zlib.compressobj(self.level, zlib.DEFLATED, WBITS[encoding])
+
+    def compress(self, data, encoding):
+        """Return the compressed data."""
+        compressor = self.compressor(encoding)
+        return compressor.compress(data) + compressor.flush()
+
+    def cached_compress(self, key, data, encoding):
+        """Return the compressed data, cached under ``key``."""
+        key = key + (encoding, self.level)
+        with self._lock:
+            compressed = self._cache.pop(key, None)
+            if compressed is not None:
+                self._cache[key] = compressed
+                return compressed
+        compressed = self.compress(data, encoding)
+        with self._lock:
+            self._cache[key] = compressed
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return compressed
+
+    def compress_stream(self, chunks, encoding):
+        """Compress an iterable of body chunks as it is consumed.
+
+        Each chunk is flushed, so that clients receive data as soon as
+        it is produced.
+        """
+        compressor = self.compressor(encoding)
+        for chunk in chunks:
+            if not isinstance(chunk, bytes):
+                chunk = chunk.encode('utf-8')
+            compressed = compressor.compress(chunk)
+            compressed += compressor.flush(zlib.Z_SYNC_FLUSH)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    def clear(self):
+        """Discard all cached compressed bodies."""
+        with self._lock:
+            self._cache.clear()
+
+    def compressible(self, response):
+        """Return whether the response's content may be compressed."""
+        return (
+            self.level > 0
+            and response.status_code == 200
+            and response.mimetype in self.mimetypes
+            and 'Content-Encoding' not in response.headers
+            and not response.direct_passthrough
+        )
+
+    def after_request(self, response):
+        """Compress the response, if the client accepts it."""
+        if not self.compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self.compress_stream(
+                response.response, encoding
+            )
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            etag, weak = response.get_etag()
+            if etag is None:
+                compressed = self.compress(data, encoding)
+            else:
+                key = (request.full_path, etag, weak, response.mimetype)
+                compressed = self.cached_compress(key, data, encoding)
+            response.set_data(compressed)
+            if etag is not None and not weak:
+                response.set_etag(etag, weak=True)
+
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,457 @@
+"""Bulk insertion and update of model rows.
+
+Rows are written with Core statements, bypassing the ORM's unit of
+work, so that thousands of rows and their many-to-many links may be
+written in a handful of statements. Every row is checked before
+anything is written, so that invalid rows are reported individually
+while the remaining rows are written in a single transaction. The
+rows written are recorded with :func:`my_library.db.events.touch_rows`.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import io
+from collections import defaultdict
+from datetime import date, time
+
+from marshmallow.compat import text_type
+from sqlalchemy import BigInteger, Integer, SmallInteger, bindparam, text
+
+from .events import touch, touch_rows
+
+
+CREATED = 'created'
+UPDATED = 'updated'
+INVALID = 'invalid'
+
+#: The number of bits of integer column types, most specific first
+INTEGER_BITS = [(BigInteger, 64), (SmallInteger, 16), (Integer, 32)]
+
+
+def integer_range(column):
+    """Return the least and greatest values of an integer column.
+
+    :returns: a ``(least, greatest)`` pair, or None if the column's
+        type isn't an integer type
+    """
+    for type_, bits in INTEGER_BITS:
+        if isinstance(column.type, type_):
+            return -2 ** (bits - 1), 2 ** (bits - 1) - 1
+    return None
+
+
+def chunked(values, size):
+    """Yield successive lists of at most ``size`` values."""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class BulkUpsert(object):
+    """Insert or update rows of a model's table, and their links.
+
+    Rows are dicts of column values, plus lists of related ids for the
+    model's many-to-many relationships. A row whose ``id`` exists is
+    updated, and any other row is inserted. Related ids given for a
+    row replace the row's existing links for that relationship.
+
+    Rows on either side of a changed link are updated, so that their
+    version columns (e.g. ``updated``) change along with their
+    representations.
+
+    :ivar session: the session in which statements are executed. The
+        caller is responsible for committing it.
+    :ivar model: the ORM model whose table is written
+    :ivar int chunk_size: the maximum number of ids per ``IN`` query
+    :ivar dict ranges: the least and greatest values of integer columns
+        and related ids, by key
+    """
+
+    def __init__(self, session, model, chunk_size=500):
+        """Instantiate the upsert.
+
+        :param sqlalchemy.orm.session.Session session: a session
+        :param sqlalchemy.ext.declarative.DeclarativeMeta model:
+            a sqlalchemy ORM class
+        :param int chunk_size: the maximum number of ids per ``IN``
+            query
+        """
+        self.session = session
+        self.model = model
+        self.chunk_size = chunk_size
+        self.table = model.__table__
+        self.links = {
+            prop.key: prop
+            for prop in model.__mapper__.relationships
+            if prop.secondary is not None
+        }
+        columns = [(column.key, column) for column in self.table.columns]
+        columns.extend(
+            (key, prop.mapper.local_table.c.id)
+            for key, prop in self.links.items()
+        )
+        self.ranges = {
+            key: integer_range(column) for key, column in columns
+            if integer_range(column) is not None
+        }
+
+    @property
+    def required(self):
+        """The columns which must be given to insert a row."""
+        return [
+            column.key for column in self.table.columns
+            if not (
+                column.nullable
+                or column.primary_key
+                or column.default is not None
+                or column.server_default is not None
+            )
+        ]
+
+    def existing(self, table, ids):
+        """Return the subset of ``ids`` found in ``table``."""
+        found = set()
+        for chunk in chunked(ids, self.chunk_size):
+            found.update(
+                id for id, in self.session.execute(
+                    table.select()
+                    .with_only_columns([table.c.id])
+                    .where(table.c.id.in_(chunk))
+                )
+            )
+        return found
+
+    def in_range(self, key, value):
+        """Return whether a value fits the integer column of its key."""
+        bounds = self.ranges.get(key)
+        return bounds is None or bounds[0] <= value <= bounds[1]
+
+    def check(self, rows):
+        """Sort rows into inserts and updates, and find invalid rows.
+
+        :param list rows: ``(index, row)`` pairs
+        :returns: ``(index, row)`` pairs to insert, ``(index, row)``
+            pairs to update, and a mapping of the indexes of invalid
+            rows to their errors
+        :rtype: tuple
+        """
+        errors = defaultdict(dict)
+        ids = [
+            row['id'] for _, row in rows
+            if row.get('id') is not None and self.in_range('id', row['id'])
+        ]
+        existing = self.existing(self.table, ids)
+        related = {
+            key: self.existing(
+                prop.mapper.local_table,
+                set(
+                    id for _, row in rows for id in row.get(key) or ()
+                    if self.in_range(key, id)
+                ),
+            )
+            for key, prop in self.links.items()
+        }
+        required = self.required
+
+        inserts, updates, seen = [], [], set()
+        for index, row in rows:
+            id = row.get('id')
+            if id is not None:
+                if id in seen:
+                    errors[index]['id'] = ['Duplicate id in request.']
+                seen.add(id)
+            if id not in existing:
+                for key in required:
+                    if row.get(key) is None:
+                        errors[index][key] = [
+                            'Missing data for required field.'
+                        ]
+            for key in self.links:
+                unknown = [
+                    each for each in row.get(key) or ()
+                    if each not in related[key]
+                ]
+                if unknown:
+                    errors[index][key] = ['Unknown ids: {}.'.format(
+                        ', '.join(str(each) for each in unknown)
+                    )]
+            for key in self.ranges:
+                values = row.get(key) if key in self.links else [row.get(key)]
+                if not all(
+                    self.in_range(key, each)
+                    for each in values or () if each is not None
+                ):
+                    errors[index][key] = ['Number out of range.']
+            if index in errors:
+                continue
+            (updates if id in existing else inserts).append((index, row))
+        return inserts, updates, dict(errors)
+
+    def values(self, row):
+        """Return the column values of a row."""
+        return {
+            key: value for key, value in row.items() if key not in self.links
+        }
+
+    def insert_many(self, table, values):
+        """Insert rows of column values, with an ``executemany``.
+
+        :param sqlalchemy.Table table: the table to insert into
+        :param list values: dicts of column values, all with the same
+            keys
+        """
+        self.session.execute(table.insert(), values)
+
+    def insert_returning(self, table, values):
+        """Insert rows of column values, returning their generated ids.
+
+        Where the database supports ``INSERT ... RETURNING`` with
+        multiple ``VALUES`` (e.g. PostgreSQL), each chunk of rows is
+        inserted with a single statement. Other databases (e.g. SQLite)
+        can only return the generated key of a single inserted row, so
+        rows are inserted one at a time.
+
+        :param sqlalchemy.Table table: the table to insert into
+        :param list values: dicts of column values, all with the same
+            keys
+        :returns: the ids of the rows, in order
+        :rtype: list
+        """
+        dialect = self.session.connection().dialect
+        multiple = (
+            dialect.implicit_returning
+            and dialect.supports_multivalues_insert
+            and values[0]
+        )
+        ids = []
+        if multiple:
+            for chunk in chunked(values, self.chunk_size):
+                ids.extend(
+                    id for id, in self.session.execute(
+                        table.insert().values(chunk).returning(table.c.id)
+                    )
+                )
+            return ids
+        for each in values:
+            result = self.session.execute(table.insert().values(**each))
+            ids.append(result.inserted_primary_key[0])
+        return ids
+
+    def sync_sequence(self, table, id):
+        """Move the table's PostgreSQL id sequence past an id, if behind.
+
+        Rows inserted with explicit ids don't advance the sequence, which
+        would otherwise generate their ids again. The sequence is never
+        moved back, so that ids generated by concurrent transactions
+        aren't generated again either.
+
+        :param sqlalchemy.Table table: the table inserted into
+        :param int id: the greatest id inserted
+        """
+        if self.session.connection().dialect.name != 'postgresql':
+            return
+        self.session.execute(text(
+            "SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+            "greatest(:id, nextval(pg_get_serial_sequence(:table, 'id'))))"
+        ), {'table': table.name, 'id': id})
+
+    def insert(self, rows):
+        """Insert rows, returning their ids.
+
+        Rows with ids are inserted with a single ``executemany``, and
+        rows without ids with :meth:`insert_returning`, after moving the
+        id sequence past the given ids with :meth:`sync_sequence`.
+        """
+        table = self.table
+        with_ids = [self.values(row) for row in rows if 'id' in row]
+        ids = [row['id'] for row in with_ids]
+        for values in self._uniform(with_ids):
+            self.insert_many(table, values)
+        if ids:
+            self.sync_sequence(table, max(ids))
+        without_ids = [row for row in rows if 'id' not in row]
+        groups = defaultdict(list)
+        for row in without_ids:
+            groups[tuple(sorted(self.values(row)))].append(row)
+        for key in sorted(groups):
+            group = groups[key]
+            generated = self.insert_returning(
+                table, [self.values(row) for row in group]
+            )
+            for row, id in zip(group, generated):
+                row['id'] = id
+                ids.append(id)
+        touch_rows(self.session, self.model, ids)
+        return ids
+
+    def update(self, rows):
+        """Update rows, grouped by the set of columns given.
+
+        Every row is updated, even when only its links change, so that
+        its ``onupdate`` columns are refreshed.
+        """
+        table = self.table
+        touch_rows(self.session, self.model, [row['id'] for row in rows])
+        for values in self._uniform([self.values(row) for row in rows]):
+            params = [
+                dict(
+                    ('b_' + key, value) for key, value in each.items()
+                )
+                for each in values
+            ]
+            columns = {
+                key: bindparam('b_' + key)
+                for key in values[0] if key != 'id'
+            }
+            self.session.execute(
+                table.update()
+                .where(table.c.id == bindparam('b_id'))
+                .values(columns or {'id': table.c.id}),
+                params,
+            )
+
+    def touch(self, model, ids):
+        """Refresh the ``onupdate`` columns of the model's rows."""
+        table = model.__table__
+        touch_rows(self.session, model, ids)
+        for chunk in chunked(sorted(ids), self.chunk_size):
+            self.session.execute(
+                table.update()
+                .where(table.c.id.in_(chunk))
+                .values(id=table.c.id)
+            )
+
+    def link(self, rows):
+        """Replace the links of rows giving related ids."""
+        for key, prop in self.links.items():
+            linked = [row for row in rows if row.get(key) is not None]
+            if not linked:
+                continue
+            ((local, local_fk),) = prop.synchronize_pairs
+            ((remote, remote_fk),) = prop.secondary_synchronize_pairs
+            secondary = prop.secondary
+            touch(self.session, secondary)
+            touched = set()
+            ids = [row['id'] for row in linked]
+            for chunk in chunked(ids, self.chunk_size):
+                where = local_fk.in_(chunk)
+                touched.update(
+                    id for id, in self.session.execute(
+                        secondary.select()
+                        .with_only_columns([remote_fk])
+                        .where(where)
+                    )
+                )
+                self.session.execute(secondary.delete().where(where))
+            pairs = [
+                {local_fk.key: row['id'], remote_fk.key: related}
+                for row in linked
+                for related in unique(row[key])
+            ]
+            if pairs:
+                self.insert_many(secondary, pairs)
+            touched.update(pair[remote_fk.key] for pair in pairs)
+            if touched:
+                self.touch(prop.mapper.class_, touched)
+
+    def __call__(self, rows):
+        """Write the valid rows, and report on every row.
+
+        :param list rows: ``(index, row)`` pairs of loaded rows
+        :returns: a mapping of the index of each row to a ``(status,
+            id or errors)`` tuple, where ``status`` is one of
+            ``CREATED``, ``UPDATED``, or ``INVALID``
+        :rtype: dict
+        """
+        inserts, updates, errors = self.check(rows)
+        self.insert([row for _, row in inserts])
+        self.update([row for _, row in updates])
+        self.link([row for _, row in inserts + updates])
+        results = {index: (INVALID, errs) for index, errs in errors.items()}
+        results.update(
+            (index, (CREATED, row['id'])) for index, row in inserts
+        )
+        results.update(
+            (index, (UPDATED, row['id'])) for index, row in updates
+        )
+        return results
+
+    @staticmethod
+    def _uniform(rows):
+        """Group row values by their keys, for ``executemany``."""
+        groups = defaultdict(list)
+        for row in rows:
+            groups[tuple(sorted(row))].append(row)
+        return [groups[key] for key in sorted(groups)]
+
+
+class CopyUpsert(BulkUpsert):
+    """A bulk upsert inserting rows with ``COPY`` on PostgreSQL.
+
+    ``COPY ... FROM STDIN`` streams rows to the server in one command,
+    without planning and executing an ``INSERT`` per row, which makes
+    inserting large batches several times faster than ``executemany``.
+    Python-side column defaults are applied to the copied rows, as they
+    are to inserted rows. Rows are inserted with ``executemany`` on
+    other databases.
+    """
+
+    def insert_many(self, table, values):
+        """Copy rows of column values into the table, if possible."""
+        connection = self.session.connection()
+        if connection.dialect.driver != 'psycopg2':
+            return super(CopyUpsert, self).insert_many(table, values)
+        defaults = {
+            column.key: column.default
+            for column in table.columns
+            if column.key not in values[0]
+            and column.default is not None
+            and (column.default.is_scalar or column.default.is_callable)
+        }
+        keys = list(values[0]) + sorted(defaults)
+        lines = []
+        for row in values:
+            row = dict(row)
+            for key, default in defaults.items():
+                row[key] = (
+                    default.arg(None) if default.is_callable else default.arg
+                )
+            lines.append(copy_row([row[key] for key in keys]))
+        preparer = connection.dialect.identifier_preparer
+        statement = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+            preparer.format_table(table),
+            ', '.join(preparer.quote(table.c[key].name) for key in keys),
+        )
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(statement, io.StringIO(''.join(lines)))
+        finally:
+            cursor.close()
+
+
+def copy_value(value):
+    """Format a value for ``COPY`` in CSV format.
+
+    Strings are always quoted, so that empty strings are distinguished
+    from nulls, which are empty.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, text_type):
+        return '"{}"'.format(value.replace('"', '""'))
+    return text_type(value)
+
+
+def copy_row(values):
+    """Format a row of values for ``COPY`` in CSV format."""
+    return ','.join(copy_value(value) for value in values) + '\n'
+
+
+def unique(values):
+    """Return the values without duplicates, in their original order."""
+    seen = set()
+    return [each for each in values if not (each in seen or seen.add(each))]
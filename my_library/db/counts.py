@@ -0,0 +1,154 @@
+"""Strategies for counting the results of collection queries.
+
+Each strategy's ``count()`` method returns a ``(total, kind)`` tuple,
+where ``kind`` describes how the total was obtained, so that it may be
+reported to the client.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+from collections import OrderedDict
+from logging import getLogger
+from threading import Lock
+from time import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+
+log = getLogger(__name__)
+
+
+EXACT = 'exact'
+CACHED = 'cached'
+ESTIMATED = 'estimated'
+NONE = 'none'
+
+
+class CountStrategy(object):
+    """Base class for count strategies."""
+
+    def count(self, query):
+        """Return the total and the kind of total for the query.
+
+        :param sqlalchemy.orm.query.Query query: the query to count.
+            Any limit, offset, or ordering is ignored.
+        :returns: a ``(total, kind)`` tuple
+        :rtype: tuple
+        """
+        raise NotImplementedError
+
+
+class ExactCount(CountStrategy):
+    """Count with a ``COUNT(*)`` query."""
+
+    def count(self, query):
+        """Return the exact number of results matching the query."""
+        unpaged = query.limit(None).offset(None).order_by(None)
+        return unpaged.count(), EXACT
+
+
+class CachedCount(ExactCount):
+    """Cache exact counts in memory for ``ttl`` seconds.
+
+    Counts are keyed by the query's SQL and parameters, and at most
+    ``maxsize`` counts are retained.
+    """
+
+    def __init__(self, ttl=60, maxsize=1024):
+        """Instantiate the strategy.
+
+        :param float ttl: the number of seconds for which counts are
+            considered valid
+        :param int maxsize: the maximum number of cached counts
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._counts = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def key(query):
+        """Return the cache key for a query."""
+        statement = query.limit(None).offset(None).order_by(None).statement
+        compiled = statement.compile()
+        return str(compiled), repr(sorted(compiled.params.items()))
+
+    def count(self, query):
+        """Return a cached count if one is fresh, or an exact count."""
+        key = self.key(query)
+        now = time()
+        with self._lock:
+            cached = self._counts.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0], CACHED
+        total, kind = super(CachedCount, self).count(query)
+        with self._lock:
+            self._counts.pop(key, None)
+            self._counts[key] = (total, now + self.ttl)
+            while len(self._counts) > self.maxsize:
+                self._counts.popitem(last=False)
+        return total, kind
+
+    def clear(self):
+        """Discard all cached counts."""
+        with self._lock:
+            self._counts.clear()
+
+
+class EstimatedCount(ExactCount):
+    """Estimate the count from the database's table statistics.
+
+    Estimates are only available for unfiltered queries against a
+    single table, using ``pg_class.reltuples`` on PostgreSQL and
+    ``sqlite_stat1`` (populated by ``ANALYZE``) on SQLite. An exact
+    count is returned if no estimate is available.
+    """
+
+    ESTIMATE_SQL = {
+        'postgresql': (
+            'SELECT reltuples::bigint FROM pg_class '
+            'WHERE oid = to_regclass(:table)'
+        ),
+        'sqlite': 'SELECT stat FROM sqlite_stat1 WHERE tbl = :table',
+    }
+
+    def estimate(self, query):
+        """Return an estimated count for the query, or ``None``."""
+        if query.whereclause is not None:
+            return None
+        descriptions = query.column_descriptions
+        if len(descriptions) != 1:
+            return None
+        table = getattr(descriptions[0]['entity'], '__table__', None)
+        if table is None:
+            return None
+        sql = self.ESTIMATE_SQL.get(query.session.get_bind().dialect.name)
+        if sql is None:
+            return None
+        try:
+            row = query.session.execute(
+                text(sql), {'table': table.name}
+            ).first()
+        except DBAPIError:
+            log.debug('No statistics available for {}'.format(table.name))
+            return None
+        if row is None or row[0] is None:
+            return None
+        estimate = int(str(row[0]).split()[0])
+        return estimate if estimate >= 0 else None
+
+    def count(self, query):
+        """Return an estimated count, falling back to an exact one."""
+        estimate = self.estimate(query)
+        if estimate is None:
+            return super(EstimatedCount, self).count(query)
+        return estimate, ESTIMATED
+
+
+class NoCount(CountStrategy):
+    """Do not count at all."""
+
+    def count(self, query):
+        """Return ``None`` for the total."""
+        return None, NONE
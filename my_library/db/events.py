@@ -0,0 +1,107 @@
+"""Track the tables and rows written by sessions, and announce commits.
+
+Tables and rows changed by ORM flushes are recorded automatically.
+Code writing with Core statements through a session should record
+what it writes with :func:`touch_rows` or, if the rows written are
+unknown, :func:`touch`. Once the session's transaction is committed,
+the listeners registered for the session's application with
+:func:`on_commit` are called with what was written.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+from collections import namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes, object_mapper
+
+
+TOUCHED = 'touched_tables'
+ROWS = 'touched_rows'
+UNKNOWN = 'unknown_tables'
+LISTENERS = 'commit_listeners'
+
+
+#: What a committed transaction wrote: the set of ``Table`` objects
+#: written, the set of ``(model, id)`` pairs identifying model rows
+#: written, and the set of tables in which unidentified rows were
+#: written.
+Changes = namedtuple('Changes', ('tables', 'rows', 'unknown'))
+
+
+def on_commit(app, listener):
+    """Call ``listener(changes)`` when a session of the app commits.
+
+    :param flask.Flask app: the application
+    :param callable listener: a callable receiving the
+        :class:`Changes` of the committed transaction
+    """
+    app.extensions.setdefault(LISTENERS, []).append(listener)
+
+
+def touch(session, *tables):
+    """Record that unidentified rows of the tables were written."""
+    session.info.setdefault(TOUCHED, set()).update(tables)
+    session.info.setdefault(UNKNOWN, set()).update(tables)
+
+
+def touch_rows(session, model, ids):
+    """Record that the model's rows with the given ids were written."""
+    session.info.setdefault(TOUCHED, set()).add(model.__table__)
+    session.info.setdefault(ROWS, set()).update(
+        (model, id) for id in ids
+    )
+
+
+def flushed(session):
+    """Return the tables and rows written by the session's changes.
+
+    :returns: a set of tables, and a set of ``(model, id)`` pairs
+    :rtype: tuple
+    """
+    deleted = session.deleted
+    changed = list(session.new) + list(deleted) + [
+        obj for obj in session.dirty if session.is_modified(obj)
+    ]
+    tables, rows = set(), set()
+    for obj in changed:
+        mapper = object_mapper(obj)
+        tables.add(mapper.local_table)
+        rows.add((mapper.class_, obj.id))
+        for prop in mapper.relationships:
+            if prop.secondary is None:
+                continue
+            history = attributes.get_history(
+                obj, prop.key, passive=attributes.PASSIVE_NO_INITIALIZE
+            )
+            if obj in deleted or history.has_changes():
+                tables.add(prop.secondary)
+    return tables, rows
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_flush(session, flush_context):
+    tables, rows = flushed(session)
+    session.info.setdefault(TOUCHED, set()).update(tables)
+    session.info.setdefault(ROWS, set()).update(rows)
+
+
+@event.listens_for(Session, 'after_commit')
+def _announce_commit(session):
+    changes = Changes(
+        session.info.pop(TOUCHED, set()),
+        session.info.pop(ROWS, set()),
+        session.info.pop(UNKNOWN, set()),
+    )
+    app = getattr(session, 'app', None)
+    if not changes.tables or app is None:
+        return
+    for listener in app.extensions.get(LISTENERS, ()):
+        listener(changes)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        for key in (TOUCHED, ROWS, UNKNOWN):
+            session.info.pop(key, None)
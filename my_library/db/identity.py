@@ -0,0 +1,197 @@
+"""A second-level cache of model objects, by primary key.
+
+Sessions are discarded at the end of each request, so their identity
+maps do not save queries across requests. This cache keeps pickled
+snapshots of loaded objects, along with the related objects loaded
+with them, in memory shared by all requests. A snapshot is never
+attached to a session: each hit unpickles a fresh copy and merges it
+into the requesting session without loading anything.
+
+A snapshot is invalidated as soon as a transaction writing any of the
+rows it includes is committed (see :mod:`my_library.db.events`), and
+it expires after ``ttl`` seconds, which bounds its staleness with
+respect to commits in other processes.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import pickle
+from collections import OrderedDict, defaultdict
+from threading import Lock
+from time import time
+
+from sqlalchemy import inspect
+
+from .events import on_commit
+
+
+EXTENSION = 'identity_cache'
+
+
+def snapshot_rows(obj):
+    """Return the ``(model, id)`` pairs of an object and loaded relatives.
+
+    Only relationships which are already loaded are followed.
+    """
+    rows = set()
+    pending = [obj]
+    while pending:
+        current = pending.pop()
+        state = inspect(current)
+        row = (state.mapper.class_, current.id)
+        if row in rows:
+            continue
+        rows.add(row)
+        for prop in state.mapper.relationships:
+            if prop.key not in state.dict:
+                continue
+            value = state.dict[prop.key]
+            if value is None:
+                continue
+            pending.extend(value if prop.uselist else [value])
+    return rows
+
+
+class IdentityCache(object):
+    """A bounded cache of object snapshots, keyed by model and id.
+
+    :ivar int hits: the number of lookups served from the cache
+    :ivar int misses: the number of lookups which queried the database
+    """
+
+    def __init__(self, size=1024, ttl=300.0):
+        """Instantiate the cache.
+
+        :param int size: the maximum number of cached objects
+        :param float ttl: the number of seconds for which a snapshot
+            may be served
+        """
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._dependents = defaultdict(set)
+        self._lock = Lock()
+
+    @classmethod
+    def from_conf(cls, conf):
+        """Instantiate the cache from a cache config."""
+        return cls(size=conf.get('identity_size'), ttl=conf.get('ttl'))
+
+    def init_app(self, app):
+        """Cache the app's objects, invalidating them on commit."""
+        app.extensions[EXTENSION] = self
+        on_commit(app, self.invalidate)
+
+    @property
+    def stats(self):
+        """The cache's size, hits, and misses."""
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def get(self, session, model, id, options=()):
+        """Return the object with the given id, or None.
+
+        The object is merged into the session from a snapshot if one
+        is cached, and is loaded and cached otherwise.
+
+        :param sqlalchemy.orm.session.Session session: the session in
+            which to return the object
+        :param sqlalchemy.ext.declarative.DeclarativeMeta model:
+            a sqlalchemy ORM class
+        :param int id: the object's primary key
+        :param tuple options: loader options for the query loading the
+            object on a miss. Everything needed from the object should
+            be loaded, since the snapshot includes nothing else.
+        """
+        key = (model, id)
+        now = time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries[key] = self._entries.pop(key)
+                self.hits += 1
+            else:
+                if entry is not None:
+                    self._discard(key)
+                    entry = None
+                self.misses += 1
+            generation = self.generation
+        if entry is not None:
+            return session.merge(pickle.loads(entry[1]), load=False)
+
+        obj = session.query(model).options(*options).get(id)
+        if obj is not None:
+            self.set(key, obj, generation)
+        return obj
+
+    def set(self, key, obj, generation):
+        """Cache a snapshot of the object, unless it may be stale.
+
+        :param tuple key: the ``(model, id)`` cache key
+        :param obj: a persistent ORM object with no pending changes
+        :param int generation: the cache's ``generation`` when the
+            object was loaded
+        """
+        rows = snapshot_rows(obj)
+        data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._discard(key)
+            self._entries[key] = (time() + self.ttl, data, rows)
+            for row in rows:
+                self._dependents[row].add(key)
+            while len(self._entries) > self.size:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, changes):
+        """Discard the snapshots including any of the changed rows.
+
+        :param my_library.db.events.Changes changes: a transaction's
+            changes. Snapshots of models with tables in which
+            unidentified rows were written are all discarded.
+        """
+        with self._lock:
+            self.generation += 1
+            stale = set()
+            for row in changes.rows:
+                stale.update(self._dependents.get(row, ()))
+            if changes.unknown:
+                stale.update(
+                    key for key, (_, _, rows) in self._entries.items()
+                    if any(
+                        model.__table__ in changes.unknown
+                        for model, _ in rows
+                    )
+                )
+            for key in stale:
+                self._discard(key)
+
+    def clear(self):
+        """Discard all snapshots."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._dependents.clear()
+
+    def _discard(self, key):
+        """Discard a snapshot. The lock must be held."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for row in entry[2]:
+            dependents = self._dependents.get(row)
+            if dependents is not None:
+                dependents.discard(key)
+                if not dependents:
+                    del self._dependents[row]
+
+    def __len__(self):
+        """Return the number of cached snapshots."""
+        return len(self._entries)
@@ -0,0 +1,116 @@
+"""Remember which ids have no rows, to answer repeated misses cheaply.
+
+A bounded set of ids which were looked up and not found is remembered
+for each model. An id in the set is known to be missing without
+querying the database. Ids above the greatest id in the model's table
+are not remembered: they are those of rows which may be inserted next,
+by any process.
+
+Ids are forgotten as soon as a transaction writing rows with those ids
+is committed (see :mod:`my_library.db.events`), and expire after
+``ttl`` seconds, which bounds how long rows inserted with explicit ids
+by other processes may be reported missing.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+from sqlalchemy import func
+
+from .events import on_commit
+
+
+EXTENSION = 'missing_ids'
+
+
+class MissingIds(object):
+    """Known-missing ids, per model.
+
+    :ivar int hits: the number of lookups known to be missing without
+        querying the database
+    :ivar int generation: incremented on every invalidation, so that
+        what was read before an invalidation is not stored after it
+    """
+
+    def __init__(self, size=10000, ttl=60.0):
+        """Instantiate the cache.
+
+        :param int size: the maximum number of missing ids remembered
+        :param float ttl: the number of seconds for which a missing id
+            is remembered
+        """
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.generation = 0
+        self._missing = OrderedDict()
+        self._lock = Lock()
+
+    @classmethod
+    def from_conf(cls, conf):
+        """Instantiate the cache from a cache config."""
+        return cls(size=conf.get('missing_size'), ttl=conf.get('ttl'))
+
+    def init_app(self, app):
+        """Remember the app's missing ids, forgetting them on commit."""
+        app.extensions[EXTENSION] = self
+        on_commit(app, self.invalidate)
+
+    def is_missing(self, model, id):
+        """Return whether the id is known to have no row."""
+        now = time()
+        key = (model, id)
+        with self._lock:
+            expires = self._missing.get(key)
+            if expires is not None and expires <= now:
+                del self._missing[key]
+                expires = None
+            if expires is not None:
+                self.hits += 1
+        return expires is not None
+
+    def add(self, session, model, id, generation):
+        """Remember that the id has no row, unless it's above all ids.
+
+        :param int generation: the cache's ``generation`` when the row
+            was found missing
+        """
+        if id > (session.query(func.max(model.id)).scalar() or 0):
+            return
+        key = (model, id)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._missing.pop(key, None)
+            self._missing[key] = time() + self.ttl
+            while len(self._missing) > self.size:
+                self._missing.popitem(last=False)
+
+    def invalidate(self, changes):
+        """Forget the ids of written rows.
+
+        :param my_library.db.events.Changes changes: a transaction's
+            changes. Everything is forgotten for models with tables in
+            which unidentified rows were written.
+        """
+        with self._lock:
+            self.generation += 1
+            for model, id in changes.rows:
+                self._missing.pop((model, id), None)
+            if changes.unknown:
+                for key in list(self._missing):
+                    if key[0].__table__ in changes.unknown:
+                        del self._missing[key]
+
+    def clear(self):
+        """Forget everything."""
+        with self._lock:
+            self.generation += 1
+            self._missing.clear()
+
+    def __len__(self):
+        """Return the number of missing ids remembered."""
+        return len(self._missing)
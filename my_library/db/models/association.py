@@ -2,14 +2,25 @@
 
 from __future__ import absolute_import, unicode_literals
 
-from sqlalchemy import Column, Integer, ForeignKey, Table
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    Index,
+    Integer,
+    PrimaryKeyConstraint,
+    Table,
+)
 
 from .base import Base
 
 
+#: Authors are looked up by book through the primary key, and books
+#: by author through the reverse index, both without reading the table.
 books_authors = Table(
     'books_authors',
     Base.metadata,
-    Column('author_id', Integer, ForeignKey('authors.id')),
-    Column('book_id', Integer, ForeignKey('books.id')),
+    Column('author_id', Integer, ForeignKey('authors.id'), nullable=False),
+    Column('book_id', Integer, ForeignKey('books.id'), nullable=False),
+    PrimaryKeyConstraint('book_id', 'author_id', name='pk_books_authors'),
+    Index('ix_books_authors_author_id', 'author_id', 'book_id'),
 )
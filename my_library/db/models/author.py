@@ -8,9 +8,10 @@ from sqlalchemy.orm import relationship
 from my_library.resources.authors import AuthorResource
 from .association import books_authors
 from .base import Base
+from .mixins import CreateUpdate
 
 
-class Author(Base):
+class Author(CreateUpdate, Base):
     """Author model."""
 
     __tablename__ = 'authors'
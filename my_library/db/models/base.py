@@ -25,6 +25,8 @@ class Base(_Base):
 
     * __nested__: field names that should be included in nested
       representations of this model
+    * __readonly__: names of columns which are managed by the
+      application, and so should not be loaded from client data
     * __resource__: used to determine the URL of the model during
       serialization
     * href: this property is used to populate the "href" attribute
@@ -34,6 +36,7 @@ class Base(_Base):
     """
     __abstract__ = True
     __nested__ = ()
+    __readonly__ = ()
     __resource__ = None
 
     id = Column(Integer, primary_key=True)
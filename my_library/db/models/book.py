@@ -7,11 +7,12 @@ from sqlalchemy.orm import relationship
 
 from .association import books_authors
 from .base import Base
+from .mixins import CreateUpdate
 
 from my_library.resources.books import BookResource
 
 
-class Book(Base):
+class Book(CreateUpdate, Base):
     """Book model."""
 
     __tablename__ = 'books'
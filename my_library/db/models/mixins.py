@@ -4,21 +4,52 @@ from __future__ import absolute_import, unicode_literals
 
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, DateTime
+from sqlalchemy import Boolean, Column, DateTime, event, inspect
+from sqlalchemy.sql import expression
+
+
+def touch(target, *args):
+    """Mark the target as updated now, if it was already inserted.
+
+    Objects yet to be inserted are left to the column's default, so
+    that they aren't updated before they're created.
+    """
+    if inspect(target).persistent:
+        target.updated = datetime.utcnow()
 
 
 class CreateUpdate(object):
-    """Automatically track creation and updates."""
+    """Automatically track creation and updates.
+
+    Adding to or removing from any collection relationship also counts
+    as an update, so that ``updated`` changes whenever the object's
+    representation does. Both columns are ``__readonly__``, so they
+    are not loaded from client data.
+    """
+
+    __readonly__ = ('created', 'updated')
 
     created = Column(DateTime, default=datetime.utcnow)
     updated = Column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
 
+    @classmethod
+    def __declare_last__(cls):
+        """Touch the object when its collections change."""
+        for prop in cls.__mapper__.relationships:
+            if prop.uselist:
+                attr = getattr(cls, prop.key)
+                event.listen(attr, 'append', touch)
+                event.listen(attr, 'remove', touch)
+
 
 class SoftDelete(object):
     """Provide a ``deleted`` boolean field."""
 
     deleted = Column(
-        Boolean, default=False, nullable=False, server_default=False
+        Boolean,
+        default=False,
+        nullable=False,
+        server_default=expression.false(),
     )
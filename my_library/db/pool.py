@@ -0,0 +1,121 @@
+"""Configure database connection pools, and report their usage.
+
+Pools of server databases are :class:`TimedQueuePool` instances, which
+record how long connections take to be obtained, so that pool sizes can
+be chosen from what requests actually wait. Statistics are kept per
+process: with several worker processes, each reports its own pools.
+"""
+
+from __future__ import absolute_import, division, unicode_literals
+
+from threading import Lock
+from timeit import default_timer
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool, SingletonThreadPool
+
+
+#: The pool settings of the DB config, and the ``create_engine``
+#: keyword arguments they are passed as.
+POOL_OPTIONS = (
+    ('pool_size', 'pool_size'),
+    ('pool_max_overflow', 'max_overflow'),
+    ('pool_recycle', 'pool_recycle'),
+    ('pool_timeout', 'pool_timeout'),
+    ('pool_pre_ping', 'pool_pre_ping'),
+)
+
+
+def pool_options(db_conf):
+    """Return the ``create_engine`` pool arguments, given the DB config.
+
+    Settings left unset keep SQLAlchemy's defaults. SQLite databases
+    don't use a connection queue (see Flask-SQLAlchemy's driver hacks):
+    files are connected to on every checkout, unless a ``pool_size``
+    is set, in which case each thread keeps its own connection, for at
+    most ``pool_size`` threads.
+    """
+    if db_conf.get('engine') == 'memory':
+        return {}
+    if db_conf.get('engine') == 'sqlite':
+        if not db_conf.get('pool_size'):
+            return {}
+        return {
+            'poolclass': SingletonThreadPool,
+            'pool_size': db_conf.get('pool_size'),
+        }
+    options = {'poolclass': TimedQueuePool}
+    for name, argument in POOL_OPTIONS:
+        value = db_conf.get(name)
+        if value is not None:
+            options[argument] = value
+    return options
+
+
+class TimedQueuePool(QueuePool):
+    """A queue pool recording how long checkouts wait for a connection.
+
+    :ivar int checkouts: the number of connections obtained
+    :ivar int timeouts: the number of checkouts which timed out
+    :ivar float wait_time: the total number of seconds spent obtaining
+        connections, including connecting when the pool overflows
+    :ivar float max_wait: the longest checkout, in seconds
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TimedQueuePool, self).__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self._stats_lock = Lock()
+
+    def _do_get(self):
+        start = default_timer()
+        timed_out = False
+        try:
+            return super(TimedQueuePool, self)._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            elapsed = default_timer() - start
+            with self._stats_lock:
+                if timed_out:
+                    self.timeouts += 1
+                else:
+                    self.checkouts += 1
+                self.wait_time += elapsed
+                self.max_wait = max(self.max_wait, elapsed)
+
+
+def pool_stats(pool):
+    """Return the usage statistics of a connection pool.
+
+    Only the pool's class is reported for pools other than queue
+    pools, which don't keep connections to count.
+
+    :param sqlalchemy.pool.Pool pool: an engine's pool
+    :rtype: dict
+    """
+    stats = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            stats.update(
+                checkouts=pool.checkouts,
+                timeouts=pool.timeouts,
+                wait_time=pool.wait_time,
+                max_wait=pool.max_wait,
+                mean_wait=pool.wait_time / max(
+                    pool.checkouts + pool.timeouts, 1
+                ),
+            )
+    return stats
@@ -0,0 +1,171 @@
+"""Route read-only queries to replica databases.
+
+Replicas are registered as Flask-SQLAlchemy binds, named
+``replica_0``, ``replica_1``, and so on, so that their engines are
+configured like the primary's. A :class:`RoutingSession` marked as
+reading (see :meth:`RoutingSession.read_from_replica`) sends its
+queries to one of the replicas, chosen round-robin, until it is
+marked as writing again. Flushes and Core writes always go to the
+primary.
+
+For ``window`` seconds after a transaction writing to the primary is
+committed, every query is sent to the primary, so that clients read
+their own writes despite replication lag. The window is tracked per
+process, so clients whose requests are served by other processes are
+not covered.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+from itertools import count
+from threading import Lock
+from time import time
+from weakref import WeakKeyDictionary
+
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+from sqlalchemy.sql.dml import UpdateBase
+
+from .events import on_commit
+from .sqlite import set_pragmas
+
+
+EXTENSION = 'replicas'
+BIND_FORMAT = 'replica_{}'
+REPLICA = 'replica'
+
+
+class Router(object):
+    """Choose replicas, and track the read-your-writes window.
+
+    :ivar list binds: the bind keys of the replicas
+    :ivar float window: the number of seconds after a commit during
+        which all queries go to the primary
+    """
+
+    def __init__(self, binds, window=5.0):
+        """Instantiate the router.
+
+        :param list binds: the bind keys of the replicas
+        :param float window: the read-your-writes window, in seconds
+        """
+        self.binds = list(binds)
+        self.window = window
+        self.last_write = None
+        self._counter = count()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        """Route the app's sessions, and track its commits."""
+        app.extensions[EXTENSION] = self
+        on_commit(app, self.committed)
+
+    def committed(self, changes):
+        """Open the read-your-writes window."""
+        self.last_write = time()
+
+    @property
+    def writing(self):
+        """Whether the read-your-writes window is open."""
+        last_write = self.last_write
+        return last_write is not None and time() - last_write < self.window
+
+    def next_bind(self):
+        """Return the bind key of the next replica, round-robin."""
+        with self._lock:
+            index = next(self._counter)
+        return self.binds[index % len(self.binds)]
+
+
+class RoutingSession(SignallingSession):
+    """A session sending reads to replicas, if asked to."""
+
+    def read_from_replica(self):
+        """Send the following reads to a replica, if there are any.
+
+        The same replica is used until :meth:`write_to_primary` is
+        called, so that reads are consistent with one another.
+        """
+        router = self.app.extensions.get(EXTENSION)
+        if router is not None and router.binds:
+            self.info[REPLICA] = router.next_bind()
+
+    def write_to_primary(self):
+        """Send all following queries to the primary."""
+        self.info.pop(REPLICA, None)
+
+    def get_bind(self, mapper=None, clause=None):
+        """Return the replica engine for reads, if any, or the primary."""
+        bind = self.info.get(REPLICA)
+        if (
+            bind is None
+            or self._flushing
+            or isinstance(clause, UpdateBase)
+            or self.app.extensions[EXTENSION].writing
+        ):
+            return super(RoutingSession, self).get_bind(mapper, clause)
+        return self.app.extensions['sqlalchemy'].db.get_engine(
+            self.app, bind=bind
+        )
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy, creating :class:`RoutingSession` sessions.
+
+    The ``SQLALCHEMY_ENGINE_OPTIONS`` app config, a mapping of
+    ``create_engine`` keyword arguments, is passed to every engine. The
+    ``SQLITE_PRAGMAS`` app config maps bind keys (``None`` for the
+    primary) to the pragmas set on the connections of SQLite engines
+    (see :mod:`.sqlite`).
+
+    :ivar list engine_hooks: callables called as ``hook(engine, bind)``
+        with every engine, e.g. to listen to its events (see
+        :meth:`add_engine_hook`)
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.engine_hooks = []
+        self._set_up = WeakKeyDictionary()
+        super(RoutingSQLAlchemy, self).__init__(*args, **kwargs)
+
+    def add_engine_hook(self, hook):
+        """Call ``hook(engine, bind)`` with existing and new engines."""
+        with self._engine_lock:
+            self.engine_hooks.append(hook)
+            engines = list(self._set_up.items())
+        for engine, bind in engines:
+            hook(engine, bind)
+
+    def get_engine(self, app=None, bind=None):
+        """Return an engine, setting it up when it's created."""
+        app = self.get_app(app)
+        engine = super(RoutingSQLAlchemy, self).get_engine(app, bind)
+        if engine not in self._set_up:
+            with self._engine_lock:
+                if engine not in self._set_up:
+                    self._set_up[engine] = bind
+                    self.set_up_engine(app, engine, bind)
+        return engine
+
+    def set_up_engine(self, app, engine, bind):
+        """Set the pragmas of a new engine, and call the engine hooks."""
+        if engine.dialect.name == 'sqlite':
+            pragmas = app.config.get('SQLITE_PRAGMAS', {}).get(bind)
+            if pragmas:
+                set_pragmas(engine, pragmas)
+        for hook in self.engine_hooks:
+            hook(engine, bind)
+
+    def apply_driver_hacks(self, app, info, options):
+        """Apply the configured engine options, then the driver hacks."""
+        options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        super(RoutingSQLAlchemy, self).apply_driver_hacks(app, info, options)
+
+    def create_session(self, options):
+        """Return a factory of routing sessions."""
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def replica_binds(uris):
+    """Return a ``SQLALCHEMY_BINDS`` mapping for the replica URIs."""
+    return {BIND_FORMAT.format(i): uri for i, uri in enumerate(uris)}
@@ -0,0 +1,240 @@
+"""Load lightweight records instead of ORM objects, for reading.
+
+Loading ORM objects for a read-only representation costs more than
+the queries themselves: each row is hydrated into an instance with
+attribute instrumentation, tracked by the session's identity map, and
+its relationships are loaded into instrumented collections. A
+:class:`RowLoader` instead selects only the columns needed, executes
+the statements of column-only queries, and builds plain records from
+the row tuples.
+Related rows of many-to-many relationships are fetched with a single
+query per relationship (for each chunk of parent ids), joining the
+association table to the related table.
+
+Records have the mapped attributes of their model, as well as its
+properties (e.g. ``href``), so that dumping them produces the same
+representation as dumping ORM objects.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+from collections import defaultdict
+
+from sqlalchemy.orm import ColumnProperty
+
+from .bulk import unique
+
+
+_RECORDS = {}
+
+
+def record_class(model):
+    """Return the record class of the model.
+
+    Records have a slot for each of the model's mapped attributes, and
+    the model's properties and ``__resource__``. Classes are created
+    once per model.
+    """
+    try:
+        return _RECORDS[model]
+    except KeyError:
+        pass
+    mapper = model.__mapper__
+    attrs = {
+        '__slots__': tuple(str(key) for key in mapper.attrs.keys()),
+        '__resource__': getattr(model, '__resource__', None),
+        '__module__': __name__,
+    }
+    for cls in reversed(model.__mro__):
+        for name, value in vars(cls).items():
+            if isinstance(value, property) and name not in mapper.attrs:
+                attrs[name] = value
+    record = type(str('{}Record'.format(model.__name__)), (object,), attrs)
+    return _RECORDS.setdefault(model, record)
+
+
+def _column_names(mapper, names):
+    """Return the names of the mapper's single-column attributes."""
+    return [
+        name for name in names
+        if name in mapper.column_attrs
+        and len(mapper.column_attrs[name].columns) == 1
+    ]
+
+
+class RowLoader(object):
+    """Load records with the columns and relationships to be dumped.
+
+    :ivar model: the ORM class of the loaded rows
+    :ivar list columns: the model attributes to select, which always
+        start with the primary key
+    :ivar list relationships: ``(prop, columns)`` pairs, for the
+        relationships to load, and the related model attributes to
+        select for each of them
+
+    Use :meth:`for_fields` to retrieve a cached instance.
+    """
+
+    _loaders = {}
+
+    def __init__(self, model, field_names, columns=(), related_columns=(),
+                 chunk_size=500):
+        """Plan what to load.
+
+        :param model: a sqlalchemy ORM class
+        :param Iterable[str] field_names: the names of the fields to be
+            dumped
+        :param Iterable[str] columns: the names of additional columns to
+            load, e.g. for ordering or versioning
+        :param Iterable[str] related_columns: the names of additional
+            columns to load from related rows, where they exist
+        :param int chunk_size: the maximum number of parent ids in each
+            ``IN`` clause of relationship queries
+        :raises ValueError: if some fields can't be loaded as records
+        """
+        if not self.supports(model, field_names):
+            raise ValueError(
+                'Fields of {} which are not columns, many-to-many '
+                'relationships or properties are not supported.'.format(
+                    model.__name__
+                )
+            )
+        mapper = model.__mapper__
+        names = ['id'] + [
+            name for name in list(field_names) + list(columns)
+            if name != 'id'
+        ]
+        self.model = model
+        self.chunk_size = chunk_size
+        self.columns = [
+            getattr(model, name)
+            for name in unique(_column_names(mapper, names))
+        ]
+        self.relationships = []
+        for name in field_names:
+            if name not in mapper.relationships:
+                continue
+            prop = mapper.relationships[name]
+            related = prop.mapper.class_
+            related_names = _column_names(
+                prop.mapper,
+                ['id'] + list(related.__nested__) + list(related_columns),
+            )
+            self.relationships.append((
+                prop,
+                [getattr(related, name) for name in unique(related_names)],
+            ))
+
+    @classmethod
+    def for_fields(cls, model, field_names, columns=(), related_columns=(),
+                   chunk_size=500):
+        """Return the loader for the model and fields, or None.
+
+        Loaders are planned on first use and cached. None is returned
+        if some fields can't be loaded as records.
+        """
+        key = (
+            model,
+            tuple(field_names),
+            tuple(columns),
+            tuple(related_columns),
+            chunk_size,
+        )
+        try:
+            return cls._loaders[key]
+        except KeyError:
+            pass
+        loader = None
+        if cls.supports(model, field_names):
+            loader = cls(
+                model, field_names, columns, related_columns, chunk_size
+            )
+        return cls._loaders.setdefault(key, loader)
+
+    @staticmethod
+    def supports(model, field_names):
+        """Whether the fields may be loaded and dumped from records.
+
+        Fields must be columns, properties of the model, or many-to-many
+        relationships whose related models' ``__nested__`` names are
+        columns or properties.
+        """
+        mapper = model.__mapper__
+        for name in field_names:
+            if name in mapper.relationships:
+                prop = mapper.relationships[name]
+                if prop.secondary is None:
+                    return False
+                if len(prop.synchronize_pairs) != 1:
+                    return False
+                if not all(
+                    _is_simple(prop.mapper, nested)
+                    for nested in prop.mapper.class_.__nested__
+                ):
+                    return False
+            elif not _is_simple(mapper, name):
+                return False
+        return True
+
+    def records(self, rows, columns):
+        """Build records from row tuples of the given columns."""
+        record = record_class(columns[0].class_)
+        keys = [column.key for column in columns]
+        records = []
+        for row in rows:
+            obj = record()
+            for key, value in zip(keys, row):
+                setattr(obj, key, value)
+            records.append(obj)
+        return records
+
+    def load(self, session, query):
+        """Return the records of the rows the query selects.
+
+        :param sqlalchemy.orm.session.Session session: the session with
+            which to query related rows
+        :param sqlalchemy.orm.query.Query query: a query selecting the
+            loader's ``columns``, in order. Its statement is executed
+            directly, so not even keyed tuples are built for its rows.
+        :rtype: list
+        """
+        rows = session.execute(query.statement).fetchall()
+        records = self.records(rows, self.columns)
+        for prop, columns in self.relationships:
+            self.load_related(session, records, prop, columns)
+        return records
+
+    def load_related(self, session, records, prop, columns):
+        """Set the related records of a many-to-many relationship.
+
+        Related records are ordered by the relationship's ``order_by``,
+        if any, or by primary key.
+        """
+        ((local, local_fk),) = prop.synchronize_pairs
+        ((remote, remote_fk),) = prop.secondary_synchronize_pairs
+        order_by = prop.order_by or [prop.mapper.class_.id]
+        ids = [record.id for record in records]
+        related = defaultdict(list)
+        for start in range(0, len(ids), self.chunk_size):
+            chunk = ids[start:start + self.chunk_size]
+            query = (
+                session.query(local_fk, *columns)
+                .select_from(prop.secondary)
+                .join(prop.mapper.local_table, remote == remote_fk)
+                .filter(local_fk.in_(chunk))
+                .order_by(local_fk, *order_by)
+            )
+            rows = session.execute(query.statement).fetchall()
+            objs = self.records([row[1:] for row in rows], columns)
+            for row, obj in zip(rows, objs):
+                related[row[0]].append(obj)
+        for record in records:
+            setattr(record, prop.key, related.get(record.id, []))
+
+
+def _is_simple(mapper, name):
+    """Whether a name is a single column, or a property, of the mapper."""
+    if name in mapper.attrs:
+        prop = mapper.attrs[name]
+        return isinstance(prop, ColumnProperty) and len(prop.columns) == 1
+    return isinstance(getattr(mapper.class_, name, None), property)
@@ -0,0 +1,85 @@
+"""Tune SQLite connections with pragmas.
+
+SQLite's defaults favour durability and compatibility: a rollback
+journal, during which readers and the writer block each other, a full
+sync on every commit, and a small page cache. Pragmas changing these
+are set on every new connection, from the SQLite config. A profile
+gives defaults for all of them, and each may be set individually.
+
+The ``throughput`` profile uses write-ahead logging, so that readers
+never block the writer nor the writer readers, and syncs only at
+checkpoints, so that a power loss may lose the last commits, but can't
+corrupt the database.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+from collections import OrderedDict
+
+from sqlalchemy import event
+
+
+#: Pragma values by profile name.
+PROFILES = {
+    'default': {},
+    'throughput': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'busy_timeout': 5000,
+    },
+}
+
+#: The pragmas which may be configured, in the order they are set.
+PRAGMAS = (
+    'journal_mode',
+    'synchronous',
+    'mmap_size',
+    'cache_size',
+    'busy_timeout',
+)
+
+
+def sqlite_pragmas(sqlite_conf):
+    """Return the pragmas to set, given the SQLite config.
+
+    :returns: pragma values by name
+    :rtype: collections.OrderedDict
+    :raises ValueError: if the profile is unknown
+    """
+    profile = sqlite_conf.get('profile')
+    if profile not in PROFILES:
+        raise ValueError(
+            'Unknown SQLite profile {!r}, expected one of {}.'.format(
+                profile, ', '.join(sorted(PROFILES))
+            )
+        )
+    pragmas = OrderedDict()
+    for name in PRAGMAS:
+        value = sqlite_conf.get(name)
+        if value is None:
+            value = PROFILES[profile].get(name)
+        if value is not None:
+            pragmas[name] = value
+    return pragmas
+
+
+def set_pragmas(engine, pragmas):
+    """Set the pragmas on each of the engine's new connections.
+
+    :param sqlalchemy.engine.Engine engine: a SQLite engine
+    :param dict pragmas: pragma values by name
+    """
+    statements = [
+        'PRAGMA {}={}'.format(name, value) for name, value in pragmas.items()
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
@@ -0,0 +1,146 @@
+"""Count and time the SQL statements of each request.
+
+The statements executed while handling a request are counted and
+timed, and the totals are reported in the response's ``Server-Timing``
+header, e.g. ``db;desc="7 queries";dur=12.5``, along with the time
+spent handling the request. Statements taking at least ``slow_ms``
+milliseconds are logged with their parameters and the endpoint which
+executed them, whether in a request or not.
+
+Statements executed once the response has been returned, while a
+streamed body is generated, are not included in the header.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+from logging import getLogger
+from timeit import default_timer
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+
+log = getLogger(__name__)
+
+EXTENSION = 'sql_timing'
+STATS = 'sql_timing'
+STARTS = 'sql_timing_starts'
+
+#: The maximum length of the logged parameters of a statement.
+MAX_PARAMETERS_LENGTH = 1000
+
+
+class RequestStats(object):
+    """The statements executed by a request, and their duration.
+
+    :ivar float start: when handling the request began
+    :ivar int queries: the number of statements executed
+    :ivar float duration: their total duration, in seconds
+    """
+
+    def __init__(self):
+        self.start = default_timer()
+        self.queries = 0
+        self.duration = 0.0
+
+    def server_timing(self):
+        """Return the value of the ``Server-Timing`` header."""
+        return 'db;desc="{} queries";dur={:.3f}, app;dur={:.3f}'.format(
+            self.queries,
+            self.duration * 1000,
+            (default_timer() - self.start) * 1000,
+        )
+
+
+class QueryTimer(object):
+    """Time the statements executed by an app's engines.
+
+    :ivar float slow_ms: the duration from which statements are logged,
+        in milliseconds, or None not to log statements
+    :ivar bool server_timing: whether to add ``Server-Timing`` headers
+    """
+
+    def __init__(self, slow_ms=None, server_timing=True):
+        """Instantiate the timer.
+
+        :param float slow_ms: the duration from which statements are
+            logged, in milliseconds, or None
+        :param bool server_timing: whether to add ``Server-Timing``
+            headers to responses
+        """
+        self.slow_ms = slow_ms
+        self.server_timing = server_timing
+
+    @classmethod
+    def from_conf(cls, conf):
+        """Instantiate the timer from a logging config."""
+        return cls(
+            slow_ms=conf.get('SLOW_QUERY_MS'),
+            server_timing=conf.get('SERVER_TIMING'),
+        )
+
+    def init_app(self, app, db):
+        """Time the statements of the app's requests.
+
+        :param flask.Flask app: the application
+        :param my_library.db.routing.RoutingSQLAlchemy db: the app's
+            Flask-SQLAlchemy instance, whose engines are instrumented
+        """
+        app.extensions[EXTENSION] = self
+        db.add_engine_hook(self.instrument)
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+
+    def instrument(self, engine, bind=None):
+        """Listen to the engine's statement executions."""
+        event.listen(engine, 'before_cursor_execute', self.before_execute)
+        event.listen(engine, 'after_cursor_execute', self.after_execute)
+        event.listen(engine, 'handle_error', self.handle_error)
+
+    def start_request(self):
+        """Start counting the current request's statements."""
+        setattr(g, STATS, RequestStats())
+
+    def finish_request(self, response):
+        """Report the current request's statements in a header."""
+        stats = g.get(STATS)
+        if self.server_timing and stats is not None:
+            response.headers.add('Server-Timing', stats.server_timing())
+        return response
+
+    def before_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        conn.info.setdefault(STARTS, []).append((context, default_timer()))
+
+    def after_execute(self, conn, cursor, statement, parameters, context,
+                      executemany):
+        starts = conn.info.get(STARTS)
+        if not starts:
+            return
+        elapsed = default_timer() - starts.pop()[1]
+        in_request = has_request_context()
+        if in_request:
+            stats = g.get(STATS)
+            if stats is not None:
+                stats.queries += 1
+                stats.duration += elapsed
+        if self.slow_ms is not None and elapsed * 1000 >= self.slow_ms:
+            log.warning(
+                'Slow query (%.1f ms, endpoint %s): %s; parameters: %s',
+                elapsed * 1000,
+                request.endpoint if in_request else None,
+                statement,
+                repr(parameters)[:MAX_PARAMETERS_LENGTH],
+            )
+
+    def handle_error(self, context):
+        """Forget the start of a statement which raised an error.
+
+        Otherwise, the start would stay on the pooled connection, and
+        be taken for that of a later statement.
+        """
+        if context.connection is None:
+            return
+        starts = context.connection.info.get(STARTS)
+        if starts and starts[-1][0] is context.execution_context:
+            starts.pop()
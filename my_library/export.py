@@ -0,0 +1,229 @@
+"""Export all rows of a model to an NDJSON or CSV file.
+
+Rows are read in primary key order by a single query, whose results
+are streamed from a server-side cursor (where the database supports
+it) and loaded ``batch_size`` at a time, so memory use does not grow
+with the table. Each row is dumped with the model's precompiled dumper,
+so the exported items are those of the API's representations.
+
+Batches are written in order, each as a separate gzip member when
+compressing, so that the file is valid whenever a batch is complete.
+After each batch, a checkpoint file beside the output records the last
+exported id, the output's size and, for CSV, the columns of its header.
+An interrupted export may then be resumed: the output is truncated to
+the checkpoint's size, and rows following its last id are exported,
+with the columns of the header. The checkpoint is removed once the
+export completes.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import gzip
+import io
+import json
+import os
+
+from .resources.formats import csv_row, ndjson_lines
+
+
+#: The supported export formats.
+FORMATS = ('ndjson', 'csv')
+
+
+def checkpoint_path(output):
+    """Return the path of the checkpoint file of an export."""
+    return '{}.checkpoint'.format(output)
+
+
+def read_checkpoint(output):
+    """Return the checkpoint of an interrupted export, or None."""
+    try:
+        with io.open(checkpoint_path(output), encoding='utf-8') as f:
+            return json.load(f)
+    except (IOError, OSError):
+        return None
+
+
+def write_checkpoint(output, checkpoint):
+    """Atomically replace the checkpoint of an export."""
+    path = checkpoint_path(output)
+    temporary = '{}.tmp'.format(path)
+    with io.open(temporary, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(checkpoint, sort_keys=True))
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(temporary, path)
+
+
+class Exporter(object):
+    """Write the dumped rows of a model to a file.
+
+    :ivar model: the ORM class whose rows are exported
+    :ivar str format: ``ndjson`` or ``csv``
+    :ivar bool compress: whether the output is gzipped
+    :ivar int batch_size: the number of rows loaded, and written, at a
+        time
+    :ivar list columns: the CSV columns, which are the keys of the
+        first item written, unless set beforehand (e.g. when resuming)
+    """
+
+    def __init__(self, session, model, format='ndjson', compress=False,
+                 batch_size=1000):
+        """Plan the export.
+
+        :param sqlalchemy.orm.session.Session session: the session with
+            which to query rows
+        :param model: an ORM class, with a spec and an integer ``id``
+        :param str format: ``ndjson`` or ``csv``
+        :param bool compress: whether to gzip the output
+        :param int batch_size: the number of rows loaded at a time
+        :raises ValueError: if the format is unknown
+        """
+        if format not in FORMATS:
+            raise ValueError(
+                'Unknown format {!r}, expected one of {}.'.format(
+                    format, ', '.join(FORMATS)
+                )
+            )
+        self.session = session
+        self.model = model
+        self.format = format
+        self.compress = compress
+        self.batch_size = batch_size
+        self.columns = None
+
+    def query(self, after=None):
+        """Return a streaming query for the rows following ``after``."""
+        model = self.model
+        query = self.session.query(model).options(*model.eager_options)
+        if after is not None:
+            query = query.filter(model.id > after)
+        return (
+            query.order_by(model.id)
+            .execution_options(stream_results=True)
+            .yield_per(self.batch_size)
+        )
+
+    def batches(self, after=None):
+        """Yield lists of dumped items, ``batch_size`` long at most."""
+        dump_one = self.model.dumper().dump_one
+        batch = []
+        for item in self.query(after):
+            batch.append(dump_one(item))
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def encode(self, items, header=False):
+        """Return the bytes of a batch of items, as written.
+
+        :param list items: dumped items
+        :param bool header: whether to write a CSV header row first,
+            if this is the first batch
+        """
+        if self.format == 'ndjson':
+            text = ''.join(ndjson_lines(items))
+        else:
+            if self.columns is None:
+                self.columns = list(items[0])
+            lines = [csv_row(self.columns)] if header else []
+            lines.extend(
+                csv_row([item.get(key) for key in self.columns])
+                for item in items
+            )
+            text = ''.join(lines)
+        data = text.encode('utf-8')
+        if not self.compress:
+            return data
+        buffer = io.BytesIO()
+        # A fixed mtime makes exports of the same rows identical.
+        with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as member:
+            member.write(data)
+        return buffer.getvalue()
+
+    def write(self, stream, after=None, offset=0, on_batch=None):
+        """Write the rows following ``after`` to a binary stream.
+
+        :param stream: a binary file object, positioned at ``offset``
+        :param int after: the id after which to export rows, if any
+        :param int offset: the number of bytes already written to the
+            stream. A CSV header is written if this is 0.
+        :param on_batch: a function called with the last id written,
+            the number of bytes written so far, and the number of rows
+            in the batch, after each batch is written and flushed
+        :returns: the number of rows written
+        :rtype: int
+        """
+        count = 0
+        for batch in self.batches(after):
+            data = self.encode(batch, header=not (offset or count))
+            stream.write(data)
+            stream.flush()
+            offset += len(data)
+            count += len(batch)
+            if on_batch is not None:
+                on_batch(batch[-1]['id'], offset, len(batch))
+        return count
+
+    def export(self, output, resume=False, on_batch=None):
+        """Export the rows to a file, resuming if there's a checkpoint.
+
+        :param str output: the path of the output file
+        :param bool resume: whether to resume an interrupted export
+            from its checkpoint. Otherwise, the output is overwritten.
+        :param on_batch: see :meth:`write`
+        :returns: the number of rows written, excluding those written
+            before resuming
+        :rtype: int
+        :raises ValueError: if the checkpoint is of a different export,
+            or of a CSV export without columns
+        """
+        settings = {
+            'model': self.model.__name__,
+            'format': self.format,
+            'compress': self.compress,
+        }
+        checkpoint = read_checkpoint(output) if resume else None
+        if checkpoint is not None:
+            for key, value in settings.items():
+                if checkpoint.get(key) != value:
+                    raise ValueError(
+                        'The checkpoint of {} has {} {!r}, not {!r}.'.format(
+                            output, key, checkpoint.get(key), value
+                        )
+                    )
+            self.columns = checkpoint.get('columns')
+            if self.format == 'csv' and self.columns is None:
+                raise ValueError(
+                    'The checkpoint of {} has no CSV columns.'.format(output)
+                )
+            stream = io.open(output, 'r+b')
+            stream.truncate(checkpoint['offset'])
+            stream.seek(checkpoint['offset'])
+        else:
+            checkpoint = dict(settings, last_id=None, offset=0, rows=0)
+            stream = io.open(output, 'wb')
+
+        def record(last_id, offset, rows):
+            os.fsync(stream.fileno())
+            checkpoint.update(
+                last_id=last_id,
+                offset=offset,
+                rows=checkpoint['rows'] + rows,
+                columns=self.columns,
+            )
+            write_checkpoint(output, checkpoint)
+            if on_batch is not None:
+                on_batch(last_id, offset, rows)
+
+        with stream:
+            count = self.write(
+                stream, checkpoint['last_id'], checkpoint['offset'], record
+            )
+        try:
+            os.remove(checkpoint_path(output))
+        except OSError:
+            pass
+        return count
@@ -0,0 +1,338 @@
+"""Import rows of a model from NDJSON or CSV files, in bulk.
+
+Items are read ``batch_size`` at a time, loaded with the model's
+``row_spec``, and written with a :class:`my_library.db.bulk.CopyUpsert`:
+items with existing ids are updated, and others inserted, with
+``executemany`` or, on PostgreSQL, ``COPY``. Items without ids are
+given ids following the largest in the table, so that they too are
+inserted in bulk. Transactions are committed every ``transaction_size``
+items, so an import may be resumed after the last committed item.
+
+Many-to-many relationships are given as lists of related ids, or of
+related items, as exported (e.g. ``{"id": 1, "name": "..."}``). Related
+items without ids are identified by the values of their model's
+``__nested__`` names, e.g. authors by name, which may also be given
+alone (e.g. ``"Søren Kierkegaard"``). Those found in neither the
+database nor the import so far are created, if they have the data
+required to be, and are otherwise reported as invalid. The values and
+ids of related rows are kept in memory, so that each is looked up or
+created once per import.
+
+CSV files have a header row of field names. Empty cells are null, and
+cells of relationships hold JSON lists, as exported by
+:mod:`my_library.export`.
+
+Rows are imported without regard for concurrent writes, so ids given
+to new rows may conflict with those of rows inserted meanwhile.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import csv
+import json
+from collections import OrderedDict
+from itertools import islice
+
+from sqlalchemy import func, select
+
+from .db.bulk import CREATED, INVALID, UPDATED, CopyUpsert
+
+
+#: The supported import formats.
+FORMATS = ('ndjson', 'csv')
+
+
+def read_ndjson(lines):
+    """Yield the items of NDJSON lines, skipping blank lines."""
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(lines, model):
+    """Yield the items of CSV lines, with a header row.
+
+    Empty cells are null, and the cells of the model's many-to-many
+    relationships are decoded from JSON.
+    """
+    relationships = model.__mapper__.relationships
+    for row in csv.DictReader(lines):
+        item = {}
+        for key, value in row.items():
+            if value == '':
+                value = None
+            elif key in relationships:
+                value = json.loads(value)
+            item[key] = value
+        yield item
+
+
+def batched(items, size):
+    """Yield successive lists of at most ``size`` items."""
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+class IdAllocator(object):
+    """Allocate ids following the largest of a table's.
+
+    Ids are counted in memory from the table's largest id when first
+    allocated, skipping past the ids of the import's rows.
+    """
+
+    def __init__(self, session, table):
+        self.session = session
+        self.table = table
+        self.next_id = None
+        self.largest_seen = 0
+
+    def see(self, id):
+        """Ensure the id is never allocated."""
+        self.largest_seen = max(self.largest_seen, id)
+        if self.next_id is not None and id >= self.next_id:
+            self.next_id = id + 1
+
+    def allocate(self, count):
+        """Return ``count`` new ids."""
+        if self.next_id is None:
+            largest = self.session.execute(
+                select([func.max(self.table.c.id)])
+            ).scalar()
+            self.next_id = max(largest or 0, self.largest_seen) + 1
+        ids = list(range(self.next_id, self.next_id + count))
+        self.next_id += count
+        return ids
+
+
+class RelatedIndex(object):
+    """Find or create related rows, by id or ``__nested__`` values.
+
+    :ivar model: the related model
+    :ivar tuple keys: the names of the values identifying related rows
+        given without ids
+    """
+
+    def __init__(self, session, model, chunk_size=500):
+        self.session = session
+        self.model = model
+        self.keys = tuple(
+            key for key in model.__nested__
+            if key in model.__mapper__.column_attrs
+        )
+        self.ids = IdAllocator(session, model.__table__)
+        self.upsert = CopyUpsert(session, model, chunk_size)
+        self._index = None
+
+    @property
+    def index(self):
+        """The ids of related rows, by their values of ``keys``."""
+        if self._index is None:
+            table = self.model.__table__
+            columns = [table.c[key] for key in self.keys] + [table.c.id]
+            self._index = {}
+            rows = self.session.execute(
+                select(columns).order_by(table.c.id.desc())
+            )
+            for row in rows:
+                self._index[tuple(row[:-1])] = row[-1]
+        return self._index
+
+    def key(self, ref):
+        """Return the identifying values of a related item."""
+        return tuple(ref.get(key) for key in self.keys)
+
+    def normalize(self, ref):
+        """Return a related item as a dict, or its id."""
+        if isinstance(ref, (dict, int)):
+            return ref
+        if len(self.keys) == 1:
+            return {self.keys[0]: ref}
+        return ref
+
+    def resolve(self, items, key):
+        """Replace related items without ids with ids, creating rows.
+
+        :param list items: ``(index, item)`` pairs
+        :param str key: the relationship's name in the items
+        :returns: the errors of items whose related items are invalid,
+            by index, and the number of related rows created
+        :rtype: tuple
+        """
+        new = OrderedDict()
+        for _, item in items:
+            refs = item.get(key)
+            if not isinstance(refs, list):
+                continue
+            refs[:] = [self.normalize(ref) for ref in refs]
+            for ref in refs:
+                if isinstance(ref, dict) and ref.get('id') is None:
+                    values = self.key(ref)
+                    if values not in self.index and values not in new:
+                        new[values] = ref
+
+        errors = {}
+        created = 0
+        if new:
+            refs = list(new.values())
+            schema = self.model.row_spec(many=True, partial=True)
+            rows, load_errors = schema.load({schema.envelope_key: refs})
+            valid = []
+            for index, (ref, row) in enumerate(zip(refs, rows)):
+                if index in load_errors:
+                    new[self.key(ref)] = load_errors[index]
+                    continue
+                valid.append(row)
+            for row, id in zip(valid, self.ids.allocate(len(valid))):
+                row['id'] = id
+            results = self.upsert(list(enumerate(valid)))
+            for index, row in enumerate(valid):
+                status, value = results[index]
+                values = tuple(row.get(name) for name in self.keys)
+                if status == INVALID:
+                    new[values] = value
+                else:
+                    self.index[values] = row['id']
+                    created += 1
+
+        for index, item in items:
+            refs = item.get(key)
+            if not isinstance(refs, list):
+                continue
+            for position, ref in enumerate(refs):
+                if not isinstance(ref, dict) or ref.get('id') is not None:
+                    continue
+                values = self.key(ref)
+                if values in self.index:
+                    refs[position] = self.index[values]
+                else:
+                    errors.setdefault(index, {}).setdefault(key, {})[
+                        position
+                    ] = new.get(values)
+        return errors, created
+
+
+class Importer(object):
+    """Write items read from a file to a model's table.
+
+    :ivar model: the ORM class whose rows are imported
+    :ivar int batch_size: the number of items loaded and written at a
+        time
+    :ivar int transaction_size: the number of items written in each
+        transaction, rounded up to a number of batches
+    :ivar bool links: whether to write the items' many-to-many links.
+        Without them, e.g. authors may be imported before the books
+        they'd link to.
+    :ivar int max_errors: the number of invalid items whose errors are
+        kept
+    """
+
+    def __init__(self, session, model, batch_size=1000,
+                 transaction_size=10000, links=True, max_errors=100):
+        self.session = session
+        self.model = model
+        self.batch_size = batch_size
+        self.transaction_size = transaction_size
+        self.links = links
+        self.max_errors = max_errors
+        self.upsert = CopyUpsert(session, model, batch_size)
+        self.ids = IdAllocator(session, model.__table__)
+        self.related = {
+            key: RelatedIndex(session, prop.mapper.class_, batch_size)
+            for key, prop in self.upsert.links.items()
+        }
+        self.counts = {CREATED: 0, UPDATED: 0, INVALID: 0, 'related': 0}
+        self.errors = []
+
+    def prepare(self, items, offset):
+        """Load a batch of items, returning rows and errors by index.
+
+        :param list items: the raw items
+        :param int offset: the number of items before the batch, so
+            that errors refer to items by their position in the file
+        """
+        errors = {}
+        pairs = []
+        for index, item in enumerate(items, offset):
+            if not isinstance(item, dict):
+                errors[index] = {'_schema': ['Invalid input type.']}
+                continue
+            if not self.links:
+                for key in self.upsert.links:
+                    item.pop(key, None)
+            pairs.append((index, item))
+        for key, index in self.related.items():
+            related_errors, created = index.resolve(pairs, key)
+            errors.update(related_errors)
+            self.counts['related'] += created
+        pairs = [(index, item) for index, item in pairs if index not in errors]
+
+        schema = self.model.row_spec(many=True, partial=True)
+        rows, load_errors = schema.load(
+            {schema.envelope_key: [item for _, item in pairs]}
+        )
+        loaded = []
+        for position, ((index, _), row) in enumerate(zip(pairs, rows)):
+            if position in load_errors:
+                errors[index] = load_errors[position]
+            else:
+                loaded.append((index, row))
+        for _, row in loaded:
+            if row.get('id') is not None:
+                self.ids.see(row['id'])
+        return loaded, errors
+
+    def write(self, items, offset):
+        """Write a batch of items, counting them and their errors."""
+        rows, errors = self.prepare(items, offset)
+        new = [row for _, row in rows if row.get('id') is None]
+        for row, id in zip(new, self.ids.allocate(len(new))):
+            row['id'] = id
+        results = self.upsert(rows)
+        results.update(
+            (index, (INVALID, errs)) for index, errs in errors.items()
+        )
+        for index in sorted(results):
+            status, value = results[index]
+            self.counts[status] += 1
+            if status == INVALID and len(self.errors) < self.max_errors:
+                self.errors.append((index, value))
+
+    def run(self, items, skip=0, on_commit=None):
+        """Import the items, committing every ``transaction_size``.
+
+        :param Iterable items: the items read from a file
+        :param int skip: the number of items to skip, e.g. those
+            committed by an interrupted import
+        :param on_commit: a function called with the number of items
+            read so far, after each commit
+        :returns: the numbers of items created, updated, and found
+            invalid, and of related rows created
+        :rtype: dict
+        """
+        offset = skip
+        uncommitted = 0
+        try:
+            for batch in batched(islice(items, skip, None), self.batch_size):
+                self.write(batch, offset)
+                offset += len(batch)
+                uncommitted += len(batch)
+                if uncommitted >= self.transaction_size:
+                    self.commit()
+                    uncommitted = 0
+                    if on_commit is not None:
+                        on_commit(offset)
+            self.commit()
+            if on_commit is not None and uncommitted:
+                on_commit(offset)
+        except Exception:
+            self.session.rollback()
+            raise
+        return dict(self.counts)
+
+    def commit(self):
+        """Commit the items written so far."""
+        self.session.commit()
@@ -0,0 +1,183 @@
+"""Encode and decode JSON with the fastest library installed.
+
+The standard library's ``json`` module spends much of a large page's
+response time encoding it. Backends wrap faster libraries, which are
+optional dependencies: ``orjson``, ``rapidjson`` (from
+``python-rapidjson``) and ``ujson`` (if its ``dumps`` takes a
+``default``). The ``auto`` backend is the first of them which
+is installed, or the standard library's.
+
+All backends encode to the same compact text, without escaping
+non-ASCII characters, and encode dates and times in ISO 8601 format,
+decimals as numbers and UUIDs as strings, so that e.g. ``Author.birth``
+may be encoded without having been dumped by a schema first.
+
+The app's backend, set by ``JSON_BACKEND``, encodes API responses, and
+is the ``json_module`` of model specs, so that the ``dumps`` and
+``loads`` methods of models use it.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import json
+from collections import OrderedDict
+from datetime import date, time
+from decimal import Decimal
+from functools import partial
+from uuid import UUID
+
+from flask import current_app, has_app_context
+
+
+EXTENSION = 'json_backend'
+
+
+def default(obj):
+    """Encode values which JSON libraries may not encode natively.
+
+    :raises TypeError: if the value can't be encoded
+    """
+    if isinstance(obj, (date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, UUID):
+        return str(obj)
+    raise TypeError('{!r} is not JSON serializable'.format(obj))
+
+
+class JSONBackend(object):
+    """A JSON library's encoding and decoding functions.
+
+    Instances may be used as the ``json_module`` of marshmallow schemas.
+
+    :ivar str name: the name of the backend
+    """
+
+    def __init__(self, name, dumps, loads):
+        """Wrap the library's functions.
+
+        :param str name: the name of the backend
+        :param dumps: a function encoding a value to text
+        :param loads: a function decoding text or bytes
+        """
+        self.name = name
+        self._dumps = dumps
+        self._loads = loads
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.name)
+
+    def dumps(self, obj, **kwargs):
+        """Encode a value to JSON text.
+
+        Keyword arguments, such as ``indent``, are only supported by the
+        standard library, which encodes values when they are given.
+        """
+        if kwargs:
+            kwargs.setdefault('default', default)
+            return json.dumps(obj, **kwargs)
+        return self._dumps(obj)
+
+    def loads(self, data, **kwargs):
+        """Decode JSON text or bytes."""
+        if kwargs:
+            return json.loads(data, **kwargs)
+        return self._loads(data)
+
+    def init_app(self, app):
+        """Use the backend for the app's responses and model specs."""
+        app.extensions[EXTENSION] = self
+
+
+def _orjson():
+    import orjson
+    options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj):
+        return orjson.dumps(obj, default=default, option=options).decode()
+
+    return JSONBackend('orjson', dumps, orjson.loads)
+
+
+def _rapidjson():
+    import rapidjson
+    return JSONBackend(
+        'rapidjson',
+        partial(rapidjson.dumps, default=default, ensure_ascii=False),
+        rapidjson.loads,
+    )
+
+
+def _ujson():
+    import ujson
+    dumps = partial(
+        ujson.dumps,
+        default=default,
+        ensure_ascii=False,
+        escape_forward_slashes=False,
+    )
+    try:
+        supported = dumps(date(2000, 1, 1)) == '"2000-01-01"'
+    except TypeError:
+        supported = False
+    if not supported:
+        raise ImportError('ujson with a dumps default is required.')
+    return JSONBackend('ujson', dumps, ujson.loads)
+
+
+def _json():
+    return JSONBackend(
+        'json',
+        partial(
+            json.dumps,
+            default=default,
+            ensure_ascii=False,
+            separators=(',', ':'),
+        ),
+        json.loads,
+    )
+
+
+#: The backend factories by name, in order of preference.
+BACKENDS = OrderedDict([
+    ('orjson', _orjson),
+    ('rapidjson', _rapidjson),
+    ('ujson', _ujson),
+    ('json', _json),
+])
+
+_INSTANCES = {}
+
+
+def get_backend(name='auto'):
+    """Return the named backend, or the first installed for ``auto``.
+
+    :raises ValueError: if the backend is unknown
+    :raises ImportError: if the backend's library isn't installed
+    """
+    if name in _INSTANCES:
+        return _INSTANCES[name]
+    if name == 'auto':
+        for candidate in BACKENDS:
+            try:
+                backend = get_backend(candidate)
+            except ImportError:
+                continue
+            return _INSTANCES.setdefault(name, backend)
+    if name not in BACKENDS:
+        raise ValueError(
+            'Unknown JSON backend {!r}, expected auto or one of {}.'.format(
+                name, ', '.join(BACKENDS)
+            )
+        )
+    return _INSTANCES.setdefault(name, BACKENDS[name]())
+
+
+def current_backend():
+    """Return the current app's backend, or the standard library's."""
+    if has_app_context():
+        backend = current_app.extensions.get(EXTENSION)
+        if backend is not None:
+            return backend
+    return get_backend('json')
@@ -0,0 +1,184 @@
+"""Expose request metrics in the Prometheus text format.
+
+Requests are counted, and their latency, response size, database time,
+and serialization time are observed in histograms, all labelled by
+endpoint, i.e. the ``endpoint_name`` of resources. The number of
+requests in progress is a gauge. Everything is served at ``/metrics``,
+unless ``METRICS_PATH`` says otherwise.
+
+With several worker processes (e.g. under gunicorn), set the
+``PROMETHEUS_MULTIPROC_DIR`` environment variable to an empty
+directory before the workers start: each process then writes its
+metrics to memory-mapped files there, and ``/metrics`` aggregates the
+files of all processes, whichever serves it. The gunicorn config
+should also include ``child_exit = my_library.metrics.child_exit``, so
+that the requests in progress of dead workers are dropped.
+
+Database time is that counted by :mod:`my_library.db.timing`, and
+serialization time that spent dumping objects in
+:func:`timed_serialization` blocks. Bodies streamed after the response
+is returned are not included in either, nor in the latency.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+from contextlib import contextmanager
+from os import environ
+from timeit import default_timer
+
+from flask import Response, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+from my_library.db.timing import STATS as SQL_STATS
+
+
+EXTENSION = 'metrics'
+START = 'metrics_start'
+ENDPOINT = 'metrics_endpoint'
+SERIALIZATION = 'serialization_time'
+
+#: The bucket bounds of response sizes, in bytes.
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+def multiprocess_dir():
+    """Return the directory of multiprocess metrics, or None."""
+    return (
+        environ.get('PROMETHEUS_MULTIPROC_DIR')
+        or environ.get('prometheus_multiproc_dir')
+    )
+
+
+def child_exit(server, worker):
+    """Drop a dead gunicorn worker's live metrics."""
+    if multiprocess_dir():
+        multiprocess.mark_process_dead(worker.pid)
+
+
+@contextmanager
+def timed_serialization():
+    """Add the time spent in the block to the request's serialization."""
+    start = default_timer()
+    try:
+        yield
+    finally:
+        if has_request_context():
+            elapsed = default_timer() - start
+            setattr(g, SERIALIZATION, g.get(SERIALIZATION, 0.0) + elapsed)
+
+
+class Metrics(object):
+    """Request metrics, observed in request hooks.
+
+    Metrics are registered in a registry of their own, so that several
+    apps may be created in a process.
+    """
+
+    def __init__(self, path='/metrics'):
+        """Define the metrics.
+
+        :param str path: the URL path at which to serve the metrics
+        """
+        self.path = path
+        self.registry = CollectorRegistry(auto_describe=True)
+        labels = ('endpoint', 'method')
+        self.requests = Counter(
+            'http_requests_total',
+            'Requests handled.',
+            labels + ('status',),
+            registry=self.registry,
+        )
+        self.latency = Histogram(
+            'http_request_duration_seconds',
+            'Time spent handling requests.',
+            labels,
+            registry=self.registry,
+        )
+        self.size = Histogram(
+            'http_response_size_bytes',
+            'Size of response bodies, as sent.',
+            labels,
+            buckets=SIZE_BUCKETS,
+            registry=self.registry,
+        )
+        self.db_time = Histogram(
+            'http_request_db_seconds',
+            'Time spent executing SQL statements per request.',
+            labels,
+            registry=self.registry,
+        )
+        self.serialization_time = Histogram(
+            'http_request_serialization_seconds',
+            'Time spent serializing representations per request.',
+            labels,
+            registry=self.registry,
+        )
+        self.in_progress = Gauge(
+            'http_requests_in_progress',
+            'Requests being handled.',
+            labels,
+            multiprocess_mode='livesum',
+            registry=self.registry,
+        )
+
+    @classmethod
+    def from_conf(cls, conf):
+        """Instantiate the metrics from a metrics config."""
+        return cls(path=conf.get('path'))
+
+    def init_app(self, app):
+        """Observe the app's requests, and serve the metrics."""
+        app.extensions[EXTENSION] = self
+        app.add_url_rule(self.path, EXTENSION, self.export)
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        app.teardown_request(self.teardown_request)
+
+    def start_request(self):
+        """Count the request in progress."""
+        if request.endpoint == EXTENSION:
+            return
+        endpoint = request.endpoint or 'unknown'
+        setattr(g, START, default_timer())
+        setattr(g, ENDPOINT, endpoint)
+        setattr(g, SERIALIZATION, 0.0)
+        self.in_progress.labels(endpoint, request.method).inc()
+
+    def finish_request(self, response):
+        """Observe the request's response."""
+        start = g.get(START)
+        if start is None:
+            return response
+        labels = (g.get(ENDPOINT), request.method)
+        self.latency.labels(*labels).observe(default_timer() - start)
+        self.requests.labels(*labels + (response.status_code,)).inc()
+        if response.content_length is not None:
+            self.size.labels(*labels).observe(response.content_length)
+        sql = g.get(SQL_STATS)
+        if sql is not None:
+            self.db_time.labels(*labels).observe(sql.duration)
+        self.serialization_time.labels(*labels).observe(g.get(SERIALIZATION))
+        return response
+
+    def teardown_request(self, exc):
+        """Stop counting the request in progress."""
+        if g.pop(START, None) is not None:
+            self.in_progress.labels(g.pop(ENDPOINT), request.method).dec()
+
+    def export(self):
+        """Return the metrics, of all processes if multiprocess."""
+        registry = self.registry
+        if multiprocess_dir():
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return Response(
+            generate_latest(registry), content_type=CONTENT_TYPE_LATEST
+        )
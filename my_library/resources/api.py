@@ -4,19 +4,25 @@ from __future__ import absolute_import, unicode_literals
 
 from flask_restplus import Api
 
-from .authors import AuthorResource
+from .authors import AuthorResource, AuthorsResource
 from .books import BookResource, BooksResource
+from .formats import add_representations
+from .status import IdentityCacheStatsResource, PoolStatsResource
 
 
 RESOURCES = [
     AuthorResource,
+    AuthorsResource,
     BookResource,
     BooksResource,
+    PoolStatsResource,
+    IdentityCacheStatsResource,
 ]
 
 
 def register(app):
     """Register the application API with the provided Flask app."""
     api = Api(app)
+    add_representations(api)
     for resource in RESOURCES:
         resource.add_to_api(api)
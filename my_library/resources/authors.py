@@ -12,6 +12,23 @@ class AuthorResource(ModelResource):
     endpoint_name = 'author'
     model_name = 'Author'
 
+    def get(self, id):
+        """Retrieve a representation of the author with the given ID."""
+        return self.item_representation(id)
+
 
 class AuthorsResource(ModelResource):
     """The authors represented in the library's collection."""
+
+    path = '/authors'
+    endpoint_name = 'authors'
+    model_name = 'Author'
+
+    def post(self):
+        """Create or update authors from a collection envelope.
+
+        Authors with the ``id`` of an existing author update it, and
+        others are created. Each author's ``books``, if given, replace
+        their existing books.
+        """
+        return self.bulk_upsert()
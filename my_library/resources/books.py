@@ -4,8 +4,6 @@ from __future__ import absolute_import, unicode_literals
 
 from logging import getLogger
 
-from werkzeug.exceptions import NotFound
-
 from .resource import ModelResource
 
 
@@ -21,10 +19,7 @@ class BookResource(ModelResource):
 
     def get(self, id):
         """Retrieve a representation of the book with the given ID."""
-        item = self.query.get(id)
-        if item is None:
-            raise NotFound('No such {}: {}'.format(self.model_name, id))
-        return self.representation(item)
+        return self.item_representation(id)
 
 
 class BooksResource(ModelResource):
@@ -35,5 +30,26 @@ class BooksResource(ModelResource):
     model_name = 'Book'
 
     def get(self):
-        """Retrieve a representation of all books in the library."""
-        return self.representation(self.query_many)
+        """Retrieve a representation of all books in the library.
+
+        If ``ids`` are given, only the books with those ids are
+        represented, in the order requested.
+        """
+        if self.ids is not None:
+            return self.batch_representation(self.ids)
+        query = self.query_many
+        not_modified = self.not_modified(query, many=True)
+        if not_modified is not None:
+            return not_modified
+        if self.stream:
+            return self.stream_representation(query)
+        return self.representation(self.page(), many=True)
+
+    def post(self):
+        """Create or update books from a collection envelope.
+
+        Books with the ``id`` of an existing book update it, and others
+        are created. Each book's ``authors``, if given, replace its
+        existing authors.
+        """
+        return self.bulk_upsert()
@@ -0,0 +1,162 @@
+"""Cache model resource responses in memory.
+
+Successful ``GET`` responses are cached by path and normalized query
+arguments, for at most ``ttl`` seconds, and at most ``size`` of them
+are kept, the least recently used being evicted first. Each response
+is stored with the tables its representation depends upon, and is
+invalidated as soon as a transaction writing any of those tables is
+committed (see :mod:`my_library.db.events`). Commits in other
+processes are not seen, so with several worker processes, responses
+may be stale for up to ``ttl`` seconds.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+from flask import Response, request
+
+from my_library.db.events import on_commit
+from my_library.spec.request import CollectionQueryArgs
+
+
+EXTENSION = 'response_cache'
+
+
+class CachedResponse(object):
+    """The parts of a response needed to reproduce it."""
+
+    def __init__(self, response):
+        """Copy the response's body, status, and headers."""
+        self.data = response.get_data()
+        self.status = response.status_code
+        self.headers = list(response.headers)
+        self.etag = response.get_etag()[0]
+
+    def response(self):
+        """Return a new response, or a 304 if the client's is current."""
+        if self.etag is not None and request.if_none_match.contains_weak(
+            self.etag
+        ):
+            response = Response(status=304)
+            response.set_etag(self.etag)
+            return response
+        return Response(self.data, self.status, self.headers)
+
+
+class ResponseCache(object):
+    """An LRU cache of responses, with TTL eviction.
+
+    :ivar int generation: incremented on every invalidation, so that
+        responses rendered before an invalidation are not stored after
+        it
+    """
+
+    def __init__(self, size=1024, ttl=60.0):
+        """Instantiate the cache.
+
+        :param int size: the maximum number of cached responses
+        :param float ttl: the number of seconds for which a response
+            may be served from the cache
+        """
+        self.size = size
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    @classmethod
+    def from_conf(cls, conf):
+        """Instantiate the cache from a cache config."""
+        return cls(size=conf.get('size'), ttl=conf.get('ttl'))
+
+    def init_app(self, app):
+        """Cache the app's model resource responses."""
+        app.extensions[EXTENSION] = self
+        on_commit(app, lambda changes: self.invalidate(changes.tables))
+
+    @staticmethod
+    def key():
+        """Return the current request's cache key, or None.
+
+        Known query arguments are normalized by loading them, so that
+        e.g. ``?limit=05`` and ``?limit=5`` share a key. Unknown query
+        arguments are kept as they are, since they may still appear in
+        the representation (e.g. in ``next`` links). Requests with
+        invalid query arguments are not cached.
+        """
+        schema = CollectionQueryArgs()
+        args, errors = schema.load(request.args)
+        if errors:
+            return None
+        unknown = sorted(
+            (name, value) for name, value in request.args.items(multi=True)
+            if name not in schema.fields
+        )
+        return (
+            request.path,
+            repr(sorted(args.items())),
+            tuple(unknown),
+            request.headers.get('Accept'),
+        )
+
+    def get(self, key):
+        """Return the cached response for ``key``, or None."""
+        now = time()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            expires, tables, cached = entry
+            if expires <= now:
+                return None
+            self._entries[key] = entry
+            return cached
+
+    def set(self, key, response, tables, generation):
+        """Cache the response, unless it may be stale.
+
+        :param tuple key: the cache key
+        :param flask.Response response: a successful response
+        :param Iterable tables: the tables the response depends upon
+        :param int generation: the cache's ``generation`` when the
+            response's data was read
+        """
+        cached = CachedResponse(response)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries.pop(key, None)
+            self._entries[key] = (time() + self.ttl, frozenset(tables), cached)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def store(self, key, tables, generation, response):
+        """Cache a response in an ``after_this_request`` callback."""
+        if response.status_code == 200 and not response.is_streamed:
+            self.set(key, response, tables, generation)
+        return response
+
+    def invalidate(self, tables):
+        """Discard the responses depending upon any of the tables."""
+        tables = set(tables)
+        with self._lock:
+            self.generation += 1
+            stale = [
+                key for key, (_, depends, _) in self._entries.items()
+                if not tables.isdisjoint(depends)
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        """Discard all cached responses."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        """Return the number of cached responses."""
+        return len(self._entries)
@@ -0,0 +1,191 @@
+"""Represent resources as MessagePack, NDJSON or CSV, besides JSON.
+
+The representation is chosen by the request's ``Accept`` header, and
+produced from the same dumped data as JSON, so that every resource
+supports every format:
+
+* MessagePack (``application/msgpack``) packs the data as it is,
+  envelope included, for compact service-to-service responses.
+* NDJSON (``application/x-ndjson``) has one JSON item per line, so that
+  clients may process items as they arrive.
+* CSV (``text/csv``) has a header row of field names, in the order of
+  the model's schema (see :func:`my_library.spec.auto.field_order`),
+  then one row per item. Nested values, such as related objects, are
+  JSON-encoded in their cell, and null values are empty.
+
+Collections are represented by their items in NDJSON and CSV, and the
+other envelope keys are sent as ``X-Collection-*`` headers, e.g.
+``X-Collection-Total``, with a ``Link`` header for the ``next`` page.
+Other data, such as single items, are represented as one item.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import msgpack
+from flask import current_app, make_response
+
+from my_library.json_backend import current_backend
+
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+X_MSGPACK = 'application/x-msgpack'
+NDJSON = 'application/x-ndjson'
+CSV = 'text/csv'
+
+#: The media types which may be streamed, line by line.
+STREAMED = (JSON, NDJSON, CSV)
+
+ENVELOPE_KEY = 'items'
+
+
+def collection_headers(meta):
+    """Return the headers describing a collection's envelope.
+
+    :param dict meta: the envelope's keys, except for the items
+    :rtype: list
+    """
+    headers = []
+    for key, value in sorted(meta.items()):
+        if value is None:
+            continue
+        if key == 'next':
+            headers.append(('Link', '<{}>; rel="next"'.format(value)))
+        if isinstance(value, (list, tuple)):
+            value = ','.join(str(each) for each in value)
+        headers.append((
+            'X-Collection-{}'.format(key.replace('_', '-').title()),
+            str(value),
+        ))
+    return headers
+
+
+def split_envelope(data):
+    """Return the items in the data, and the rest of their envelope.
+
+    :returns: the items and the envelope's other keys, if the data is a
+        collection envelope, or a list of the data and an empty dict
+    :rtype: tuple
+    """
+    if isinstance(data, dict) and isinstance(data.get(ENVELOPE_KEY), list):
+        meta = dict(data)
+        return meta.pop(ENVELOPE_KEY), meta
+    return [data], {}
+
+
+def ndjson_lines(items):
+    """Yield a line of JSON for each item."""
+    dumps = current_backend().dumps
+    for item in items:
+        yield dumps(item) + '\n'
+
+
+def csv_cell(value):
+    """Format a dumped value as a CSV cell, quoted if need be."""
+    if value is None:
+        return ''
+    if isinstance(value, (bool, int, float, list, dict)):
+        value = current_backend().dumps(value)
+    if any(char in value for char in ',"\r\n'):
+        value = '"{}"'.format(value.replace('"', '""'))
+    return value
+
+
+def csv_row(values):
+    """Format a row of dumped values as a line of CSV."""
+    return ','.join(csv_cell(value) for value in values) + '\r\n'
+
+
+def csv_lines(items, columns=None):
+    """Yield the header row of the items, then a row for each item.
+
+    :param Iterable items: dumped items. Non-dict items are represented
+        in a single ``value`` column.
+    :param list columns: the names of the columns, by default the keys
+        of the first item. Each item's values for the columns are
+        written, so that keys which other items lack are left out.
+    """
+    if columns is not None:
+        yield csv_row(columns)
+    for item in items:
+        if not isinstance(item, dict):
+            item = {'value': item}
+        if columns is None:
+            columns = list(item)
+            yield csv_row(columns)
+        yield csv_row([item.get(column) for column in columns])
+
+
+def _columns(items):
+    """Return the keys of dict items, in order of first appearance."""
+    columns = []
+    seen = set()
+    for item in items:
+        keys = item if isinstance(item, dict) else ['value']
+        for key in keys:
+            if key not in seen:
+                seen.add(key)
+                columns.append(key)
+    return columns
+
+
+def json_settings():
+    """Return the app's ``RESTPLUS_JSON`` settings, indented if debugging."""
+    settings = dict(current_app.config.get('RESTPLUS_JSON', {}))
+    if current_app.debug:
+        settings.setdefault('indent', 4)
+    return settings
+
+
+def output_json(data, code, headers=None):
+    """Make a JSON response, with the app's JSON backend."""
+    dumped = current_backend().dumps(data, **json_settings()) + '\n'
+    response = make_response(dumped, code)
+    response.headers.extend(headers or {})
+    response.vary.add('Accept')
+    return response
+
+
+def output_msgpack(data, code, headers=None):
+    """Make a MessagePack response."""
+    response = make_response(msgpack.packb(data, use_bin_type=True), code)
+    response.headers.extend(headers or {})
+    response.vary.add('Accept')
+    return response
+
+
+def output_ndjson(data, code, headers=None):
+    """Make an NDJSON response, with one line per item."""
+    items, meta = split_envelope(data)
+    response = make_response(''.join(ndjson_lines(items)), code)
+    response.headers.extend(collection_headers(meta))
+    response.headers.extend(headers or {})
+    response.vary.add('Accept')
+    return response
+
+
+def output_csv(data, code, headers=None):
+    """Make a CSV response, with a header row and one row per item."""
+    items, meta = split_envelope(data)
+    body = ''.join(csv_lines(items, _columns(items))) if items else ''
+    response = make_response(body, code)
+    response.headers.extend(collection_headers(meta))
+    response.headers.extend(headers or {})
+    response.vary.add('Accept')
+    return response
+
+
+#: The output function of each media type, in order of preference.
+REPRESENTATIONS = (
+    (JSON, output_json),
+    (MSGPACK, output_msgpack),
+    (X_MSGPACK, output_msgpack),
+    (NDJSON, output_ndjson),
+    (CSV, output_csv),
+)
+
+
+def add_representations(api):
+    """Register the output function of each media type with the API."""
+    for mediatype, output in REPRESENTATIONS:
+        api.representation(mediatype)(output)
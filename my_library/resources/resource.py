@@ -3,22 +3,69 @@
 from __future__ import absolute_import, unicode_literals
 
 from functools import partial
+from hashlib import sha1
 from logging import getLogger
 
 from flask import (
+    Response,
+    after_this_request,
     current_app as app,
     request,
+    stream_with_context,
     url_for as flask_url_for
 )
 from flask_restplus import Resource
-from werkzeug.exceptions import BadRequest
+from marshmallow import ValidationError
+from marshmallow.compat import text_type
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError
+from werkzeug.exceptions import BadRequest, Conflict, NotFound
 
-from my_library.spec.request import CollectionQueryArgs
+from my_library.db.bulk import CREATED, INVALID, UPDATED, BulkUpsert
+from my_library.db.counts import (
+    EXACT,
+    CachedCount,
+    EstimatedCount,
+    ExactCount,
+    NoCount,
+)
+from my_library.db.identity import EXTENSION as IDENTITY_CACHE
+from my_library.db.missing import EXTENSION as MISSING_IDS
+from my_library.db.rows import RowLoader
+from my_library.json_backend import current_backend
+from my_library.metrics import timed_serialization
+from my_library.spec.mixins import envelope
+from my_library.spec.auto import field_load_options
+from my_library.spec.request import (
+    CollectionQueryArgs,
+    QueryArgs,
+    cursor_value,
+    encode_cursor,
+)
+from .cache import EXTENSION as CACHE
+from .formats import (
+    CSV,
+    JSON,
+    NDJSON,
+    STREAMED,
+    collection_headers,
+    csv_lines,
+    json_settings,
+    ndjson_lines,
+)
+from .urls import build_url, compile_templates
 
 
 log = getLogger(__name__)
 
 
+def set_etag(etag, response):
+    """Set a strong ETag on successful responses."""
+    if response.status_code == 200:
+        response.set_etag(etag)
+    return response
+
+
 class BaseResource(Resource):
     """A base resource class, providing convenience methods.
 
@@ -31,26 +78,46 @@ class BaseResource(Resource):
 
     @classmethod
     def add_to_api(cls, api):
-        """Add the resource to the provided flask-rest(ful/plus) API."""
+        """Add the resource to the provided flask-rest(ful/plus) API.
+
+        If the API is bound directly to an app, URL templates for the
+        resource are compiled immediately. Otherwise (e.g. for APIs
+        bound to blueprints), they are compiled on first use.
+        """
         if isinstance(cls.path, str):
             adder = partial(api.add_resource, cls, cls.path)
         else:
             adder = partial(api.add_resource, cls, *cls.path)
         adder(endpoint=cls.endpoint_name)
+        if api.blueprint is None and api.app is not None:
+            compile_templates(api.app, cls.endpoint_name)
 
     @classmethod
     def url_for(cls, **kwargs):
         """Return the URL for the specified resource.
 
+        The URL is built from a precomputed template where possible,
+        and by flask's ``url_for`` otherwise. The result is the same.
+
         :param kwargs: keyword arguments to pass to flask's ``url_for``
             method, corresponding to variable portions of the URL,
             e.g. ``id=7`` for a URL with an ``<int:id>`` section.
         """
+        url = build_url(cls.endpoint_name, kwargs)
+        if url is not None:
+            return url
         return flask_url_for(
             '.{}'.format(cls.endpoint_name),
             **kwargs
         )
 
+    @property
+    def mediatype(self):
+        """The media type of the response, negotiated by ``Accept``."""
+        return request.accept_mimetypes.best_match(
+            self.api.representations, default=self.api.default_mediatype
+        )
+
 
 class ModelResource(BaseResource):
     """Parse or return JSON representations of a resource.
@@ -59,6 +126,32 @@ class ModelResource(BaseResource):
         resource
     :cvar default_limit: the default limit for collection results
     :cvar default_offset: the default offset for collection results
+    :cvar cursor_column: the name of the indexed column by which
+        collections are ordered and keyset (``after``) pagination is
+        performed. The primary key is used as a tie-breaker if this is
+        not ``id``.
+    :cvar count_strategies: a mapping of the values clients may pass
+        as the ``total`` query argument to the count strategies used
+        to compute the collection total
+    :cvar default_count: the count strategy used when no ``total``
+        query argument is provided
+    :cvar version_column: the name of a column changing whenever a row
+        is updated, e.g. the ``updated`` column of the ``CreateUpdate``
+        mixin. If the model and the related models in its
+        representation have this column, strong ETags are provided.
+    :cvar stream_limit: collection pages with a limit at least this
+        large are streamed unless the ``stream`` query argument says
+        otherwise
+    :cvar stream_batch_size: the number of rows loaded at a time when
+        streaming
+    :cvar batch_limit: the maximum number of ``ids`` which may be
+        requested at once
+    :cvar batch_chunk_size: the maximum number of ids in each ``IN``
+        query used to fetch the requested ``ids``
+    :cvar bulk_limit: the maximum number of items which may be created
+        or updated in one request
+    :cvar fast_reads: whether collection pages are loaded as plain
+        records, rather than ORM objects, when their fields allow it
 
     :ivar model: the ORM model corresponding to the class attribute
         ``model_name``
@@ -67,13 +160,100 @@ class ModelResource(BaseResource):
     model_name = None
     default_limit = 20
     default_offset = 0
+    cursor_column = 'id'
+    count_strategies = {
+        'exact': ExactCount(),
+        'cached': CachedCount(),
+        'estimated': EstimatedCount(),
+        'false': NoCount(),
+    }
+    default_count = 'exact'
+    version_column = 'updated'
+    stream_limit = 1000
+    stream_batch_size = 500
+    batch_limit = 1000
+    batch_chunk_size = 500
+    bulk_limit = 10000
+    fast_reads = True
 
     def __init__(self, *args, **kwargs):
         """Instantiate the model resource."""
         super(ModelResource, self).__init__(*args, **kwargs)
         self._collection_query_args = None
+        self._collection_total = None
+        self._query_args = None
         self.model = getattr(app.db.models, self.model_name)
 
+    def dispatch_request(self, *args, **kwargs):
+        """Serve ``GET`` requests from the response cache, if enabled.
+
+        Successful responses are cached once they are complete, with
+        the ``cache_tables`` upon which they depend. Otherwise, the
+        queries of ``GET`` requests are sent to a read replica, if any.
+        """
+        if request.method == 'GET':
+            app.db.session().read_from_replica()
+        cache = app.extensions.get(CACHE)
+        key = None
+        if cache is not None and request.method == 'GET':
+            key = cache.key()
+        if key is None:
+            return super(ModelResource, self).dispatch_request(
+                *args, **kwargs
+            )
+        cached = cache.get(key)
+        if cached is not None:
+            return cached.response()
+        generation = cache.generation
+        response = super(ModelResource, self).dispatch_request(
+            *args, **kwargs
+        )
+        after_this_request(
+            partial(cache.store, key, self.cache_tables, generation)
+        )
+        return response
+
+    @property
+    def cache_tables(self):
+        """The tables upon which the resource's representations depend."""
+        mapper = self.model.__mapper__
+        tables = {mapper.local_table}
+        for prop in mapper.relationships:
+            tables.add(prop.mapper.local_table)
+            if prop.secondary is not None:
+                tables.add(prop.secondary)
+        return tables
+
+    @property
+    def query_args(self):
+        """Common arguments for any endpoint."""
+        if self._query_args is None:
+            args, errors = QueryArgs().load(request.args)
+            if errors:
+                raise BadRequest(errors)
+            self._query_args = args
+        return self._query_args
+
+    @property
+    def fields(self):
+        """The names of the fields requested, or None for all fields.
+
+        Names are in the schema's declared order, whatever the order of
+        the request's.
+        """
+        fields = self.query_args.get('fields')
+        if fields is None:
+            return None
+        available = self.model.spec._declared_fields
+        unknown = [name for name in fields if name not in available]
+        if unknown:
+            raise BadRequest({
+                'fields': ['Unknown fields: {}. Must be among: {}.'.format(
+                    ', '.join(unknown), ', '.join(sorted(available))
+                )]
+            })
+        return tuple(name for name in available if name in fields)
+
     @property
     def collection_query_args(self):
         """Common arguments for any collection endpoint."""
@@ -94,45 +274,361 @@ class ModelResource(BaseResource):
         """The offset for a collection query."""
         return self.collection_query_args.get('offset', self.default_offset)
 
+    @property
+    def after(self):
+        """The keyset cursor for a collection query, if any."""
+        return self.collection_query_args.get('after')
+
+    @property
+    def ids(self):
+        """The ids requested for a batch collection query, if any."""
+        ids = self.collection_query_args.get('ids')
+        if ids is not None and len(ids) > self.batch_limit:
+            raise BadRequest({
+                'ids': ['At most {} ids may be requested.'.format(
+                    self.batch_limit
+                )]
+            })
+        return ids
+
+    @property
+    def stream(self):
+        """Whether the collection representation should be streamed.
+
+        Only JSON, NDJSON and CSV representations are streamed.
+        """
+        if self.mediatype not in STREAMED:
+            return False
+        return self.collection_query_args.get(
+            'stream', self.limit >= self.stream_limit
+        )
+
+    @property
+    def count_strategy(self):
+        """The count strategy requested for a collection query."""
+        name = self.collection_query_args.get('total', self.default_count)
+        try:
+            return self.count_strategies[name]
+        except KeyError:
+            raise BadRequest({
+                'total': ['Must be one of: {}.'.format(
+                    ', '.join(sorted(self.count_strategies))
+                )]
+            })
+
+    @property
+    def collection_total(self):
+        """The collection's ``(total, kind)``, computed once."""
+        if self._collection_total is None:
+            self._collection_total = self.total(self.query)
+        return self._collection_total
+
+    @property
+    def cursor_columns(self):
+        """The model columns establishing a stable collection ordering."""
+        names = [self.cursor_column]
+        if self.cursor_column != 'id':
+            names.append('id')
+        return [getattr(self.model, name) for name in names]
+
     @property
     def query(self):
         """A query instance for the instance's ``model``."""
         return app.db.session.query(self.model)
 
+    @property
+    def load_options(self):
+        """Loader options for the requested ``fields``.
+
+        With no ``fields`` requested, the relationships to dump are
+        eagerly loaded. Otherwise, only the requested columns and
+        relationships (and any columns needed for ordering and ETags)
+        are loaded.
+        """
+        if self.fields is None:
+            return self.model.eager_options
+        columns = [column.key for column in self.cursor_columns]
+        if self.versioned:
+            columns.append(self.version_column)
+        return field_load_options(self.model, self.fields, columns)
+
+    @property
+    def eager_query(self):
+        """A query instance loading what is needed to dump ``fields``."""
+        return self.query.options(*self.load_options)
+
     @property
     def query_many(self):
-        """A query instance with ``limit`` and ``offset`` applied."""
-        return self.apply_limit_and_offset(self.query)
+        """A query instance with ordering and pagination applied.
+
+        If an ``after`` cursor was provided, keyset pagination is used,
+        so that the cost of a page does not depend on its depth.
+        Otherwise, ``limit`` and ``offset`` are applied.
+        """
+        return self.paginate(self.eager_query)
+
+    def paginate(self, query):
+        """Apply the collection's ordering and pagination to the query."""
+        query = query.order_by(*self.cursor_columns)
+        if self.after is not None:
+            return self.apply_cursor(query).limit(self.limit)
+        return self.apply_limit_and_offset(query)
+
+    @property
+    def row_loader(self):
+        """A loader of records for the requested ``fields``, or None.
+
+        None is returned if ``fast_reads`` is disabled, or if some of
+        the fields can't be loaded as records (see
+        :class:`my_library.db.rows.RowLoader`).
+        """
+        if not self.fast_reads:
+            return None
+        columns = [column.key for column in self.cursor_columns]
+        related_columns = []
+        if self.versioned:
+            columns.append(self.version_column)
+            related_columns.append(self.version_column)
+        return RowLoader.for_fields(
+            self.model,
+            self.fields or tuple(self.model.spec._declared_fields),
+            columns,
+            related_columns,
+            self.batch_chunk_size,
+        )
+
+    def page(self):
+        """Return the items of the requested collection page.
+
+        Records are loaded with the ``row_loader``, if any, and ORM
+        objects otherwise. Either dumps to the same representation.
+
+        :rtype: list
+        """
+        loader = self.row_loader
+        if loader is None:
+            return self.query_many.all()
+        query = self.paginate(app.db.session.query(*loader.columns))
+        return loader.load(app.db.session, query)
 
     def apply_limit_and_offset(self, query):
         """Apply the instance's ``limit`` and ``offset`` to the query."""
         return query.offset(self.offset).limit(self.limit)
 
-    def collection_ctx(self, query):
-        """Return the expected schema context for the Collection mixin."""
+    def cursor_values(self):
+        """Return the values of the ``after`` cursor, for its columns.
+
+        :raises BadRequest: if the cursor has too few or too many values,
+            or values which are not of their columns' types
+        """
+        columns = self.cursor_columns
+        if len(self.after) != len(columns):
+            raise BadRequest({'after': ['Not a valid cursor.']})
+        values = []
+        for column, value in zip(columns, self.after):
+            try:
+                python_type = column.type.python_type
+            except NotImplementedError:
+                python_type = None
+            try:
+                if python_type is not None:
+                    value = cursor_value(value, python_type)
+                elif isinstance(value, (dict, list)) or value is None:
+                    raise ValueError(value)
+            except ValueError:
+                raise BadRequest({'after': ['Not a valid cursor.']})
+            values.append(value)
+        return values
+
+    def apply_cursor(self, query):
+        """Filter the query to rows following the ``after`` cursor."""
+        columns = self.cursor_columns
+        criterion = None
+        values = self.cursor_values()
+        for column, value in reversed(list(zip(columns, values))):
+            if criterion is None:
+                criterion = column > value
+            else:
+                criterion = or_(
+                    column > value, and_(column == value, criterion)
+                )
+        return query.filter(criterion)
+
+    def cursor_for(self, item):
+        """Return the opaque cursor identifying the position of ``item``."""
+        return encode_cursor(
+            [getattr(item, column.key) for column in self.cursor_columns]
+        )
+
+    def next_href(self, count, last):
+        """Return the URL of the following page, if any.
+
+        The URL always uses keyset pagination, so clients following
+        ``next`` links never pay for an ``OFFSET`` scan.
+
+        :param int count: the number of items on the current page
+        :param last: the last ORM object on the current page
+        """
+        if not count or count < self.limit:
+            return None
+        args = request.args.to_dict()
+        args.pop('offset', None)
+        args['after'] = self.cursor_for(last)
+        return self.url_for(**args)
+
+    def item_representation(self, id):
+        """Represent the object with the given id.
+
+        If the app has an identity cache, the object is retrieved from
+        it, so that a cached object is represented (or found not to be
+        modified) without querying the database. Otherwise, a 304
+        response is returned without loading the object, if possible.
+        If the app remembers missing ids, ids known to be missing are
+        not found without querying the database.
+
+        :param int id: the object's primary key
+        :raises werkzeug.exceptions.NotFound: if there is no such object
+        """
+        missing = app.extensions.get(MISSING_IDS)
+        if missing is not None:
+            if missing.is_missing(self.model, id):
+                raise NotFound('No such {}: {}'.format(self.model_name, id))
+            generation = missing.generation
+        cache = app.extensions.get(IDENTITY_CACHE)
+        if cache is None:
+            not_modified = self.not_modified(
+                self.query.filter(self.model.id == id)
+            )
+            if not_modified is not None:
+                return not_modified
+            item = self.eager_query.get(id)
+        else:
+            item = cache.get(
+                app.db.session, self.model, id, self.model.eager_options
+            )
+        if item is None:
+            if missing is not None:
+                missing.add(app.db.session, self.model, id, generation)
+            raise NotFound('No such {}: {}'.format(self.model_name, id))
+        if cache is not None and self.versioned and request.if_none_match:
+            etag = self.etag_for_items([item])
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+        return self.representation(item)
+
+    def batch(self, ids):
+        """Load the objects with the given ids.
+
+        Ids are fetched with as few ``IN`` queries as
+        ``batch_chunk_size`` allows.
+
+        :param list ids: the requested ids
+        :returns: the ORM objects found, in the order their ids were
+            requested (without duplicates), and the ids not found
+        :rtype: tuple
+        """
+        unique = []
+        seen = set()
+        for id in ids:
+            if id not in seen:
+                seen.add(id)
+                unique.append(id)
+        found = {}
+        for start in range(0, len(unique), self.batch_chunk_size):
+            chunk = unique[start:start + self.batch_chunk_size]
+            for item in self.eager_query.filter(self.model.id.in_(chunk)):
+                found[item.id] = item
+        return (
+            [found[id] for id in unique if id in found],
+            [id for id in unique if id not in found],
+        )
+
+    def batch_representation(self, ids):
+        """Represent the objects with the given ids as a collection.
+
+        The envelope's ``missing`` key lists the ids not found.
+        """
+        items, missing = self.batch(ids)
+        return self.representation(
+            items,
+            many=True,
+            context={
+                'limit': len(ids),
+                'offset': 0,
+                'total': len(items),
+                'total_type': EXACT,
+                'next': None,
+                'missing': missing,
+            },
+        )
+
+    def collection_ctx(self, items):
+        """Return the expected schema context for the Collection mixin.
+
+        :param list items: the ORM objects on the current page
+        """
+        total, total_type = self.collection_total
         return {
             'limit': self.limit,
             'offset': self.offset,
-            'total': self.total(query),
+            'total': total,
+            'total_type': total_type,
+            'next': self.next_href(len(items), items[-1] if items else None),
         }
 
-    def representation(self, item_or_query, many=False):
+    def representation(self, item_or_query, many=False, context=None):
         """Convert an item or a query into a representation.
 
+        The model's precompiled dumper is used. Should it fail, the
+        marshmallow schema is used instead, so that errors are reported.
+        If the model is ``versioned``, an ETag is set on the response.
+
         :param item_or_query: an ORM object, an iterable of ORM objects,
             or a SQLAlchemy query (which is a particular iterable of
             ORM objects)
         :param many: explicitly state that a collection is being
             handled. ``many=True`` is implicit when a query is passed
             to this method.
+        :param dict context: the schema context for a collection.
+            Defaults to the ``collection_ctx``.
         """
         if isinstance(item_or_query, self.query.__class__) or many:
             many = True
-            context = self.collection_ctx(item_or_query)
+            item_or_query = list(item_or_query)
+            if context is None:
+                context = self.collection_ctx(item_or_query)
+            items = item_or_query
         else:
             context = None
+            items = [item_or_query]
+
+        if self.versioned:
+            total = (
+                (context['total'], context['total_type']) if many else None
+            )
+            after_this_request(
+                partial(set_etag, self.etag_for_items(items, total))
+            )
+
+        with timed_serialization():
+            return self.dump(item_or_query, many, context)
 
-        schema = self.model.spec(context=context, many=many)
+    def dump(self, item_or_query, many, context):
+        """Dump an item or items, falling back to the schema on errors."""
+        try:
+            return self.model.dumper(self.fields).dump(
+                item_or_query, many=many, context=context
+            )
+        except (TypeError, ValueError, ValidationError):
+            log.debug(
+                '{}: falling back to schema dump'.format(self.endpoint_name)
+            )
+
+        schema = self.model.spec(
+            context=context, many=many, only=self.fields
+        )
         dumped, errors = schema.dump(item_or_query)
         if errors:
             log.warning(
@@ -142,6 +638,287 @@ class ModelResource(BaseResource):
             )
         return dumped
 
+    def stream_representation(self, query):
+        """Stream the representation of a collection.
+
+        Rows are loaded ``stream_batch_size`` at a time and dumped one
+        at a time, so memory use does not grow with the page size. The
+        envelope's ``count`` and ``next`` keys follow the items in JSON,
+        since they depend upon them, and are left out of NDJSON and CSV,
+        whose other envelope keys are sent as headers. No ETag is set,
+        since it would depend upon the entire page.
+
+        :param query: a query for the collection page
+        :rtype: flask.Response
+        """
+        dumper = self.model.dumper(self.fields)
+        settings = json_settings()
+        total, total_type = self.collection_total
+        head = envelope(
+            [],
+            {
+                'limit': self.limit,
+                'offset': self.offset,
+                'total': total,
+                'total_type': total_type,
+            },
+            dumper.envelope_key,
+        )
+        del head['count'], head[dumper.envelope_key]
+
+        mediatype = self.mediatype
+        if mediatype in (NDJSON, CSV):
+            items = (
+                dumper.dump_one(item)
+                for item in query.yield_per(self.stream_batch_size)
+            )
+            lines = ndjson_lines if mediatype == NDJSON else csv_lines
+            response = Response(
+                stream_with_context(lines(items)), mimetype=mediatype
+            )
+            response.headers.extend(collection_headers(head))
+            response.vary.add('Accept')
+            return response
+
+        def dumps(value):
+            return current_backend().dumps(value, **settings)
+
+        def generate():
+            yield '{},{}:['.format(
+                dumps(head)[:-1], dumps(dumper.envelope_key)
+            )
+            count, last = 0, None
+            for item in query.yield_per(self.stream_batch_size):
+                if count:
+                    yield ','
+                yield dumps(dumper.dump_one(item))
+                count, last = count + 1, item
+            yield '],{}:{},{}:{}}}\n'.format(
+                dumps('count'),
+                count,
+                dumps('next'),
+                dumps(self.next_href(count, last)),
+            )
+
+        response = Response(stream_with_context(generate()), mimetype=JSON)
+        response.vary.add('Accept')
+        return response
+
+    def bulk_upsert(self):
+        """Create or update the items in the request's collection envelope.
+
+        Items are loaded with the model's ``row_spec``, and written with
+        :class:`my_library.db.bulk.BulkUpsert` in one transaction.
+        Invalid items are reported without preventing the others from
+        being written. If writing the items violates a database
+        constraint (e.g. the ``NOT NULL`` of a column set to null by an
+        update), nothing is written, and the first item violating it is
+        reported in a 409 Conflict error. Values which pass the
+        checks of ``BulkUpsert`` but are rejected by the database are
+        reported in a 400 Bad Request error.
+
+        :returns: the number of items created, updated, and found
+            invalid, and a result for each item, in order
+        :rtype: dict
+        """
+        schema = self.model.row_spec(many=True, partial=True)
+        key = schema.envelope_key
+        data = request.get_json(silent=True)
+        items = data.get(key) if isinstance(data, dict) else None
+        if not isinstance(items, list):
+            raise BadRequest({key: ['A list of items is required.']})
+        if len(items) > self.bulk_limit:
+            raise BadRequest({
+                key: ['At most {} items may be given.'.format(
+                    self.bulk_limit
+                )]
+            })
+
+        rows, errors = schema.load(data)
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors[index] = {'_schema': ['Invalid input type.']}
+        upsert = BulkUpsert(app.db.session, self.model, self.batch_chunk_size)
+        valid = [
+            (index, row) for index, row in enumerate(rows)
+            if index not in errors
+        ]
+        try:
+            results = upsert([(index, dict(row)) for index, row in valid])
+            app.db.session.commit()
+        except IntegrityError as exc:
+            app.db.session.rollback()
+            raise Conflict({key: self.conflicts(upsert, valid, exc)})
+        except DataError as exc:
+            app.db.session.rollback()
+            raise BadRequest({key: {'_schema': [text_type(exc.orig)]}})
+        except DBAPIError:
+            app.db.session.rollback()
+            raise
+
+        response = {CREATED: 0, UPDATED: 0, INVALID: 0, key: []}
+        for index in range(len(items)):
+            status, value = results.get(index, (INVALID, errors.get(index)))
+            response[status] += 1
+            response[key].append({
+                'status': status,
+                'errors' if status == INVALID else 'id': value,
+            })
+        return response
+
+    def conflicts(self, upsert, rows, error):
+        """Find the first row whose write violates a constraint.
+
+        The rows of a failed bulk upsert are written again one at a
+        time, in a transaction which is then rolled back, until one
+        fails. Nothing is written.
+
+        :param my_library.db.bulk.BulkUpsert upsert: the failed upsert
+        :param list rows: the ``(index, row)`` pairs it was given
+        :param sqlalchemy.exc.IntegrityError error: the error it raised
+        :returns: the errors of the failing row, by its index, or the
+            error of the whole upsert if no single row fails
+        :rtype: dict
+        """
+        conflicts = {'_schema': [text_type(error.orig)]}
+        try:
+            for index, row in rows:
+                try:
+                    upsert([(index, dict(row))])
+                except IntegrityError as exc:
+                    conflicts = {index: {'_schema': [text_type(exc.orig)]}}
+                    break
+        finally:
+            app.db.session.rollback()
+        return conflicts
+
     def total(self, query):
-        """Return the total number of results matching the query."""
-        return query.limit(None).count()
+        """Return the total number of results matching the query.
+
+        The requested ``count_strategy`` is used, so the total may be
+        cached, estimated, or omitted.
+
+        :returns: a ``(total, kind)`` tuple, where ``kind`` describes
+            how the total was obtained
+        :rtype: tuple
+        """
+        return self.count_strategy.count(query)
+
+    @property
+    def etag_relationships(self):
+        """The relationship properties included in the representation."""
+        relationships = self.model.__mapper__.relationships
+        names = self.fields
+        if names is None:
+            names = self.model.spec._declared_fields
+        return [
+            relationships[name]
+            for name in sorted(names)
+            if name in relationships
+        ]
+
+    @property
+    def versioned(self):
+        """Whether ETags may be computed for the representation."""
+        models = [self.model] + [
+            prop.mapper.class_ for prop in self.etag_relationships
+        ]
+        return all(hasattr(model, self.version_column) for model in models)
+
+    def etag(self, versions, related, total=None):
+        """Return a strong ETag for the version information.
+
+        :param list versions: ``(id, version)`` pairs for the rows in
+            the representation, in order
+        :param list related: ``(count, latest version)`` pairs for the
+            rows in each of the ``etag_relationships``
+        :param tuple total: the collection's ``(total, kind)``, if a
+            collection is represented
+        """
+        key = repr((
+            self.endpoint_name,
+            self.mediatype,
+            self.fields,
+            versions,
+            related,
+            total,
+        ))
+        return sha1(key.encode('utf-8')).hexdigest()
+
+    def etag_for_items(self, items, total=None):
+        """Return the ETag for a list of loaded ORM objects."""
+        version = self.version_column
+        related = []
+        for prop in self.etag_relationships:
+            rows = []
+            for item in items:
+                value = getattr(item, prop.key)
+                if prop.uselist:
+                    rows.extend(value)
+                elif value is not None:
+                    rows.append(value)
+            versions = [
+                getattr(row, version) for row in rows
+                if getattr(row, version) is not None
+            ]
+            related.append((len(rows), max(versions) if versions else None))
+        return self.etag(
+            [(item.id, getattr(item, version)) for item in items],
+            related,
+            total,
+        )
+
+    def etag_for_query(self, query, total=None):
+        """Return the ETag for the ORM objects a query would load.
+
+        Only ids, version columns, and aggregates over related rows
+        are selected, so this is much cheaper than loading the objects.
+
+        :returns: the ETag, and the number of rows the query matches
+        :rtype: tuple
+        """
+        model = self.model
+        version = self.version_column
+        versions = [
+            tuple(row)
+            for row in query.with_entities(model.id, getattr(model, version))
+        ]
+        ids = [id for id, _ in versions]
+        related = []
+        for prop in self.etag_relationships:
+            if not ids:
+                related.append((0, None))
+                continue
+            related_model = prop.mapper.class_
+            row = (
+                app.db.session.query(
+                    func.count(related_model.id),
+                    func.max(getattr(related_model, version)),
+                )
+                .select_from(model)
+                .join(getattr(model, prop.key))
+                .filter(model.id.in_(ids))
+                .one()
+            )
+            related.append(tuple(row))
+        return self.etag(versions, related, total), len(ids)
+
+    def not_modified(self, query, many=False):
+        """Return a 304 response if the client's representation is current.
+
+        :param query: a query for the rows to be represented
+        :param bool many: whether a collection is to be represented
+        :returns: a 304 response, or None if the representation must
+            be sent
+        """
+        if not request.if_none_match or not self.versioned:
+            return None
+        total = self.collection_total if many else None
+        etag, matched = self.etag_for_query(query, total)
+        if not (many or matched):
+            return None
+        if not request.if_none_match.contains_weak(etag):
+            return None
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
@@ -0,0 +1,47 @@
+"""Service status resources."""
+
+from __future__ import absolute_import, unicode_literals
+
+from flask import current_app as app
+from werkzeug.exceptions import NotFound
+
+from my_library.db.identity import EXTENSION as IDENTITY_CACHE
+from my_library.db.pool import pool_stats
+from .resource import BaseResource
+
+
+class PoolStatsResource(BaseResource):
+    """The usage of this process's database connection pools."""
+
+    path = '/status/pool'
+    endpoint_name = 'pool_stats'
+
+    def get(self):
+        """Retrieve the statistics of the primary and replica pools.
+
+        Pools are keyed by bind, the primary's being ``primary``.
+        Engines which haven't been created yet are not reported.
+        """
+        state = app.extensions['sqlalchemy']
+        return {
+            bind or 'primary': pool_stats(connector.get_engine().pool)
+            for bind, connector in state.connectors.items()
+        }
+
+
+class IdentityCacheStatsResource(BaseResource):
+    """The usage of this process's identity cache."""
+
+    path = '/status/identity_cache'
+    endpoint_name = 'identity_cache_stats'
+
+    def get(self):
+        """Retrieve the identity cache's size, hits, and misses.
+
+        Hits and misses are counted since the process started. A 404
+        is returned if the cache is disabled.
+        """
+        cache = app.extensions.get(IDENTITY_CACHE)
+        if cache is None:
+            raise NotFound('The identity cache is disabled.')
+        return cache.stats
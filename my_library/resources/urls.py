@@ -0,0 +1,152 @@
+"""Precomputed URL templates for cheap resource URL building.
+
+Building a URL with ``flask.url_for`` walks werkzeug's routing
+machinery on every call, which is costly when an ``href`` is generated
+for every object in a large collection. Templates compiled once from
+the application's URL rules are used instead, falling back to
+``flask.url_for`` whenever a template can't reproduce its output
+exactly (URL defaults callbacks, query string arguments, subdomains,
+and the like).
+
+Templates are compiled from werkzeug's private ``Rule._trace`` and
+``Rule._converters``. Rules without them (e.g. of a werkzeug version
+which changed them) are given no template, so their URLs are built by
+``flask.url_for``.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+from flask import current_app, has_request_context, request
+from marshmallow.compat import text_type
+from werkzeug.routing import ValidationError
+from werkzeug.urls import url_quote
+
+
+EXTENSION = 'url_templates'
+
+
+class URLTemplate(object):
+    """A URL template compiled from a werkzeug ``Rule``.
+
+    :ivar frozenset arguments: the names of the rule's variable parts
+    :ivar str subdomain: the static domain part of the rule
+    :ivar tuple parts: static URL text, or bound ``to_url`` converter
+        methods paired with the name of the value to convert
+    """
+
+    def __init__(self, rule):
+        """Compile the template.
+
+        :param werkzeug.routing.Rule rule: a rule with no defaults
+        :raises ValueError: if the rule has a dynamic domain part
+        """
+        charset = getattr(rule.map, 'charset', 'utf-8')
+
+        def quote(data):
+            return url_quote(data.encode(charset), safe='/:|+')
+
+        trace = list(rule._trace)
+        separator = trace.index((False, '|'))
+        if any(is_dynamic for is_dynamic, _ in trace[:separator]):
+            raise ValueError('Dynamic domain parts are not supported.')
+
+        parts = []
+        for is_dynamic, data in trace[separator + 1:]:
+            if is_dynamic:
+                parts.append((data, rule._converters[data].to_url))
+            elif parts and isinstance(parts[-1], text_type):
+                parts[-1] += quote(data)
+            else:
+                parts.append(quote(data))
+        if parts and isinstance(parts[0], text_type):
+            parts[0] = parts[0].lstrip('/')
+
+        self.arguments = frozenset(rule.arguments)
+        self.subdomain = ''.join(quote(data) for _, data in trace[:separator])
+        self.parts = tuple(parts)
+
+    @classmethod
+    def compile(cls, rule):
+        """Return a template for the rule, or None if it's unsupported.
+
+        Rules whose private attributes aren't as expected are
+        unsupported.
+        """
+        if rule.defaults or rule.map.host_matching:
+            return None
+        try:
+            return cls(rule)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return None
+
+    def build(self, values):
+        """Return the rule's path (without leading slash) for ``values``.
+
+        :raises werkzeug.routing.ValidationError: if a converter
+            rejects a value
+        """
+        return ''.join(
+            part if isinstance(part, text_type) else part[1](values[part[0]])
+            for part in self.parts
+        )
+
+
+def compile_templates(app, endpoint):
+    """Compile and store templates for all of the endpoint's rules.
+
+    :returns: the templates, in the order werkzeug would try the rules.
+        An unsupported rule's template is ``None``.
+    :rtype: tuple
+    """
+    try:
+        rules = tuple(app.url_map.iter_rules(endpoint))
+    except KeyError:
+        rules = ()
+    templates = tuple(URLTemplate.compile(rule) for rule in rules)
+    app.extensions.setdefault(EXTENSION, {})[endpoint] = templates
+    return templates
+
+
+def build_url(endpoint, values):
+    """Build a URL exactly as ``flask.url_for('.' + endpoint)`` would.
+
+    :param str endpoint: the endpoint name, relative to the current
+        request's blueprint
+    :param dict values: the values for the URL's variable parts
+    :returns: the URL, or None if it must be built by ``url_for``
+    """
+    if not has_request_context():
+        return None
+    app = current_app
+    if app.url_default_functions or app.config.get('SERVER_NAME'):
+        # With a server name, requests may be for subdomains.
+        return None
+    subdomain = app.url_map.default_subdomain or ''
+    blueprint = request.blueprint
+    if blueprint is not None:
+        endpoint = '{}.{}'.format(blueprint, endpoint)
+
+    templates = app.extensions.get(EXTENSION, {}).get(endpoint)
+    if templates is None:
+        templates = compile_templates(app, endpoint)
+
+    for template in templates:
+        if template is None:
+            return None
+        if not template.arguments.issubset(values):
+            continue
+        if len(template.arguments) != len(values):
+            return None
+        if template.subdomain != subdomain:
+            return None
+        if any(value is None for value in values.values()):
+            return None
+        try:
+            path = template.build(values)
+        except (ValidationError, TypeError, ValueError):
+            return None
+        if '/.' in '/' + path:
+            # werkzeug normalizes dot segments; let it.
+            return None
+        return request.script_root + '/' + path
+    return None
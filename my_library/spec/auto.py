@@ -5,15 +5,32 @@
 # when constructing a type() object.
 from __future__ import absolute_import
 
+from collections import OrderedDict
+from functools import partial
+
+from marshmallow import Schema, fields, missing
+from marshmallow.compat import text_type
+from marshmallow.utils import ensure_text_type, is_collection
 from marshmallow_sqlalchemy import ModelConverter, ModelSchema
 from marshmallow_sqlalchemy.fields import Related
+from sqlalchemy import orm
+
+from .mixins import Collection, Resource, envelope
+
 
-from .mixins import Collection, Resource
+_PROPERTY_STUBS = {}
 
 
 def property_stub_factory(key):
-    """Make a property stub, with a key mapping to the attribute name."""
-    return type('{}PropertyStub'.format(key), (object,), {u'key': key})
+    """Make a property stub, with a key mapping to the attribute name.
+
+    Stubs are memoized, so only one type is created per key.
+    """
+    try:
+        return _PROPERTY_STUBS[key]
+    except KeyError:
+        stub = type('{}PropertyStub'.format(key), (object,), {u'key': key})
+        return _PROPERTY_STUBS.setdefault(key, stub)
 
 
 class CustomRelatedField(Related):
@@ -33,9 +50,14 @@ class CustomRelatedField(Related):
         class attribute, which can be names of columns or arbitrary
         class attributes or properties.
 
+        The keys are computed once per field instance.
+
         :returns: a list of properties
         :rtype: list
         """
+        keys = getattr(self, u'_related_keys', None)
+        if keys is not None:
+            return keys
         keys = super(CustomRelatedField, self).related_keys
         if hasattr(self.related_model, u'href'):
             keys.append(property_stub_factory(u'href'))
@@ -47,9 +69,25 @@ class CustomRelatedField(Related):
                     )
                 else:
                     keys.append(property_stub_factory(attr))
+        self._related_keys = keys
         return keys
 
 
+class RelatedKey(fields.Integer):
+    """The primary key of a related object.
+
+    Either the key itself or the related object's representation, as
+    dumped by :class:`CustomRelatedField`, may be loaded.
+    """
+
+    def _deserialize(self, value, attr, data):
+        if isinstance(value, dict):
+            if u'id' not in value:
+                self.fail(u'invalid')
+            value = value[u'id']
+        return super(RelatedKey, self)._deserialize(value, attr, data)
+
+
 class CustomConverter(ModelConverter):
     """Ensure the "href" attribute is pulled for mtm relationships."""
 
@@ -63,6 +101,146 @@ class CustomConverter(ModelConverter):
             )._get_field_class_for_property(prop)
 
 
+class CompiledDump(object):
+    """A dump function precompiled for a schema and set of fields.
+
+    Attribute values are read straight from model instances into
+    dicts, producing the same output as the schema's ``dump()`` method
+    without marshmallow's per-object and per-field overhead. Keys are
+    written in the schema's declared order, whatever the order of
+    ``only``. Simple
+    field types are serialized inline, related fields use the related
+    keys computed once at compile time, and any other field falls back
+    to its own ``serialize()`` method.
+
+    Use :meth:`for_schema` to retrieve a cached instance.
+    """
+
+    _compiled = {}
+
+    INLINE_FIELDS = (
+        fields.Boolean,
+        fields.Date,
+        fields.DateTime,
+        fields.Decimal,
+        fields.Float,
+        fields.Time,
+    )
+
+    def __init__(self, schema_cls, only=None):
+        """Compile the dump function.
+
+        :param type schema_cls: a schema generated by ``autospec_model``
+        :param Iterable[str] only: the names of the fields to dump.
+            Defaults to all fields.
+        """
+        schema = schema_cls(only=only)
+        self.envelope_key = schema.envelope_key
+        self.writers = tuple(
+            self._writer(schema, name, schema.fields[name])
+            for name in schema_cls._declared_fields
+            if name in schema.fields and not schema.fields[name].load_only
+        )
+
+    @classmethod
+    def for_schema(cls, schema_cls, only=None):
+        """Return the compiled dump for the schema and field set.
+
+        The dump function is compiled on first use and cached.
+        """
+        key = (schema_cls, None if only is None else frozenset(only))
+        try:
+            return cls._compiled[key]
+        except KeyError:
+            return cls._compiled.setdefault(key, cls(schema_cls, only=only))
+
+    @staticmethod
+    def _related(field):
+        """Return a function serializing a related object like ``field``."""
+        keys = tuple(prop.key for prop in field.related_keys)
+        if len(keys) == 1:
+            key = keys[0]
+            return lambda value: getattr(value, key, None)
+        return lambda value: {key: getattr(value, key, None) for key in keys}
+
+    @classmethod
+    def _writer(cls, schema, name, field):
+        """Return a function writing the field's value from obj to out."""
+        key = field.dump_to or name
+        attr = field.attribute or name
+        kind = type(field)
+
+        if u'.' in attr or not field._CHECK_ATTRIBUTE:
+            kind = None
+
+        if kind is fields.Integer and not field.as_string:
+            def write(obj, out):
+                value = getattr(obj, attr)
+                out[key] = None if value is None else int(value)
+        elif kind is fields.String:
+            def write(obj, out):
+                value = getattr(obj, attr)
+                if value is None or type(value) is text_type:
+                    out[key] = value
+                else:
+                    out[key] = ensure_text_type(value)
+        elif kind in cls.INLINE_FIELDS:
+            serialize = field._serialize
+
+            def write(obj, out):
+                out[key] = serialize(getattr(obj, attr), name, obj)
+        elif kind is fields.List and isinstance(field.container, Related):
+            related = cls._related(field.container)
+
+            def write(obj, out):
+                value = getattr(obj, attr)
+                if value is None:
+                    out[key] = None
+                elif is_collection(value):
+                    out[key] = [related(each) for each in value]
+                else:
+                    out[key] = [related(value)]
+        elif kind is not None and issubclass(kind, Related):
+            related = cls._related(field)
+
+            def write(obj, out):
+                out[key] = related(getattr(obj, attr))
+        else:
+            accessor = schema.get_attribute
+
+            def write(obj, out):
+                value = field.serialize(name, obj, accessor=accessor)
+                if value is not missing:
+                    out[key] = value
+
+        return write
+
+    def dump_one(self, obj):
+        """Dump a single model instance to a dict."""
+        out = {}
+        for write in self.writers:
+            write(obj, out)
+        return out
+
+    def dump(self, obj, many=False, context=None):
+        """Dump an instance, or an enveloped collection of instances.
+
+        :param obj: an ORM object, or an iterable of ORM objects if
+            ``many`` is True
+        :param bool many: whether a collection is being dumped
+        :param dict context: the schema context used to populate the
+            collection envelope
+        """
+        if not many:
+            return self.dump_one(obj)
+        dump_one = self.dump_one
+        return envelope(
+            [dump_one(item) for item in obj],
+            context or {},
+            self.envelope_key,
+        )
+
+
 def dump(self, context=None, many=False, **schema_kwargs):
     """Convert the model instance to a serializable dict."""
     context = context or {}
@@ -87,28 +265,180 @@ def loads(self, data, context=None, many=False, **schema_kwargs):
     return self.spec(context=context, many=many, **schema_kwargs).loads(data)
 
 
+def _loader_name(prop):
+    """Return the name of the eager loader to use for a relationship.
+
+    Collections are loaded with a second ``SELECT ... IN`` query, while
+    scalar relationships are joined into the parent query.
+    """
+    return u'selectinload' if prop.uselist else u'joinedload'
+
+
+def eager_load_options(model, field_names=None):
+    """Return loader options for the relationships a schema will dump.
+
+    Relationships named in ``field_names``, as well as relationships
+    named in the related models' ``__nested__`` attributes (which are
+    included in the related field's representation), are eagerly
+    loaded, so that dumping any number of instances issues a fixed
+    number of queries.
+
+    :param sqlalchemy.ext.declarative.DeclarativeMeta model:
+        a sqlalchemy ORM class
+    :param Iterable[str] field_names: the names of the fields that
+        will be dumped. Defaults to all of the model's mapped
+        attributes.
+    :returns: a tuple of loader options to pass to ``Query.options()``
+    :rtype: tuple
+    """
+    relationships = model.__mapper__.relationships
+    if field_names is None:
+        field_names = relationships.keys()
+    options = []
+    for name in field_names:
+        if name not in relationships:
+            continue
+        prop = relationships[name]
+        loader = getattr(orm, _loader_name(prop))(getattr(model, name))
+        options.append(loader)
+        related = prop.mapper.class_
+        for nested in getattr(related, u'__nested__', ()):
+            if nested not in prop.mapper.relationships:
+                continue
+            nested_prop = prop.mapper.relationships[nested]
+            options.append(
+                getattr(loader, _loader_name(nested_prop))(
+                    getattr(related, nested)
+                )
+            )
+    return tuple(options)
+
+
+def field_load_options(model, field_names, columns=()):
+    """Return loader options loading only what the fields need.
+
+    Only the columns named in ``field_names`` (and ``columns``) are
+    selected, relationships named in ``field_names`` are eagerly
+    loaded as for :func:`eager_load_options`, and other relationships
+    are not loaded at all.
+
+    :param sqlalchemy.ext.declarative.DeclarativeMeta model:
+        a sqlalchemy ORM class
+    :param Iterable[str] field_names: the names of the fields that
+        will be dumped
+    :param Iterable[str] columns: the names of additional columns
+        to load, e.g. for ordering or versioning
+    :returns: a tuple of loader options to pass to ``Query.options()``
+    :rtype: tuple
+    """
+    mapper = model.__mapper__
+    names = set(field_names)
+    load = [
+        name for name in mapper.column_attrs.keys()
+        if name in names or name in columns
+    ]
+    skip = [
+        orm.noload(getattr(model, name))
+        for name in mapper.relationships.keys()
+        if name not in names
+    ]
+    options = (orm.load_only(*load),) if load else ()
+    return options + eager_load_options(model, field_names) + tuple(skip)
+
+
+def field_order(model, names):
+    """Return a model's field names in a fixed order.
+
+    Columns come first, in the order of the model's table, then other
+    fields, such as relationships and ``href``, in the order given.
+    Dumps, and so JSON keys and CSV columns, follow this order, rather
+    than that of sets, which varies from one process to the next.
+
+    :param sqlalchemy.ext.declarative.DeclarativeMeta model:
+        a sqlalchemy ORM class
+    :param Iterable[str] names: the names of the model's fields
+    :rtype: list
+    """
+    columns = {
+        column: index
+        for index, column in enumerate(model.__table__.columns)
+    }
+    positions = {
+        prop.key: columns[prop.columns[0]]
+        for prop in model.__mapper__.column_attrs
+        if prop.columns[0] in columns
+    }
+    names = list(names)
+    return sorted(
+        names,
+        key=lambda name: (
+            name not in positions,
+            positions.get(name, 0),
+            names.index(name),
+        ),
+    )
+
+
+def row_schema(model):
+    """Create a schema loading plain rows for the model's table.
+
+    Loading does not create ORM objects, so it requires no session.
+    The schema has the model schema's column fields, except for those
+    named in the model's ``__readonly__`` attribute, and a list of
+    related ids for each many-to-many relationship. Collections are
+    loaded from the ``Collection`` envelope.
+
+    :param sqlalchemy.ext.declarative.DeclarativeMeta model:
+        a sqlalchemy ORM class with a ``spec``
+    :returns: a schema class
+    :rtype: type
+    """
+    mapper = model.__mapper__
+    readonly = getattr(model, u'__readonly__', ())
+    cls_dict = {
+        name: field
+        for name, field in model.spec._declared_fields.items()
+        if name in mapper.column_attrs and name not in readonly
+    }
+    for prop in mapper.relationships:
+        if prop.secondary is not None:
+            cls_dict[prop.key] = fields.List(RelatedKey())
+    return type(
+        '{}RowSchema'.format(model.__name__), (Schema, Collection), cls_dict
+    )
+
+
 def autospec_model(model, session, add_load_dump_methods=True,
-                   **schema_overrides):
+                   json_module=None, **schema_overrides):
     """Automatically create a specification schema for an ORM model.
 
+    The schema is attached to the model as ``spec``, with its fields in
+    the order of :func:`field_order`, and the loader options needed to
+    dump it without lazy loading are attached as ``eager_options``. A
+    ``dumper(only=None)`` static method returning the cached
+    :class:`CompiledDump` for a set of fields is attached as well, as is
+    a ``row_spec`` schema for bulk loading (see :func:`row_schema`).
+
     :param sqlalchemy.ext.declarative.DeclarativeMeta model:
         a sqlalchemy ORM class
     :param sqlalchemy.orm.session.Session session: a sqlalchemy session
     :param bool add_load_dump_methods: whether to add ``load`` and
         ``dump`` (and ``loads`` and ``dumps``) methods to the ORM
         model utilizing the automatically generated schema.
+    :param json_module: the module (or object) with ``dumps`` and
+        ``loads`` functions used by the schema, by default ``json``
     :param **schema_overrides: extra items to include in the generated
         schema's class dictionary
     """
-    options_cls = type(
-        'Meta',
-        (object,),
-        {
-            u'model': model,
-            u'session': session,
-            u'model_converter': CustomConverter
-        }
-    )
+    options = {
+        u'model': model,
+        u'session': session,
+        u'model_converter': CustomConverter,
+        u'ordered': True,
+    }
+    if json_module is not None:
+        options[u'json_module'] = json_module
+    options_cls = type('Meta', (object,), options)
     cls_dict = {u'Meta': options_cls}
     cls_dict.update(schema_overrides)
 
@@ -122,6 +452,23 @@ def autospec_model(model, session, add_load_dump_methods=True,
         )
     )
 
+    declared = model.spec._declared_fields
+    model.spec._declared_fields = OrderedDict(
+        (name, declared[name]) for name in field_order(model, declared)
+    )
+
+    setattr(
+        model,
+        u'eager_options',
+        eager_load_options(model, model.spec._declared_fields),
+    )
+    setattr(
+        model,
+        u'dumper',
+        staticmethod(partial(CompiledDump.for_schema, model.spec)),
+    )
+    setattr(model, u'row_spec', row_schema(model))
+
     if add_load_dump_methods:
         setattr(model, u'dump', dump)
         setattr(model, u'dumps', dumps)
@@ -5,6 +5,33 @@ from __future__ import absolute_import, unicode_literals
 from marshmallow import fields, post_dump, pre_load
 
 
+ENVELOPE_EXTRAS = ('total_type', 'next', 'missing')
+
+
+def envelope(data, context, envelope_key='items'):
+    """Wrap a list of dumped items in a collection envelope.
+
+    :param list data: the dumped items
+    :param dict context: the schema context, optionally containing the
+        limit, offset, total, and the ``ENVELOPE_EXTRAS`` keys
+    :param str envelope_key: the key under which to place the items
+    :returns: the envelope
+    :rtype: dict
+    """
+    data_len = len(data)
+    wrapped = {
+        'count': data_len,
+        'total': context.get('total', data_len),
+        'limit': context.get('limit', 0),
+        'offset': context.get('offset', 0),
+        envelope_key: data
+    }
+    for key in ENVELOPE_EXTRAS:
+        if key in context:
+            wrapped[key] = context[key]
+    return wrapped
+
+
 class Collection(object):
     """Implement automatic collection enveloping."""
 
@@ -16,7 +43,8 @@ class Collection(object):
         """Wrap the collection of items in an envelope.
 
         The schema context is used to pass data about the limit, offset,
-        and total, if available, e.g.
+        total, how the total was obtained (``total_type``), the URL of
+        the ``next`` page, and any ``missing`` ids, if available, e.g.
         ``Schema(context={'limit': 5}, many=True).dump(data)`` or::
 
             sch = Schema(many=True)
@@ -25,14 +53,7 @@ class Collection(object):
 
         """
         if many:
-            data_len = len(data)
-            return {
-                'count': data_len,
-                'total': self.context.get('total', data_len),
-                'limit': self.context.get('limit', 0),
-                'offset': self.context.get('offset', 0),
-                self.envelope_key: data
-            }
+            return envelope(data, self.context, self.envelope_key)
 
     @pre_load(pass_many=True)
     def unwrap_envelope(self, data, many):
@@ -2,11 +2,180 @@
 
 from __future__ import absolute_import, unicode_literals
 
-from marshmallow import Schema, fields
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime, time
+from decimal import Decimal
+from numbers import Integral, Real
 
+from marshmallow import Schema, ValidationError, fields, validates_schema
+from marshmallow.compat import basestring
 
-class CollectionQueryArgs(Schema):
+
+#: The formats of temporal cursor values, as encoded by ``str()``.
+CURSOR_FORMATS = (
+    (datetime, ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S')),
+    (date, ('%Y-%m-%d',)),
+    (time, ('%H:%M:%S.%f', '%H:%M:%S')),
+)
+
+
+def encode_cursor(values):
+    """Encode a list of column values as an opaque cursor string.
+
+    :param list values: JSON-serializable values, in ordering column
+        order, identifying the last row of a page
+    :returns: URL-safe cursor text
+    :rtype: str
+    """
+    raw = json.dumps(values, separators=(',', ':'), default=str)
+    return urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor string produced by :func:`encode_cursor`.
+
+    :param str cursor: the opaque cursor text
+    :returns: the list of column values
+    :rtype: list
+    :raises ValueError: if the cursor is malformed
+    """
+    padded = cursor + '=' * (-len(cursor) % 4)
+    values = json.loads(urlsafe_b64decode(padded.encode('ascii')).decode())
+    if not isinstance(values, list):
+        raise ValueError('{} is not a valid cursor'.format(cursor))
+    return values
+
+
+def cursor_value(value, python_type):
+    """Return a decoded cursor value as an instance of ``python_type``.
+
+    Cursors hold JSON values, so dates, times and decimals are decoded
+    from the text :func:`encode_cursor` writes for them.
+
+    :param value: a value of a decoded cursor
+    :param type python_type: the Python type of the value's column
+    :raises ValueError: if the value is not of the type, nor text of it
+    """
+    number = isinstance(value, Real) and not isinstance(value, bool)
+    try:
+        if python_type is bool:
+            if isinstance(value, bool):
+                return value
+        elif issubclass(python_type, Integral):
+            if isinstance(value, Integral) and number:
+                if -2 ** 63 <= value < 2 ** 63:
+                    return python_type(value)
+        elif issubclass(python_type, (float, Decimal)):
+            if number or isinstance(value, basestring):
+                return python_type(value)
+        elif issubclass(python_type, basestring):
+            if isinstance(value, basestring):
+                return value
+        elif isinstance(value, basestring):
+            return _temporal_value(value, python_type)
+    except ArithmeticError:
+        pass
+    raise ValueError(
+        '{!r} is not a valid {} cursor value'.format(
+            value, python_type.__name__
+        )
+    )
+
+
+def _temporal_value(value, python_type):
+    """Parse a cursor's text as a datetime, date or time."""
+    for temporal, formats in CURSOR_FORMATS:
+        if issubclass(python_type, temporal):
+            break
+    else:
+        raise ValueError('{!r} is not a valid cursor value'.format(value))
+    for format in formats:
+        try:
+            parsed = datetime.strptime(value, format)
+        except ValueError:
+            continue
+        if temporal is date:
+            return parsed.date()
+        if temporal is time:
+            return parsed.time()
+        return parsed
+    raise ValueError('{!r} is not a valid cursor value'.format(value))
+
+
+class Cursor(fields.Field):
+    """An opaque keyset pagination cursor."""
+
+    default_error_messages = {
+        'invalid': 'Not a valid cursor.',
+    }
+
+    def _serialize(self, value, attr, obj):
+        if value is None:
+            return None
+        return encode_cursor(value)
+
+    def _deserialize(self, value, attr, data):
+        try:
+            return decode_cursor(value)
+        except (TypeError, ValueError):
+            self.fail('invalid')
+
+
+class DelimitedList(fields.Field):
+    """A list of values, given as comma-delimited text."""
+
+    default_error_messages = {
+        'invalid': 'Not a valid comma-delimited list.',
+    }
+
+    def __init__(self, item=None, **kwargs):
+        """Instantiate the field.
+
+        :param marshmallow.fields.Field item: the field used to
+            (de)serialize each value. Defaults to a string field.
+        """
+        super(DelimitedList, self).__init__(**kwargs)
+        self.item = item or fields.String()
+
+    def _serialize(self, value, attr, obj):
+        if value is None:
+            return None
+        return ','.join(
+            str(self.item._serialize(each, attr, obj)) for each in value
+        )
+
+    def _deserialize(self, value, attr, data):
+        if not isinstance(value, basestring):
+            self.fail('invalid')
+        return [
+            self.item.deserialize(each.strip())
+            for each in value.split(',') if each.strip()
+        ]
+
+
+class QueryArgs(Schema):
+    """Arguments common to any query."""
+
+    fields = DelimitedList()
+
+
+class CollectionQueryArgs(QueryArgs):
     """Arguments common to collection queries."""
 
     limit = fields.Integer()
     offset = fields.Integer()
+    after = Cursor()
+    total = fields.String()
+    stream = fields.Boolean()
+    ids = DelimitedList(fields.Integer())
+
+    @validates_schema
+    def validate_pagination(self, data):
+        """Ensure only one pagination style is requested."""
+        styles = [name for name in ('offset', 'after', 'ids') if name in data]
+        if len(styles) > 1:
+            raise ValidationError(
+                'Only one of "offset", "after", and "ids" may be provided.',
+                styles,
+            )
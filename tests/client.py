@@ -47,8 +47,9 @@ class Client(object):
         return dict(self._headers)
 
     def _generic_meth(self, meth, *args, **kwargs):
-        if 'headers' in kwargs:
-            kwargs['headers'] = self.headers.update(kwargs['headers'])
+        headers = self.headers
+        headers.update(kwargs.get('headers', {}))
+        kwargs['headers'] = headers
         return ResponseWrapper(getattr(self.client, meth)(*args, **kwargs))
 
     def __getattr__(self, attr):
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Test bulk writes."""
+
+from __future__ import absolute_import, unicode_literals
+
+import csv
+import io
+from datetime import date, datetime
+
+from marshmallow.compat import text_type
+from sqlalchemy.dialects import postgresql, sqlite
+
+from my_library.db.bulk import BulkUpsert, copy_row, copy_value
+from my_library.db.models import Book
+
+
+class TestCopy(object):
+
+    def test_values(self):
+        """Test that values are formatted for COPY in CSV format."""
+        assert copy_value(None) == ''
+        assert copy_value('') == '""'
+        assert copy_value('say "hi", ø') == '"say ""hi"", ø"'
+        assert copy_value(True) == 'true'
+        assert copy_value(12) == '12'
+        assert copy_value(date(1813, 5, 5)) == '1813-05-05'
+        assert copy_value(datetime(2018, 4, 1, 12, 30)) == (
+            '2018-04-01T12:30:00'
+        )
+
+    def test_row(self):
+        """Test that rows are lines of CSV."""
+        values = ['a,b', None, 'line\nbreak', 3]
+        line = copy_row(values)
+        assert line.endswith('\n')
+        (row,) = csv.reader(io.StringIO(line))
+        assert row == ['a,b', '', 'line\nbreak', '3']
+
+
+class RecordingSession(object):
+    """Record the statements of a dialect, returning given results."""
+
+    def __init__(self, dialect, results):
+        self.dialect = dialect
+        self.results = iter(results)
+        self.statements = []
+        self.info = {}
+
+    def connection(self):
+        return self
+
+    def execute(self, statement, params=None):
+        self.statements.append(
+            text_type(statement.compile(dialect=self.dialect))
+        )
+        return next(self.results)
+
+
+class TestInsertReturning(object):
+
+    def test_multiple_values(self):
+        """Test that ids are returned by an INSERT per chunk, in order."""
+        dialect = postgresql.dialect(implicit_returning=True)
+        session = RecordingSession(dialect, [[(1,), (2,)], [(3,)]])
+        upsert = BulkUpsert(session, Book, chunk_size=2)
+        values = [{'title': title} for title in 'abc']
+        assert upsert.insert_returning(Book.__table__, values) == [1, 2, 3]
+        assert len(session.statements) == 2
+        assert session.statements[0].count('%(title_m') == 2
+        assert session.statements[0].endswith('RETURNING books.id')
+
+    def test_single_values(self):
+        """Test that rows are inserted one at a time, without RETURNING."""
+
+        class Result(object):
+            def __init__(self, id):
+                self.inserted_primary_key = [id]
+
+        session = RecordingSession(
+            sqlite.dialect(), [Result(1), Result(2)]
+        )
+        upsert = BulkUpsert(session, Book)
+        values = [{'title': title} for title in 'ab']
+        assert upsert.insert_returning(Book.__table__, values) == [1, 2]
+        assert len(session.statements) == 2
+        assert 'RETURNING' not in session.statements[0]
+
+
+class TestSyncSequence(object):
+
+    def test_explicit_ids(self):
+        """Test that the sequence moves past ids, before generating ids."""
+        dialect = postgresql.dialect(implicit_returning=True)
+        session = RecordingSession(dialect, [None, None, [(8,)]])
+        upsert = BulkUpsert(session, Book)
+        rows = [{'id': 7, 'title': 'a'}, {'title': 'b'}]
+        assert upsert.insert(rows) == [7, 8]
+        assert 'setval' in session.statements[1]
+        assert 'RETURNING' in session.statements[2]
+
+    def test_other_databases(self):
+        """Test that sequences are only moved on PostgreSQL."""
+        session = RecordingSession(sqlite.dialect(), [None])
+        BulkUpsert(session, Book).insert([{'id': 7, 'title': 'a'}])
+        assert len(session.statements) == 1
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Test the identity cache."""
+
+from __future__ import absolute_import, unicode_literals
+
+import json
+from datetime import date
+
+import pytest
+from flask import current_app as app
+from sqlalchemy import inspect
+
+from my_library.db.identity import EXTENSION, IdentityCache
+from my_library.db.models import Author, Book
+from my_library.resources.books import BookResource, BooksResource
+from my_library.resources.status import IdentityCacheStatsResource
+
+from tests.client import Client
+from tests.http import Status
+from tests.mixins import AppTest
+from tests.util import count_queries
+
+
+class TestIdentityCache(AppTest):
+
+    author = Author(name='Albert Camus', birth=date(1913, 11, 7))
+    book = Book(title='The Stranger', published=1942, authors=[author])
+    other = Book(title='The Plague', published=1947)
+
+    @pytest.fixture(scope='class', autouse=True)
+    def add_books(self, setup_app):
+        app.db.session.add_all([self.book, self.other])
+        app.db.session.commit()
+        ids = [obj.id for obj in (self.book, self.other, self.author)]
+        IdentityCache(size=2, ttl=60).init_app(app)
+        yield
+        del app.extensions[EXTENSION]
+        session = app.db.session
+        session.delete(session.query(Book).get(ids[0]))
+        session.delete(session.query(Book).get(ids[1]))
+        session.delete(session.query(Author).get(ids[2]))
+        session.commit()
+
+    @pytest.fixture(autouse=True)
+    def ids(self):
+        return {
+            'book': inspect(self.book).identity[0],
+            'other': inspect(self.other).identity[0],
+            'author': inspect(self.author).identity[0],
+        }
+
+    def load(self, model, id):
+        return app.db.session.query(model).get(id)
+
+    @pytest.fixture(autouse=True)
+    def cache(self):
+        cache = app.extensions[EXTENSION]
+        cache.clear()
+        cache.hits = cache.misses = 0
+        return cache
+
+    def get(self, id, **kwargs):
+        app.db.session.expunge_all()
+        with app.test_request_context():
+            path = BookResource.url_for(id=id)
+        with count_queries(app.db.engine) as statements:
+            resp = Client(app).get(path, **kwargs)
+        return resp, statements
+
+    def test_hit(self, cache, ids):
+        """Test that cached books are represented without queries."""
+        first, statements = self.get(ids['book'])
+        assert statements
+        second, statements = self.get(ids['book'])
+        assert not statements
+        assert second.json() == first.json()
+        assert second.headers['ETag'] == first.headers['ETag']
+        assert cache.stats == {'size': 1, 'hits': 1, 'misses': 1}
+
+        resp, statements = self.get(
+            ids['book'], headers={'If-None-Match': first.headers['ETag']}
+        )
+        assert Status.code(resp) == 304
+        assert not statements
+
+    def test_stats_resource(self, cache, ids):
+        """Test that the cache's hits and misses are reported."""
+        self.get(ids['book'])
+        self.get(ids['book'])
+        resp = Client(app).get(IdentityCacheStatsResource.path)
+        assert Status.good(resp)
+        assert resp.json() == {'size': 1, 'hits': 1, 'misses': 1}
+
+    def test_snapshots_detached(self, cache, ids):
+        """Test that objects merged from the cache are independent."""
+        self.get(ids['book'])
+        app.db.session.expunge_all()
+        book = cache.get(app.db.session, Book, ids['book'])
+        book.title = 'Changed'
+        app.db.session.expunge_all()
+        book = cache.get(app.db.session, Book, ids['book'])
+        assert book.title == 'The Stranger'
+        app.db.session.expunge_all()
+
+    def test_missing(self, cache):
+        """Test that missing books are not cached."""
+        assert cache.get(app.db.session, Book, 99999) is None
+        assert len(cache) == 0
+
+    def test_invalidated_by_related_rows(self, ids):
+        """Test that changes to included related rows invalidate."""
+        self.get(ids['book'])
+        self.load(Author, ids['author']).name = 'A. Camus'
+        app.db.session.commit()
+        resp, statements = self.get(ids['book'])
+        assert statements
+        assert resp.json()['authors'][0]['name'] == 'A. Camus'
+        self.load(Author, ids['author']).name = 'Albert Camus'
+        app.db.session.commit()
+
+    def test_not_invalidated_by_other_rows(self, ids):
+        """Test that changes to unrelated rows do not invalidate."""
+        self.get(ids['book'])
+        self.load(Book, ids['other']).published = 1948
+        app.db.session.commit()
+        _, statements = self.get(ids['book'])
+        assert not statements
+        self.load(Book, ids['other']).published = 1947
+        app.db.session.commit()
+
+    def test_invalidated_by_bulk_writes(self, ids):
+        """Test that bulk updates invalidate."""
+        self.get(ids['book'])
+        resp = Client(app).post(BooksResource.path, data=json.dumps({
+            'items': [{'id': ids['book'], 'published': 1943}],
+        }))
+        assert Status.good(resp)
+        resp, statements = self.get(ids['book'])
+        assert statements
+        assert resp.json()['published'] == 1943
+        self.load(Book, ids['book']).published = 1942
+        app.db.session.commit()
+
+    def test_bounded(self, cache, ids):
+        """Test that the least recently used snapshots are evicted."""
+        for id in (ids['book'], ids['other'], ids['book']):
+            self.get(id)
+        cache.get(app.db.session, Author, ids['author'])
+        assert len(cache) == 2
+        _, statements = self.get(ids['book'])
+        assert not statements
+        _, statements = self.get(ids['other'])
+        assert statements
+
+
+class TestIdentityCacheStatsResource(AppTest):
+
+    def test_disabled(self):
+        """Test that stats are not found without a cache."""
+        resp = Client(app).get(IdentityCacheStatsResource.path)
+        assert Status.code(resp) == 404
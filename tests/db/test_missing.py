@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""Test the cache of missing ids."""
+
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+import pytest
+from flask import current_app as app
+
+from my_library.app import create_app
+from my_library.db import missing as missing_module
+from my_library.db.events import Changes
+from my_library.db.missing import EXTENSION, MissingIds
+from my_library.db.models import Author, Book
+from my_library.resources.authors import AuthorResource
+from my_library.resources.books import BookResource, BooksResource
+
+from tests.client import Client
+from tests.http import Status
+from tests.mixins import AppTest
+from tests.util import count_queries
+
+
+class TestMissingIds(AppTest):
+
+    @pytest.fixture(scope='class', autouse=True)
+    def add_missing(self, setup_app):
+        MissingIds(size=2, ttl=60).init_app(app)
+        yield
+        del app.extensions[EXTENSION]
+
+    @pytest.fixture(autouse=True)
+    def missing(self):
+        missing = app.extensions[EXTENSION]
+        missing.clear()
+        missing.hits = 0
+        return missing
+
+    @pytest.fixture
+    def book(self):
+        book = Book(title='Nausea', published=1938)
+        app.db.session.add(book)
+        app.db.session.commit()
+        yield book
+        app.db.session.delete(book)
+        app.db.session.commit()
+
+    def get(self, resource, id):
+        with app.test_request_context():
+            path = resource.url_for(id=id)
+        with count_queries(app.db.engine) as statements:
+            resp = Client(app).get(path)
+        return resp, statements
+
+    def test_above_greatest_id(self, missing, book):
+        """Test that ids above the greatest id are not remembered."""
+        for _ in range(2):
+            resp, statements = self.get(BookResource, book.id + 1)
+            assert Status.code(resp) == 404
+            assert statements
+        assert len(missing) == 0
+        assert missing.hits == 0
+
+    def test_other_apps(self, book):
+        """Test that rows inserted by other apps are found at once."""
+        resp, _ = self.get(BookResource, book.id + 1)
+        assert Status.code(resp) == 404
+        other = create_app()
+        MissingIds(size=2, ttl=60).init_app(other)
+        with other.app_context():
+            other.db.session.add(Book(title='The Wall', published=1939))
+            other.db.session.commit()
+        try:
+            resp, _ = self.get(BookResource, book.id + 1)
+            assert Status.good(resp)
+            assert resp.json()['title'] == 'The Wall'
+        finally:
+            app.db.session.query(Book).filter_by(id=book.id + 1).delete()
+            app.db.session.commit()
+
+    def test_missing_ids(self, missing):
+        """Test that ids found missing are remembered."""
+        gone, kept = Book(title='Gone'), Book(title='Kept')
+        app.db.session.add_all([gone, kept])
+        app.db.session.commit()
+        id = gone.id
+        app.db.session.delete(gone)
+        app.db.session.commit()
+        try:
+            resp, _ = self.get(BookResource, id)
+            assert Status.code(resp) == 404
+            resp, statements = self.get(BookResource, id)
+            assert Status.code(resp) == 404
+            assert not statements
+            assert len(missing) == 1
+        finally:
+            app.db.session.delete(kept)
+            app.db.session.commit()
+
+    def test_inserts_invalidate(self, book):
+        """Test that inserted ids are no longer missing."""
+        resp, _ = self.get(BookResource, book.id + 1)
+        assert Status.code(resp) == 404
+        other = Book(id=book.id + 1, title='The Wall', published=1939)
+        app.db.session.add(other)
+        app.db.session.commit()
+        try:
+            resp, _ = self.get(BookResource, other.id)
+            assert Status.good(resp)
+        finally:
+            app.db.session.delete(other)
+            app.db.session.commit()
+
+    def test_bulk_inserts_invalidate(self, book):
+        """Test that ids inserted in bulk are no longer missing."""
+        resp, _ = self.get(BookResource, book.id + 1)
+        assert Status.code(resp) == 404
+        resp = Client(app).post(BooksResource.path, data=json.dumps({
+            'items': [{'title': 'The Wall', 'published': 1939}],
+        }))
+        id = resp.json()['items'][0]['id']
+        try:
+            resp, _ = self.get(BookResource, id)
+            assert Status.good(resp)
+        finally:
+            app.db.session.delete(app.db.session.query(Book).get(id))
+            app.db.session.commit()
+
+    def test_models_separate(self, missing, book):
+        """Test that each model has its own missing ids."""
+        missing._missing[(Author, book.id)] = missing_module.time() + 60
+        resp, _ = self.get(BookResource, book.id)
+        assert Status.good(resp)
+        resp, _ = self.get(AuthorResource, book.id)
+        assert Status.code(resp) == 404
+        assert missing.hits == 1
+
+    def test_bounded_and_expiring(self, missing, book, monkeypatch):
+        """Test that missing ids are bounded and expire."""
+        ids = [book.id - 2, book.id - 1, book.id]
+        for id in ids:
+            missing.add(app.db.session, Book, id, missing.generation)
+        assert len(missing) == 2
+        assert missing.is_missing(Book, ids[-1])
+        now = missing_module.time()
+        monkeypatch.setattr(missing_module, 'time', lambda: now + 61)
+        assert not missing.is_missing(Book, ids[-1])
+        assert len(missing) == 1
+
+    def test_stale_not_stored(self, missing):
+        """Test that ids found missing before a commit are not stored."""
+        generation = missing.generation
+        missing.invalidate(Changes(set(), set(), set()))
+        missing.add(app.db.session, Book, 0, generation)
+        assert len(missing) == 0
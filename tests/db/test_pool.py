@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Test connection pool configuration and statistics."""
+
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+from flask import current_app as app
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import SingletonThreadPool
+
+from my_library.app import get_db_conf
+from my_library.db.pool import TimedQueuePool, pool_options, pool_stats
+from my_library.resources.status import PoolStatsResource
+
+from tests.client import Client
+from tests.http import Status
+from tests.mixins import AppTest
+
+
+class TestPoolOptions(AppTest):
+
+    def test_sqlite(self):
+        """Test that SQLite databases get no pool arguments."""
+        assert pool_options(get_db_conf(load=False)) == {}
+
+    def test_sqlite_pool_size(self, monkeypatch):
+        """Test that SQLite connections are kept per thread if sized."""
+        monkeypatch.setenv('DB_POOL_SIZE', '4')
+        assert pool_options(get_db_conf()) == {
+            'poolclass': SingletonThreadPool,
+            'pool_size': 4,
+        }
+
+    def test_server(self, monkeypatch):
+        """Test that set pool settings are passed as engine arguments."""
+        monkeypatch.setenv('DB_ENGINE', 'postgresql')
+        monkeypatch.setenv('DB_POOL_SIZE', '20')
+        monkeypatch.setenv('DB_POOL_TIMEOUT', '2.5')
+        monkeypatch.setenv('DB_POOL_PRE_PING', 'yes')
+        assert pool_options(get_db_conf()) == {
+            'poolclass': TimedQueuePool,
+            'pool_size': 20,
+            'pool_timeout': 2.5,
+            'pool_pre_ping': True,
+        }
+
+    def test_engine_options(self):
+        """Test that the engine options config reaches engines."""
+        db = app.db.flask_sqla
+        options = {}
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_recycle': 30}
+        try:
+            db.apply_driver_hacks(app, make_url('postgresql://h/d'), options)
+        finally:
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+        assert options['pool_recycle'] == 30
+
+
+class TestTimedQueuePool(object):
+
+    @pytest.fixture
+    def engine(self):
+        engine = create_engine(
+            'sqlite://',
+            poolclass=TimedQueuePool,
+            pool_size=1,
+            max_overflow=1,
+            pool_timeout=0.01,
+        )
+        yield engine
+        engine.dispose()
+
+    def test_stats(self, engine):
+        """Test that checkouts, overflow, and timeouts are counted."""
+        first = engine.connect()
+        second = engine.connect()
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        stats = pool_stats(engine.pool)
+        assert stats['pool'] == 'TimedQueuePool'
+        assert stats['checked_out'] == 2
+        assert stats['overflow'] == 1
+        assert stats['checkouts'] == 2
+        assert stats['timeouts'] == 1
+        assert stats['max_wait'] >= 0.01
+        assert stats['wait_time'] >= stats['max_wait']
+        first.close()
+        second.close()
+        stats = pool_stats(engine.pool)
+        assert stats['checked_out'] == 0
+        assert stats['checked_in'] == 1
+
+    def test_other_pools(self):
+        """Test that only the class of other pools is reported."""
+        engine = create_engine('sqlite://')
+        assert pool_stats(engine.pool) == {
+            'pool': type(engine.pool).__name__,
+        }
+
+
+class TestPoolStatsResource(AppTest):
+
+    def test_get(self):
+        """Test that the primary's pool is reported."""
+        app.db.session.execute('SELECT 1')
+        resp = Client(app).get(PoolStatsResource.path)
+        assert Status.good(resp)
+        assert resp.json()['primary']['pool'] == 'NullPool'
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""Test that resource queries don't scan tables they needn't.
+
+Every statement a request issues is explained with SQLite's ``EXPLAIN
+QUERY PLAN``, and the request fails if a statement scans a model table
+which isn't explicitly allowed to be scanned, e.g. the paginated table
+of a collection.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import json
+import re
+from contextlib import contextmanager
+from datetime import date
+
+import pytest
+from flask import current_app as app
+from sqlalchemy import event
+
+from my_library.db.models import Author, Book
+from my_library.db.models.base import Base
+from my_library.resources.authors import AuthorResource, AuthorsResource
+from my_library.resources.books import BookResource, BooksResource
+
+from tests.client import Client
+from tests.http import Status
+from tests.mixins import AppTest
+
+
+#: Matches plan steps reading a whole table or index, including to build
+#: a transient automatic index, in the formats of SQLite before and
+#: since 3.36.
+SCAN = re.compile(
+    r'^(?:SCAN (?:TABLE )?(\w+)|SEARCH (?:TABLE )?(\w+) USING AUTOMATIC)'
+)
+
+TABLES = frozenset(Base.metadata.tables)
+
+
+@contextmanager
+def capture_statements(engine):
+    """Yield a list of the ``(statement, parameters)`` executed."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        if executemany:
+            parameters = parameters[0]
+        statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def scanned_tables(engine, statement, parameters):
+    """Return the model tables the statement's query plan scans."""
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        details = [row[-1] for row in cursor.fetchall()]
+    finally:
+        connection.close()
+    scanned = set()
+    for detail in details:
+        match = SCAN.match(detail)
+        table = match and (match.group(1) or match.group(2))
+        if table in TABLES:
+            scanned.add(table)
+    return scanned
+
+
+class TestQueryPlans(AppTest):
+
+    @pytest.fixture(scope='class', autouse=True)
+    def add_books(self, setup_app):
+        authors = [
+            Author(name='Author {}'.format(i), birth=date(1900, 1, 1))
+            for i in range(5)
+        ]
+        books = [
+            Book(
+                title='Book {}'.format(i),
+                published=1900 + i,
+                authors=[authors[i % 5], authors[(i + 1) % 5]],
+            )
+            for i in range(20)
+        ]
+        app.db.session.add_all(authors + books)
+        app.db.session.commit()
+        book_ids = [book.id for book in books]
+        author_ids = [author.id for author in authors]
+        app.db.session.expunge_all()
+        yield {
+            'book': book_ids[0],
+            'books': book_ids[:3],
+            'author': author_ids[0],
+        }
+        secondary = Book.authors.property.secondary
+        app.db.session.execute(
+            secondary.delete().where(secondary.c.book_id.in_(book_ids))
+        )
+        app.db.session.query(Book).filter(
+            Book.id.in_(book_ids)
+        ).delete(synchronize_session=False)
+        app.db.session.query(Author).filter(
+            Author.id.in_(author_ids)
+        ).delete(synchronize_session=False)
+        app.db.session.commit()
+
+    def assert_no_scans(self, request, allowed=()):
+        """Issue the request, and check the plans of its statements.
+
+        :param callable request: a function issuing a request with a
+            test client, and returning the response
+        :param Iterable allowed: the tables which may be scanned
+        """
+        engine = app.db.engine
+        app.db.session.expunge_all()
+        with capture_statements(engine) as statements:
+            resp = request(Client(app))
+        assert Status.good(resp)
+        assert statements
+        for statement, parameters in statements:
+            if statement.lstrip().split(None, 1)[0].upper() == 'INSERT':
+                continue
+            scanned = scanned_tables(engine, statement, parameters)
+            assert scanned <= set(allowed), statement
+
+    def url(self, resource, **kwargs):
+        with app.test_request_context():
+            return resource.url_for(**kwargs)
+
+    def test_book(self, add_books):
+        path = self.url(BookResource, id=add_books['book'])
+        self.assert_no_scans(lambda client: client.get(path))
+
+    def test_author(self, add_books):
+        path = self.url(AuthorResource, id=add_books['author'])
+        self.assert_no_scans(lambda client: client.get(path))
+
+    def test_books_batch(self, add_books):
+        path = self.url(
+            BooksResource, ids=','.join(map(str, add_books['books']))
+        )
+        self.assert_no_scans(lambda client: client.get(path))
+
+    def test_books_page(self):
+        """Test that only the paginated table is scanned."""
+        path = self.url(BooksResource, limit=5)
+        self.assert_no_scans(
+            lambda client: client.get(path), allowed={'books'}
+        )
+
+    def test_books_after(self, add_books):
+        """Test that keyset pages seek to the cursor."""
+        page = Client(app).get(self.url(BooksResource, limit=2)).json()
+        self.assert_no_scans(
+            lambda client: client.get(page['next'] + '&total=false')
+        )
+
+    def test_bulk_update(self, add_books):
+        """Test that bulk updates, and their link changes, seek."""
+        items = [
+            {'id': id, 'authors': [add_books['author']]}
+            for id in add_books['books']
+        ]
+        self.assert_no_scans(
+            lambda client: client.post(
+                BooksResource.path, data=json.dumps({'items': items})
+            )
+        )
+        items = [
+            {'id': add_books['author'], 'books': add_books['books']}
+        ]
+        self.assert_no_scans(
+            lambda client: client.post(
+                AuthorsResource.path, data=json.dumps({'items': items})
+            )
+        )
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""Test routing reads to replicas."""
+
+from __future__ import absolute_import, unicode_literals
+
+import json
+from os import environ, path, unlink
+
+import pytest
+from flask import current_app as app
+
+from my_library.app import create_app
+from my_library.db.models import Book
+from my_library.db.models.base import Base
+from my_library.db.routing import EXTENSION
+from my_library.resources.books import BookResource, BooksResource
+
+from tests.client import Client
+from tests.http import Status
+
+
+class TestRouting(object):
+
+    @pytest.fixture(scope='class', autouse=True)
+    def setup_app(self):
+        """Set up an app with two SQLite replicas of the test database."""
+        replicas = [
+            '{}.replica{}'.format(environ['DB_HOST'], i) for i in (0, 1)
+        ]
+        environ['DB_REPLICA_HOSTS'] = ','.join(replicas)
+        try:
+            app = create_app()
+        finally:
+            del environ['DB_REPLICA_HOSTS']
+        with app.app_context():
+            for bind in ('replica_0', 'replica_1'):
+                Base.metadata.create_all(
+                    app.db.flask_sqla.get_engine(app, bind=bind)
+                )
+            yield
+        for replica in replicas:
+            if path.exists(replica):
+                unlink(replica)
+
+    @pytest.fixture
+    def router(self):
+        router = app.extensions[EXTENSION]
+        router.last_write = None
+        return router
+
+    @pytest.fixture
+    def book(self, router):
+        book = Book(title='Being and Time', published=1927)
+        app.db.session.add(book)
+        app.db.session.commit()
+        router.last_write = None
+        id = book.id
+        yield book
+        app.db.session.query(Book).filter_by(id=id).delete()
+        app.db.session.commit()
+
+    def get(self, id):
+        app.db.session.expunge_all()
+        with app.test_request_context():
+            path = BookResource.url_for(id=id)
+        return Client(app).get(path)
+
+    def insert_into_replicas(self, book):
+        for bind in ('replica_0', 'replica_1'):
+            app.db.flask_sqla.get_engine(app, bind=bind).execute(
+                Book.__table__.insert(),
+                id=book.id,
+                title=book.title,
+                published=book.published,
+            )
+
+    def delete_from_replicas(self):
+        for bind in ('replica_0', 'replica_1'):
+            app.db.flask_sqla.get_engine(app, bind=bind).execute(
+                Book.__table__.delete()
+            )
+
+    def test_reads_from_replicas(self, book):
+        """Test that resource reads go to the replicas."""
+        id = book.id
+        assert Status.code(self.get(id)) == 404
+        self.insert_into_replicas(book)
+        try:
+            for _ in range(2):
+                resp = self.get(id)
+                assert Status.good(resp)
+                assert resp.json()['id'] == id
+        finally:
+            self.delete_from_replicas()
+
+    def test_round_robin(self, router):
+        """Test that replicas are chosen in turn."""
+        binds = [router.next_bind() for _ in range(4)]
+        assert binds[:2] == binds[2:]
+        assert set(binds) == {'replica_0', 'replica_1'}
+
+    def test_read_your_writes(self, book, router):
+        """Test that reads go to the primary right after a commit."""
+        id = book.id
+        assert Status.code(self.get(id)) == 404
+        app.db.session.query(Book).get(id).published = 1928
+        app.db.session.commit()
+        assert router.writing
+        assert Status.good(self.get(id))
+        router.window = 0
+        try:
+            assert Status.code(self.get(id)) == 404
+        finally:
+            router.window = 5.0
+
+    def test_writes_to_primary(self, router):
+        """Test that writes and their reads go to the primary."""
+        self.get(1)
+        resp = Client(app).post(BooksResource.path, data=json.dumps({
+            'items': [{'title': 'Sein und Zeit'}],
+        }))
+        assert Status.good(resp)
+        id = resp.json()['items'][0]['id']
+        app.db.session.expunge_all()
+        book = app.db.session.query(Book).get(id)
+        assert book.title == 'Sein und Zeit'
+        app.db.session.delete(book)
+        app.db.session.commit()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Test loading records instead of ORM objects."""
+
+from __future__ import absolute_import, unicode_literals
+
+from datetime import date
+
+import pytest
+from flask import current_app as app
+
+from my_library.db.models import Author, Book
+from my_library.db.rows import RowLoader, record_class
+from my_library.resources.books import BooksResource
+from my_library.resources.resource import ModelResource
+
+from tests.client import Client
+from tests.http import Status
+from tests.mixins import AppTest
+from tests.util import count_queries
+
+
+class TestRecords(object):
+
+    def test_record_class(self):
+        """Test that records have the model's attributes and properties."""
+        record = record_class(Book)
+        assert record is record_class(Book)
+        assert {'id', 'title', 'authors'} <= set(record.__slots__)
+        assert record.href is Book.href
+
+    def test_supports(self):
+        assert RowLoader.supports(Book, ('id', 'href', 'authors'))
+        assert not RowLoader.supports(Book, ('eager_options',))
+
+    def test_for_fields(self):
+        loader = RowLoader.for_fields(Book, ('title',), ('id',))
+        assert loader is RowLoader.for_fields(Book, ('title',), ('id',))
+        assert [column.key for column in loader.columns] == ['id', 'title']
+        assert RowLoader.for_fields(Book, ('eager_options',)) is None
+
+
+class TestFastReads(AppTest):
+
+    @pytest.fixture(scope='class', autouse=True)
+    def add_books(self, setup_app):
+        authors = [
+            Author(name='Author {}'.format(i), birth=date(1900 + i, 1, 1))
+            for i in range(4)
+        ]
+        books = [
+            Book(
+                title='Book {}'.format(i),
+                published=None if i % 3 else 1900 + i,
+                authors=[authors[j] for j in range(i % 4)],
+            )
+            for i in range(12)
+        ]
+        app.db.session.add_all(authors + books)
+        app.db.session.commit()
+        book_ids = [book.id for book in books]
+        author_ids = [author.id for author in authors]
+        yield
+        for book in app.db.session.query(Book).filter(Book.id.in_(book_ids)):
+            app.db.session.delete(book)
+        app.db.session.query(Author).filter(
+            Author.id.in_(author_ids)
+        ).delete(synchronize_session=False)
+        app.db.session.commit()
+
+    def get(self, monkeypatch, fast, **args):
+        monkeypatch.setattr(ModelResource, 'fast_reads', fast)
+        app.db.session.expunge_all()
+        with app.test_request_context():
+            path = BooksResource.url_for(**args)
+        resp = Client(app).get(path)
+        assert Status.good(resp)
+        return resp
+
+    @pytest.mark.parametrize('args', (
+        {},
+        {'limit': 5, 'offset': 3},
+        {'limit': 4, 'fields': 'title,authors'},
+        {'limit': 4, 'fields': 'authors'},
+        {'fields': 'href,published'},
+        {'offset': 1000},
+    ))
+    def test_same_representation(self, monkeypatch, args):
+        """Test that records are represented like ORM objects."""
+        orm = self.get(monkeypatch, False, **args)
+        fast = self.get(monkeypatch, True, **args)
+        assert fast.json() == orm.json()
+        assert fast.headers.get('ETag') == orm.headers.get('ETag')
+
+    def test_same_next_page(self, monkeypatch):
+        """Test that keyset pages of records match."""
+        page = self.get(monkeypatch, True, limit=5).json()
+        args = {'limit': 5, 'after': page['next'].split('after=')[1]}
+        orm = self.get(monkeypatch, False, **args)
+        fast = self.get(monkeypatch, True, **args)
+        assert fast.json() == orm.json()
+
+    def test_queries(self, monkeypatch):
+        """Test the page, related rows, and total take one query each."""
+        with count_queries(app.db.engine) as statements:
+            self.get(monkeypatch, True, limit=10)
+        assert len(statements) == 3
+        assert not app.db.session.identity_map
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Test SQLite connection tuning."""
+
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from my_library.app import create_app, get_sqlite_conf
+from my_library.db.models import Book
+from my_library.db.models.base import Base
+from my_library.db.routing import EXTENSION
+from my_library.db.sqlite import sqlite_pragmas
+from my_library.resources.books import BookResource
+
+from tests.client import Client
+from tests.http import Status
+
+
+class TestSQLitePragmas(object):
+
+    def test_default(self):
+        """Test that no pragmas are set by default."""
+        assert sqlite_pragmas(get_sqlite_conf(load=False)) == {}
+
+    def test_profile(self, monkeypatch):
+        """Test that profiles give defaults, which may be overridden."""
+        monkeypatch.setenv('SQLITE_PROFILE', 'throughput')
+        monkeypatch.setenv('SQLITE_CACHE_SIZE', '-2000')
+        pragmas = sqlite_pragmas(get_sqlite_conf())
+        assert pragmas['journal_mode'] == 'WAL'
+        assert pragmas['synchronous'] == 'NORMAL'
+        assert pragmas['cache_size'] == -2000
+        assert list(pragmas)[0] == 'journal_mode'
+
+    def test_unknown_profile(self, monkeypatch):
+        monkeypatch.setenv('SQLITE_PROFILE', 'fastest')
+        with pytest.raises(ValueError):
+            sqlite_pragmas(get_sqlite_conf())
+
+
+class TestSQLiteApp(object):
+
+    @pytest.fixture
+    def app(self, monkeypatch, tmpdir):
+        """Return a function creating an app with a fresh database."""
+        monkeypatch.setenv('DB_HOST', str(tmpdir.join('tuned.sqlite')))
+        monkeypatch.setenv('SQLITE_PROFILE', 'throughput')
+
+        def app(**environ):
+            for name, value in environ.items():
+                monkeypatch.setenv(name, value)
+            app = create_app()
+            with app.app_context():
+                Base.metadata.create_all(app.db.engine)
+            return app
+
+        return app
+
+    def test_pragmas(self, app):
+        """Test that the pragmas are set on new connections."""
+        with app(SQLITE_MMAP_SIZE='4096').app_context() as context:
+            connection = context.app.db.engine.connect()
+            try:
+                assert connection.scalar('PRAGMA journal_mode') == 'wal'
+                assert connection.scalar('PRAGMA synchronous') == 1
+                assert connection.scalar('PRAGMA mmap_size') == 4096
+                assert connection.scalar('PRAGMA busy_timeout') == 5000
+            finally:
+                connection.close()
+
+    def test_read_only(self, app):
+        """Test that resource reads use read-only connections."""
+        app = app(SQLITE_READ_ONLY='yes')
+        with app.app_context():
+            router = app.extensions[EXTENSION]
+            assert router.window == 0
+            book = Book(title='Walden', published=1854)
+            app.db.session.add(book)
+            app.db.session.commit()
+            id = book.id
+            app.db.session.remove()
+
+            with app.test_request_context():
+                path = BookResource.url_for(id=id)
+            resp = Client(app).get(path)
+            assert Status.good(resp)
+            assert resp.json()['title'] == 'Walden'
+
+            bind = router.binds[0]
+            engine = app.db.flask_sqla.get_engine(app, bind=bind)
+            with pytest.raises(OperationalError):
+                engine.execute(Book.__table__.delete())
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Test the timing of requests' statements."""
+
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import re
+
+import pytest
+from flask import current_app as app
+from sqlalchemy.exc import OperationalError
+
+from my_library.db.models import Book
+from my_library.db import timing
+from my_library.db.timing import EXTENSION, STARTS
+from my_library.resources.books import BookResource, BooksResource
+
+from tests.client import Client
+from tests.http import Status
+from tests.mixins import AppTest
+from tests.util import count_queries
+
+
+SERVER_TIMING = re.compile(
+    r'^db;desc="(\d+) queries";dur=([\d.]+), app;dur=([\d.]+)$'
+)
+
+
+class TestQueryTimer(AppTest):
+
+    @pytest.fixture
+    def timer(self, monkeypatch):
+        # Alembic's logging config, applied by the test database's
+        # migrations, disables the loggers existing at the time.
+        monkeypatch.setattr(timing.log, 'disabled', False)
+        timer = app.extensions[EXTENSION]
+        yield timer
+        timer.slow_ms = None
+        timer.server_timing = True
+
+    @pytest.fixture
+    def book(self):
+        book = Book(title='Either/Or', published=1843)
+        app.db.session.add(book)
+        app.db.session.commit()
+        id = book.id
+        app.db.session.expunge_all()
+        yield id
+        app.db.session.query(Book).filter_by(id=id).delete()
+        app.db.session.commit()
+
+    def test_server_timing(self, timer, book):
+        """Test that the request's statements are counted and timed."""
+        with count_queries(app.db.engine) as statements:
+            resp = Client(app).get(BooksResource.path)
+        assert Status.good(resp)
+        match = SERVER_TIMING.match(resp.headers['Server-Timing'])
+        assert match is not None
+        assert int(match.group(1)) == len(statements) > 0
+        assert 0 < float(match.group(2)) <= float(match.group(3))
+
+    def test_counts_reset(self, timer, book):
+        """Test that each request only counts its own statements."""
+        with app.test_request_context():
+            path = BookResource.url_for(id=book)
+        counts = []
+        for _ in range(2):
+            app.db.session.expunge_all()
+            resp = Client(app).get(path)
+            match = SERVER_TIMING.match(resp.headers['Server-Timing'])
+            counts.append(int(match.group(1)))
+        assert counts[0] == counts[1] > 0
+
+    def test_disabled(self, timer):
+        timer.server_timing = False
+        resp = Client(app).get(BooksResource.path)
+        assert 'Server-Timing' not in resp.headers
+
+    def test_slow_query_log(self, timer, book, caplog):
+        """Test that slow statements are logged with their endpoint."""
+        with app.test_request_context():
+            path = BookResource.url_for(id=book)
+        timer.slow_ms = 0
+        with caplog.at_level(logging.WARNING, logger='my_library.db.timing'):
+            Client(app).get(path)
+        messages = [record.getMessage() for record in caplog.records]
+        assert messages
+        assert all('endpoint book)' in message for message in messages)
+        assert any('({},)'.format(book) in message for message in messages)
+
+    def test_fast_queries_not_logged(self, timer, book, caplog):
+        timer.slow_ms = 60000
+        with caplog.at_level(logging.WARNING, logger='my_library.db.timing'):
+            Client(app).get(BooksResource.path)
+        assert not caplog.records
+
+    def test_failed_statement(self, timer):
+        """Test that statements which raise leave no start behind."""
+        with app.db.engine.connect() as connection:
+            with pytest.raises(OperationalError):
+                connection.execute('SELECT * FROM no_such_table')
+            assert not connection.info.get(STARTS)
+            assert connection.execute('SELECT 1').scalar() == 1
+            assert not connection.info.get(STARTS)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Test author resources."""
+
+from __future__ import absolute_import, unicode_literals
+
+import json
+from datetime import date
+
+import pytest
+from flask import current_app as app
+
+from my_library.db.models import Author, Book
+from my_library.resources.authors import AuthorsResource
+
+from tests.client import Client
+from tests.http import Status
+from tests.mixins import AppTest
+
+
+class TestAuthors(AppTest):
+
+    book = Book(title='Fear and Trembling', published=1843)
+
+    @pytest.fixture(scope='class', autouse=True)
+    def add_book(self, setup_app):
+        app.db.session.add(self.book)
+        app.db.session.commit()
+        yield
+        app.db.session.delete(self.book)
+        app.db.session.commit()
+
+    def test_post_authors(self):
+        """Test creating authors in bulk."""
+        resp = Client(app).post(AuthorsResource.path, data=json.dumps({
+            'items': [
+                {
+                    'id': 1000,
+                    'name': 'Søren Kierkegaard',
+                    'birth': '1813-05-05',
+                    'books': [self.book.id],
+                },
+                {'name': 'Nobody', 'birth': 'yesterday'},
+            ],
+        }))
+        assert Status.good(resp)
+        resp = resp.json()
+        assert resp['items'][0] == {'status': 'created', 'id': 1000}
+        assert 'birth' in resp['items'][1]['errors']
+        app.db.session.expire_all()
+        author = app.db.session.query(Author).get(1000)
+        try:
+            assert author.birth == date(1813, 5, 5)
+            assert self.book.authors == [author]
+        finally:
+            app.db.session.delete(author)
+            app.db.session.commit()
@@ -3,17 +3,23 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import gzip
+import json
+from collections import OrderedDict
 from datetime import date
 
 import pytest
 from flask import current_app as app
 
+from my_library.db.bulk import BulkUpsert
 from my_library.db.models import Author, Book
 from my_library.resources.books import BookResource, BooksResource
+from my_library.spec.request import encode_cursor
 
 from tests.client import Client
 from tests.http import Status
 from tests.mixins import AppTest
+from tests.util import count_queries
 
 
 class TestBooks(AppTest):
@@ -71,6 +77,447 @@ class TestBooks(AppTest):
         for book in self.books:
             res = results_by_id[book.id]
             for attr in ('id', 'title', 'published'):
-                assert getattr(book, attr) == getattr(res, attr)
-            assert len(res['authors']) == len(book['authors'])
-            assert res['authors'][0].id == book.authors[0].id
+                assert getattr(book, attr) == res[attr]
+            assert len(res['authors']) == len(book.authors)
+            assert res['authors'][0]['id'] == book.authors[0].id
+
+    def test_get_books_next_pages(self):
+        """Test following keyset ``next`` links through all books."""
+        client = Client(app)
+        url = '{}?limit=1'.format(BooksResource.path)
+        seen = []
+        while url is not None:
+            resp = client.get(url)
+            assert Status.good(resp)
+            resp = resp.json()
+            assert resp['total'] == len(self.books)
+            seen.extend(i['id'] for i in resp['items'])
+            url = resp['next']
+        assert seen == sorted(book.id for book in self.books)
+
+    def test_get_books_after_and_offset(self):
+        """Test that the two pagination styles are mutually exclusive."""
+        first = Client(app).get(
+            '{}?limit=1'.format(BooksResource.path)
+        ).json()
+        resp = Client(app).get('{}&offset=1'.format(first['next']))
+        assert Status.code(resp) == 400
+
+    def test_get_books_bad_cursor(self):
+        """Test that malformed cursors are rejected."""
+        resp = Client(app).get(
+            '{}?after=not-a-cursor'.format(BooksResource.path)
+        )
+        assert Status.code(resp) == 400
+
+    @pytest.mark.parametrize('values', (
+        [None],
+        [{'a': 1}],
+        ['abc'],
+        [1.5],
+        [True],
+        [2 ** 70],
+        [1, 2],
+    ))
+    def test_get_books_bad_cursor_values(self, values):
+        """Test that cursors with values of the wrong types are rejected."""
+        resp = Client(app).get(
+            '{}?after={}'.format(BooksResource.path, encode_cursor(values))
+        )
+        assert Status.code(resp) == 400
+        assert 'after' in resp.json()['message']
+
+    @pytest.mark.parametrize('total, expected_types', (
+        ('exact', ('exact',)),
+        ('cached', ('exact', 'cached')),
+        ('estimated', ('exact', 'estimated')),
+    ))
+    def test_get_books_total_strategies(self, total, expected_types):
+        """Test requesting each kind of collection total."""
+        resp = Client(app).get(
+            '{}?total={}'.format(BooksResource.path, total)
+        )
+        assert Status.good(resp)
+        resp = resp.json()
+        assert resp['total_type'] in expected_types
+        assert resp['total'] == len(self.books)
+
+    def test_get_books_total_estimated_from_stats(self):
+        """Test that table statistics are used for estimates."""
+        app.db.session.execute('ANALYZE')
+        resp = Client(app).get(
+            '{}?total=estimated'.format(BooksResource.path)
+        ).json()
+        assert resp['total_type'] == 'estimated'
+        assert resp['total'] == len(self.books)
+
+    def test_get_books_total_cached(self):
+        """Test that a second cached count is served from the cache."""
+        url = '{}?total=cached'.format(BooksResource.path)
+        Client(app).get(url)
+        resp = Client(app).get(url).json()
+        assert resp['total_type'] == 'cached'
+        assert resp['total'] == len(self.books)
+
+    def test_get_books_total_omitted(self):
+        """Test that the total may be omitted."""
+        resp = Client(app).get(
+            '{}?total=false'.format(BooksResource.path)
+        ).json()
+        assert resp['total_type'] == 'none'
+        assert resp['total'] is None
+        assert resp['count'] == len(self.books)
+
+    def test_get_books_total_unknown(self):
+        """Test that unknown count strategies are rejected."""
+        resp = Client(app).get(
+            '{}?total=bogus'.format(BooksResource.path)
+        )
+        assert Status.code(resp) == 400
+
+    def test_get_books_query_count(self):
+        """Test that related authors don't cost a query per book."""
+        counts = []
+        for limit in (1, len(self.books)):
+            app.db.session.expire_all()
+            with count_queries(app.db.engine) as statements:
+                resp = Client(app).get(
+                    '{}?limit={}'.format(BooksResource.path, limit)
+                )
+            assert Status.good(resp)
+            assert resp.json()['count'] == limit
+            counts.append(len(statements))
+        # count, page, authors
+        assert counts == [3, 3]
+
+    @pytest.mark.parametrize('path_for', (
+        lambda book: BookResource.url_for(id=book.id),
+        lambda book: BooksResource.path,
+    ))
+    def test_get_not_modified(self, path_for):
+        """Test conditional GETs using ETags."""
+        client = Client(app)
+        with app.test_request_context():
+            path = path_for(self.books[0])
+        resp = client.get(path)
+        assert Status.good(resp)
+        etag = resp.headers['ETag']
+
+        resp = client.get(path, headers={'If-None-Match': etag})
+        assert Status.code(resp) == 304
+        assert resp.headers['ETag'] == etag
+        assert not resp.data
+
+    @pytest.mark.parametrize('path_for', (
+        lambda book: BookResource.url_for(id=book.id),
+        lambda book: BooksResource.path,
+    ))
+    @pytest.mark.parametrize('model, attr', (
+        (lambda test: test.books[0], 'title'),
+        (lambda test: test.authors[0], 'name'),
+    ))
+    def test_get_modified(self, path_for, model, attr):
+        """Test that changes to books or their authors change ETags."""
+        client = Client(app)
+        with app.test_request_context():
+            path = path_for(self.books[0])
+        etag = client.get(path).headers['ETag']
+
+        obj = model(self)
+        original = getattr(obj, attr)
+        setattr(obj, attr, 'Changed')
+        app.db.session.commit()
+        try:
+            resp = client.get(path, headers={'If-None-Match': etag})
+            assert Status.code(resp) == 200
+            assert resp.headers['ETag'] != etag
+        finally:
+            setattr(obj, attr, original)
+            app.db.session.commit()
+
+    def test_created_not_after_updated(self):
+        """Test that new objects' collections don't touch them early."""
+        book = self.books[1]
+        assert book.created <= book.updated
+        updated = book.updated
+        book.authors.append(self.authors[0])
+        app.db.session.commit()
+        try:
+            assert book.updated > updated
+        finally:
+            book.authors.remove(self.authors[0])
+            app.db.session.commit()
+
+    def test_get_not_modified_skips_loading(self):
+        """Test that a 304 doesn't load the page or its authors."""
+        client = Client(app)
+        etag = client.get(BooksResource.path).headers['ETag']
+        with count_queries(app.db.engine) as statements:
+            resp = client.get(
+                BooksResource.path, headers={'If-None-Match': etag}
+            )
+        assert Status.code(resp) == 304
+        for statement in statements:
+            assert 'authors.name' not in statement
+            assert not ('books.title' in statement and 'LIMIT' in statement)
+
+    @pytest.mark.parametrize('query', ('', '&limit=1', '&after={after}'))
+    def test_get_books_streamed(self, query):
+        """Test that streamed collections match buffered ones, compactly."""
+        client = Client(app)
+        url = '{}?total=exact{}'.format(
+            BooksResource.path,
+            query.format(after=encode_cursor([self.books[0].id])),
+        )
+        buffered = client.get(url + '&stream=false')
+        streamed = client.get(url + '&stream=true')
+        assert Status.good(streamed)
+        assert streamed.is_streamed
+        assert 'ETag' not in streamed.headers
+        for resp in (streamed, buffered):
+            data = json.loads(
+                resp.data.decode('utf-8'), object_pairs_hook=OrderedDict
+            )
+            assert resp.data.decode('utf-8') == json.dumps(
+                data, ensure_ascii=False, separators=(',', ':')
+            ) + '\n'
+        streamed, buffered = streamed.json(), buffered.json()
+        if buffered['next'] is not None:
+            buffered['next'] = buffered['next'].replace(
+                'stream=false', 'stream=true'
+            )
+        assert streamed == buffered
+
+    @pytest.mark.parametrize('path_for', (
+        lambda book: BookResource.url_for(id=book.id),
+        lambda book: BooksResource.path,
+    ))
+    def test_get_fields(self, path_for):
+        """Test that only requested fields are dumped and selected."""
+        client = Client(app)
+        book = Book(title='Sparse', published=2000, authors=self.authors)
+        app.db.session.add(book)
+        app.db.session.commit()
+        book_id = book.id
+        app.db.session.expunge(book)
+        with app.test_request_context():
+            path = '{}?fields=id,title&total=false'.format(path_for(book))
+        try:
+            with count_queries(app.db.engine) as statements:
+                resp = client.get(path)
+            assert Status.good(resp)
+            resp = resp.json()
+            for item in resp.get('items', [resp]):
+                assert set(item) == {'id', 'title'}
+            for statement in statements:
+                assert 'authors' not in statement
+                assert 'books.published' not in statement
+
+            etag = client.get(path).headers['ETag']
+            resp = client.get(path, headers={'If-None-Match': etag})
+            assert Status.code(resp) == 304
+        finally:
+            app.db.session.delete(app.db.session.query(Book).get(book_id))
+            app.db.session.commit()
+
+    def test_get_fields_unknown(self):
+        """Test that unknown fields are rejected."""
+        resp = Client(app).get(
+            '{}?fields=id,bogus'.format(BooksResource.path)
+        )
+        assert Status.code(resp) == 400
+
+    def test_get_books_by_ids(self):
+        """Test fetching a batch of books by id."""
+        ids = [book.id for book in reversed(self.books)]
+        missing = max(ids) + 1000
+        query = ','.join(str(i) for i in [ids[0], missing] + ids)
+        app.db.session.expire_all()
+        with count_queries(app.db.engine) as statements:
+            resp = Client(app).get(
+                '{}?ids={}'.format(BooksResource.path, query)
+            )
+        assert Status.good(resp)
+        resp = resp.json()
+        assert [item['id'] for item in resp['items']] == ids
+        assert resp['missing'] == [missing]
+        assert resp['total'] == len(ids)
+        assert resp['total_type'] == 'exact'
+        assert resp['next'] is None
+        assert not any('count(' in s.lower() for s in statements)
+
+    def test_get_books_by_ids_chunked(self, monkeypatch):
+        """Test that large batches are fetched in chunks."""
+        monkeypatch.setattr(BooksResource, 'batch_chunk_size', 1)
+        ids = [book.id for book in self.books]
+        app.db.session.expire_all()
+        with count_queries(app.db.engine) as statements:
+            resp = Client(app).get('{}?ids={}'.format(
+                BooksResource.path, ','.join(str(i) for i in ids)
+            ))
+        assert Status.good(resp)
+        assert [item['id'] for item in resp.json()['items']] == ids
+        assert len([
+            s for s in statements if s.startswith('SELECT books.id')
+        ]) == len(ids)
+
+    @pytest.mark.parametrize('query', (
+        'ids=1,foo',
+        'ids=1&offset=1',
+        'ids=1&after={}'.format(encode_cursor([1])),
+    ))
+    def test_get_books_by_ids_bad(self, query):
+        """Test that bad batch requests are rejected."""
+        resp = Client(app).get('{}?{}'.format(BooksResource.path, query))
+        assert Status.code(resp) == 400
+
+    def test_get_books_by_ids_too_many(self, monkeypatch):
+        """Test that the number of requested ids is limited."""
+        monkeypatch.setattr(BooksResource, 'batch_limit', 1)
+        resp = Client(app).get('{}?ids=1,2'.format(BooksResource.path))
+        assert Status.code(resp) == 400
+
+    def test_post_books(self):
+        """Test creating and updating books in bulk."""
+        client = Client(app)
+        author, other = (author.id for author in self.authors)
+        existing = self.books[0]
+        created_at = existing.created
+        items = [
+            {'title': 'Being and Nothingness', 'authors': [author]},
+            {'title': 'Either/Or', 'published': 1843, 'authors': [
+                {'id': other, 'name': 'ignored'}
+            ]},
+            {'title': None},
+            {'id': existing.id, 'title': 'Nausea', 'authors': [other]},
+            {'authors': [author + other + 1000]},
+            'bogus',
+            {'id': existing.id, 'title': 'Duplicate'},
+        ]
+        with count_queries(app.db.engine) as statements:
+            resp = client.post(
+                BooksResource.path, data=json.dumps({'items': items})
+            )
+        assert Status.good(resp)
+        resp = resp.json()
+        assert (resp['created'], resp['updated'], resp['invalid']) == (
+            2, 1, 4
+        )
+        statuses = [item['status'] for item in resp['items']]
+        assert statuses == [
+            'created', 'created', 'invalid', 'updated', 'invalid',
+            'invalid', 'invalid',
+        ]
+        assert 'title' in resp['items'][2]['errors']
+        assert 'authors' in resp['items'][4]['errors']
+        assert '_schema' in resp['items'][5]['errors']
+        assert 'id' in resp['items'][6]['errors']
+        assert len(statements) < len(items) * 2
+
+        created = [item['id'] for item in resp['items'][:2]]
+        app.db.session.expire_all()
+        try:
+            books = app.db.session.query(Book).filter(Book.id.in_(created))
+            titles = {
+                book.title: [each.id for each in book.authors]
+                for book in books
+            }
+            assert titles == {
+                'Being and Nothingness': [author],
+                'Either/Or': [other],
+            }
+            assert existing.title == 'Nausea'
+            assert existing.created == created_at
+            assert [each.id for each in existing.authors] == [other]
+        finally:
+            for book in app.db.session.query(Book).filter(
+                Book.id.in_(created)
+            ):
+                app.db.session.delete(book)
+            existing.title = 'La Nauseée'
+            existing.authors = [self.authors[0]]
+            app.db.session.commit()
+
+    def test_post_books_out_of_range(self):
+        """Test that integers out of their columns' range are invalid."""
+        big = 10 ** 20
+        resp = Client(app).post(BooksResource.path, data=json.dumps({
+            'items': [
+                {'title': 'Too late', 'published': big},
+                {'id': big, 'title': 'Too far'},
+                {'title': 'Too many', 'authors': [self.authors[0].id, big]},
+            ],
+        }))
+        assert Status.good(resp)
+        resp = resp.json()
+        assert resp['invalid'] == 3
+        errors = [item['errors'] for item in resp['items']]
+        assert errors == [
+            {'published': ['Number out of range.']},
+            {'id': ['Number out of range.']},
+            {'authors': ['Number out of range.']},
+        ]
+
+    def test_post_books_changes_etags(self):
+        """Test that bulk updates change the related rows' ETags."""
+        client = Client(app)
+        book = self.books[1]
+        path = '{}?ids={}'.format(BooksResource.path, book.id)
+        etag = client.get(path).headers['ETag']
+        resp = client.post(BooksResource.path, data=json.dumps({
+            'items': [{'id': book.id, 'authors': [self.authors[0].id]}],
+        }))
+        assert Status.good(resp)
+        try:
+            assert client.get(path).headers['ETag'] != etag
+        finally:
+            app.db.session.expire_all()
+            book.authors = [self.authors[1]]
+            app.db.session.commit()
+
+    def test_post_books_conflict(self, monkeypatch):
+        """Test that constraint violations are reported, writing nothing."""
+        book = self.books[1]
+        existing = BulkUpsert.existing
+
+        def created_meanwhile(upsert, table, ids):
+            """Miss the book, as if it were created after the check."""
+            return existing(upsert, table, ids) - {book.id}
+
+        monkeypatch.setattr(BulkUpsert, 'existing', created_meanwhile)
+        count = app.db.session.query(Book).count()
+        resp = Client(app).post(BooksResource.path, data=json.dumps({
+            'items': [
+                {'title': 'Written, then rolled back'},
+                {'id': book.id, 'title': 'Conflicting'},
+            ],
+        }))
+        assert Status.code(resp) == 409
+        errors = resp.json()['message']['items']
+        assert list(errors) == ['1']
+        assert '_schema' in errors['1']
+        app.db.session.expire_all()
+        assert app.db.session.query(Book).count() == count
+        assert book.title != 'Conflicting'
+
+    @pytest.mark.parametrize('data', ('[]', '{}', '{"items": 5}', 'bogus'))
+    def test_post_books_bad_envelope(self, data):
+        """Test that bodies without a collection envelope are rejected."""
+        resp = Client(app).post(BooksResource.path, data=data)
+        assert Status.code(resp) == 400
+
+    def test_get_books_compressed(self):
+        """Test that compressed collections support conditional GETs."""
+        client = Client(app)
+        headers = {'Accept-Encoding': 'gzip'}
+        path = '{}?total=exact'.format(BooksResource.path)
+        plain = client.get(path)
+        resp = client.get(path, headers=headers)
+        assert resp.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(resp.data) == plain.data
+        assert resp.headers['ETag'] == 'W/' + plain.headers['ETag']
+
+        headers['If-None-Match'] = resp.headers['ETag']
+        assert Status.code(client.get(path, headers=headers)) == 304
+        fields = client.get(path + '&fields=id', headers=headers)
+        assert Status.code(fields) == 200
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Test the response cache."""
+
+from __future__ import absolute_import, unicode_literals
+
+import json
+from datetime import date
+
+import pytest
+from flask import current_app as app
+
+from my_library.db.models import Author, Book
+from my_library.resources import cache as cache_module
+from my_library.resources.books import BookResource, BooksResource
+from my_library.resources.cache import EXTENSION, ResponseCache
+
+from tests.client import Client
+from tests.http import Status
+from tests.mixins import AppTest
+from tests.util import count_queries
+
+
+class TestResponseCache(AppTest):
+
+    author = Author(name='Simone de Beauvoir', birth=date(1908, 1, 9))
+    book = Book(title='The Second Sex', published=1949, authors=[author])
+
+    @pytest.fixture(scope='class', autouse=True)
+    def add_book(self, setup_app):
+        app.db.session.add(self.book)
+        app.db.session.commit()
+        ResponseCache(size=3, ttl=60).init_app(app)
+        yield
+        del app.extensions[EXTENSION]
+        app.db.session.delete(self.book)
+        app.db.session.delete(self.author)
+        app.db.session.commit()
+
+    @pytest.fixture(autouse=True)
+    def cache(self):
+        cache = app.extensions[EXTENSION]
+        cache.clear()
+        return cache
+
+    def get(self, path, **kwargs):
+        with count_queries(app.db.engine) as statements:
+            resp = Client(app).get(path, **kwargs)
+        return resp, statements
+
+    def test_cached(self):
+        """Test that repeated requests are served from the cache."""
+        first, statements = self.get(BooksResource.path + '?limit=5')
+        assert statements
+        second, statements = self.get(BooksResource.path + '?limit=05')
+        assert not statements
+        assert second.data == first.data
+        assert second.headers['ETag'] == first.headers['ETag']
+
+        resp, _ = self.get(
+            BooksResource.path + '?limit=5',
+            headers={'If-None-Match': first.headers['ETag']},
+        )
+        assert Status.code(resp) == 304
+
+    @pytest.mark.parametrize('query', (
+        '?limit=5&foo=bar', '?limit=5&fields=id', '?limit=4',
+    ))
+    def test_keys(self, query):
+        """Test that different arguments are cached separately."""
+        self.get(BooksResource.path + '?limit=5')
+        resp, statements = self.get(BooksResource.path + query)
+        assert Status.good(resp)
+        assert statements
+
+    def test_invalid_args_not_cached(self, cache):
+        """Test that requests with invalid arguments are not cached."""
+        resp, _ = self.get(BooksResource.path + '?limit=foo')
+        assert Status.code(resp) == 400
+        assert len(cache) == 0
+
+    def test_invalidated_by_commit(self, cache):
+        """Test that commits touching dependent tables invalidate."""
+        with app.test_request_context():
+            path = BookResource.url_for(id=self.book.id)
+        self.get(path)
+        self.author.name = 'Simone Lucie Ernestine Marie Bertrand'
+        app.db.session.flush()
+        assert len(cache) == 1
+        app.db.session.commit()
+        assert len(cache) == 0
+        resp, statements = self.get(path)
+        assert statements
+        author = resp.json()['authors'][0]['name']
+        assert author == self.author.name
+        self.author.name = 'Simone de Beauvoir'
+        app.db.session.commit()
+
+    def test_invalidated_by_links(self, cache):
+        """Test that changes to association rows invalidate."""
+        other = Book(title='The Ethics of Ambiguity', published=1947)
+        app.db.session.add(other)
+        app.db.session.commit()
+        self.get(BooksResource.path)
+        other.authors.append(self.author)
+        app.db.session.commit()
+        assert len(cache) == 0
+        app.db.session.delete(other)
+        app.db.session.commit()
+
+    def test_not_invalidated_by_rollback(self, cache):
+        """Test that rolled back changes do not invalidate."""
+        self.get(BooksResource.path)
+        self.author.name = 'Nobody'
+        app.db.session.flush()
+        app.db.session.rollback()
+        app.db.session.commit()
+        assert len(cache) == 1
+
+    def test_invalidated_by_bulk_writes(self, cache):
+        """Test that Core writes of the bulk endpoint invalidate."""
+        with app.test_request_context():
+            path = BookResource.url_for(id=self.book.id)
+        self.get(path)
+        resp = Client(app).post(BooksResource.path, data=json.dumps({
+            'items': [{'id': self.book.id, 'published': 1950}],
+        }))
+        assert Status.good(resp)
+        assert len(cache) == 0
+        resp, _ = self.get(path)
+        assert resp.json()['published'] == 1950
+        app.db.session.expire_all()
+        self.book.published = 1949
+        app.db.session.commit()
+
+    def test_lru(self, cache):
+        """Test that the least recently used responses are evicted."""
+        for limit in (1, 2, 3):
+            self.get('{}?limit={}'.format(BooksResource.path, limit))
+        self.get(BooksResource.path + '?limit=1')
+        self.get(BooksResource.path + '?limit=4')
+        assert len(cache) == 3
+        _, statements = self.get(BooksResource.path + '?limit=1')
+        assert not statements
+        _, statements = self.get(BooksResource.path + '?limit=2')
+        assert statements
+
+    def test_ttl(self, monkeypatch):
+        """Test that responses expire."""
+        self.get(BooksResource.path)
+        now = cache_module.time()
+        monkeypatch.setattr(cache_module, 'time', lambda: now + 61)
+        _, statements = self.get(BooksResource.path)
+        assert statements
+
+    def test_stale_responses_not_stored(self, cache):
+        """Test that responses rendered before an invalidation are dropped."""
+        generation = cache.generation
+        cache.invalidate([Book.__table__])
+        with app.test_request_context(BooksResource.path):
+            response = app.response_class('{}', mimetype='application/json')
+            cache.store(cache.key(), [Book.__table__], generation, response)
+        assert len(cache) == 0
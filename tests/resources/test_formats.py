@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""Test MessagePack, NDJSON and CSV representations."""
+
+from __future__ import absolute_import, unicode_literals
+
+import csv
+import io
+import json
+from datetime import date
+
+import msgpack
+import pytest
+from flask import current_app as app
+
+from my_library.db.models import Author, Book
+from my_library.resources.books import BooksResource
+from my_library.resources.formats import (
+    CSV,
+    MSGPACK,
+    NDJSON,
+    X_MSGPACK,
+    csv_row,
+    csv_lines,
+)
+
+from tests.client import Client
+from tests.http import Status
+from tests.mixins import AppTest
+
+
+def get(url, mediatype, **headers):
+    """Get the URL, accepting the media type."""
+    headers['Accept'] = mediatype
+    return Client(app).get(url, headers=headers)
+
+
+def read_csv(response):
+    """Return the rows of a CSV response, as dicts."""
+    return list(csv.DictReader(io.StringIO(response.data.decode('utf-8'))))
+
+
+def read_ndjson(response):
+    """Return the items of an NDJSON response."""
+    return [json.loads(line) for line in response.data.decode().splitlines()]
+
+
+def as_csv(item):
+    """Return the CSV cells of a JSON item, as read."""
+    row = csv_row(list(item.values()))
+    return dict(zip(item, next(csv.reader(io.StringIO(row)))))
+
+
+class TestFormats(AppTest):
+
+    books = [
+        Book(
+            title='Either/Or, "A Fragment of Life"',
+            published=1843,
+            authors=[Author(name='Søren Kierkegaard', birth=date(1813, 5, 5))],
+        ),
+        Book(title='Untitled'),
+    ]
+
+    @pytest.fixture(scope='class', autouse=True)
+    def add_books(self, setup_app):
+        for book in self.books:
+            app.db.session.add(book)
+        app.db.session.commit()
+        ids = [book.id for book in self.books]
+        app.db.session.expunge_all()
+        yield
+        session = app.db.session
+        for book in session.query(Book).filter(Book.id.in_(ids)):
+            for author in book.authors:
+                session.delete(author)
+            session.delete(book)
+        session.commit()
+
+    @property
+    def url(self):
+        return BooksResource.path + '?limit=1'
+
+    def json(self, url=None):
+        return Client(app).get(url or self.url).json()
+
+    @pytest.mark.parametrize('mediatype', (MSGPACK, X_MSGPACK))
+    def test_msgpack(self, mediatype):
+        """Test that MessagePack packs the JSON representation."""
+        resp = get(self.url, mediatype)
+        assert Status.good(resp)
+        assert resp.headers['Content-Type'] == mediatype
+        assert msgpack.unpackb(resp.data, raw=False) == self.json()
+
+    def test_ndjson(self):
+        """Test that NDJSON has a line per item, and headers for the rest."""
+        resp = get(self.url, NDJSON)
+        assert Status.good(resp)
+        assert resp.headers['Content-Type'] == NDJSON
+        envelope = self.json()
+        assert read_ndjson(resp) == envelope['items']
+        assert resp.headers['X-Collection-Total'] == str(envelope['total'])
+        assert resp.headers['X-Collection-Total-Type'] == 'exact'
+        assert resp.headers['X-Collection-Count'] == '1'
+        assert resp.headers['X-Collection-Next'] == envelope['next']
+        assert resp.headers['Link'] == '<{}>; rel="next"'.format(
+            envelope['next']
+        )
+
+    def test_csv(self):
+        """Test that CSV has a header row, and a row per item."""
+        url = BooksResource.path
+        resp = get(url, CSV)
+        assert Status.good(resp)
+        assert resp.headers['Content-Type'] == CSV
+        items = self.json(url)['items']
+        header = resp.data.decode('utf-8').splitlines()[0]
+        assert header.split(',') == list(items[0])
+        assert read_csv(resp) == [as_csv(item) for item in items]
+
+    def test_csv_header(self):
+        """Test that columns are in a fixed order, whatever the process."""
+        resp = get(BooksResource.path, CSV)
+        header = resp.data.decode('utf-8').splitlines()[0]
+        assert header == 'id,created,updated,title,published,authors,href'
+        resp = get(BooksResource.path + '?fields=title,href,id', CSV)
+        assert resp.data.decode('utf-8').splitlines()[0] == 'id,title,href'
+
+    def test_csv_cells(self):
+        """Test that nested, null and quoted values are encoded."""
+        resp = get(BooksResource.path, CSV)
+        first, second = read_csv(resp)[-2:]
+        assert first['title'] == 'Either/Or, "A Fragment of Life"'
+        authors = json.loads(first['authors'])
+        assert authors[0]['name'] == 'Søren Kierkegaard'
+        assert second['published'] == ''
+        assert second['authors'] == '[]'
+
+    def test_item(self):
+        """Test that single items are represented as one line or row."""
+        url = self.json()['items'][0]['href']
+        item = self.json(url)
+        assert read_ndjson(get(url, NDJSON)) == [item]
+        assert read_csv(get(url, CSV)) == [as_csv(item)]
+
+    def test_errors(self):
+        """Test that errors are represented in the requested format."""
+        resp = get(BooksResource.path + '/0', CSV)
+        assert resp.status_code == 404
+        assert resp.headers['Content-Type'] == CSV
+        assert list(read_csv(resp)[0]) == ['message']
+
+    def test_default(self):
+        """Test that JSON is the default, and other formats are negotiated."""
+        resp = get(self.url, '*/*')
+        assert resp.headers['Content-Type'] == 'application/json'
+        assert 'Accept' in resp.vary
+        resp = get(self.url, 'application/json;q=0.5, text/csv')
+        assert resp.headers['Content-Type'] == CSV
+        assert 'Accept' in resp.vary
+        resp = get(self.url, 'image/png')
+        assert resp.headers['Content-Type'] == 'application/json'
+
+    def test_etags(self):
+        """Test that each format has its own ETag."""
+        url = BooksResource.path
+        etags = {
+            mediatype: get(url, mediatype).headers['ETag']
+            for mediatype in ('application/json', MSGPACK, NDJSON, CSV)
+        }
+        assert len(set(etags.values())) == len(etags)
+        resp = get(url, CSV, **{'If-None-Match': etags['application/json']})
+        assert resp.status_code == 200
+        resp = get(url, CSV, **{'If-None-Match': etags[CSV]})
+        assert resp.status_code == 304
+
+    @pytest.mark.parametrize('mediatype', (NDJSON, CSV))
+    def test_streamed(self, mediatype):
+        """Test that streamed NDJSON and CSV match buffered ones."""
+        buffered = get(self.url + '&stream=false', mediatype)
+        streamed = get(self.url + '&stream=true', mediatype)
+        assert Status.good(streamed)
+        assert streamed.is_streamed
+        assert streamed.headers['Content-Type'].startswith(mediatype)
+        assert streamed.data == buffered.data
+        for header in ('Limit', 'Offset', 'Total', 'Total-Type'):
+            header = 'X-Collection-{}'.format(header)
+            assert streamed.headers[header] == buffered.headers[header]
+
+    def test_msgpack_not_streamed(self):
+        """Test that MessagePack collections are never streamed."""
+        resp = get(self.url + '&stream=true', MSGPACK)
+        assert Status.good(resp)
+        assert 'ETag' in resp.headers
+        assert msgpack.unpackb(resp.data, raw=False) == self.json(
+            self.url + '&stream=true'
+        )
+
+
+class TestCSVLines(object):
+
+    def test_columns(self):
+        """Test that the first item's keys are the default columns."""
+        lines = csv_lines([{'a': 1, 'b': None}, {'a': True, 'c': 'x'}])
+        assert list(lines) == ['a,b\r\n', '1,\r\n', 'true,\r\n']
+
+    def test_quoting(self):
+        """Test that cells with separators or quotes are quoted."""
+        lines = csv_lines([{'a': 'x,y', 'b': 'say "hi"', 'c': 'a\nb'}])
+        assert list(lines)[1] == '"x,y","say ""hi""","a\nb"\r\n'
+
+    def test_values(self):
+        """Test that non-dict items have a single column."""
+        assert list(csv_lines([1, 2])) == ['value\r\n', '1\r\n', '2\r\n']
+
+    def test_no_items(self):
+        """Test that no lines are written for no items, unless columns."""
+        assert list(csv_lines([])) == []
+        assert list(csv_lines([], ['a', 'b'])) == ['a,b\r\n']
@@ -0,0 +1,97 @@
+"""Test base resource functionality."""
+
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+from flask import Blueprint, Flask, url_for
+from flask_restplus import Api
+
+from my_library.resources.authors import AuthorResource
+from my_library.resources.books import BookResource, BooksResource
+from my_library.resources.urls import EXTENSION, URLTemplate, build_url
+
+
+def blueprint_app():
+    """Return an app serving the resources from a prefixed blueprint."""
+    app = Flask(__name__)
+    blueprint = Blueprint('v1', __name__, url_prefix='/v1')
+    api = Api(blueprint, prefix='/api')
+    for resource in (AuthorResource, BookResource, BooksResource):
+        resource.add_to_api(api)
+    app.register_blueprint(blueprint)
+    return app
+
+
+def direct_app():
+    """Return an app serving the resources from an Api bound to it."""
+    app = Flask(__name__)
+    api = Api(app)
+    for resource in (AuthorResource, BookResource, BooksResource):
+        resource.add_to_api(api)
+    return app
+
+
+class TestURLFor(object):
+
+    @pytest.mark.parametrize('make_app, path', (
+        (direct_app, '/books'),
+        (blueprint_app, '/v1/api/books'),
+    ))
+    @pytest.mark.parametrize('script_root', ('', '/root', '/nested/root/'))
+    @pytest.mark.parametrize('resource, kwargs', (
+        (BookResource, {'id': 7}),
+        (BookResource, {'id': '12'}),
+        (AuthorResource, {'id': 3}),
+        (BooksResource, {}),
+        (BooksResource, {'limit': 5}),
+        (BookResource, {'id': 7, 'fields': 'title'}),
+    ))
+    def test_matches_flask(self, make_app, path, script_root, resource,
+                           kwargs):
+        """Test that templated URLs match those built by flask."""
+        app = make_app()
+        with app.test_request_context(
+                path, base_url='http://localhost{}'.format(script_root)):
+            expected = url_for('.{}'.format(resource.endpoint_name), **kwargs)
+            assert resource.url_for(**kwargs) == expected
+
+    def test_precompiled(self):
+        """Test that templates are compiled when added to a bound Api."""
+        app = direct_app()
+        assert BookResource.endpoint_name in app.extensions[EXTENSION]
+
+    @pytest.mark.parametrize('make_app, path', (
+        (direct_app, '/books'),
+        (blueprint_app, '/v1/api/books'),
+    ))
+    def test_uses_template(self, make_app, path):
+        """Test that URLs with only path arguments use templates."""
+        app = make_app()
+        with app.test_request_context(path):
+            assert build_url(BookResource.endpoint_name, {'id': 1})
+            assert build_url(
+                BooksResource.endpoint_name, {'limit': 1}
+            ) is None
+
+    def test_private_attributes_missing(self, monkeypatch):
+        """Test that rules unlike werkzeug's of today use url_for."""
+        def missing(template, rule):
+            raise AttributeError("'Rule' object has no attribute '_trace'")
+
+        monkeypatch.setattr(URLTemplate, '__init__', missing)
+        app = direct_app()
+        with app.test_request_context('/books'):
+            assert build_url(BookResource.endpoint_name, {'id': 1}) is None
+            assert BookResource.url_for(id=1) == url_for(
+                '.{}'.format(BookResource.endpoint_name), id=1
+            )
+
+    def test_server_name(self):
+        """Test that apps with a server name, and subdomains, use url_for."""
+        app = direct_app()
+        app.config['SERVER_NAME'] = 'example.com'
+        with app.test_request_context('/books', subdomain='api'):
+            assert build_url(BookResource.endpoint_name, {'id': 1}) is None
+            assert BookResource.url_for(id=1) == url_for(
+                '.{}'.format(BookResource.endpoint_name), id=1
+            )
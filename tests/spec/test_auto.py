@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Test automatic schema generation."""
+
+from __future__ import absolute_import, unicode_literals
+
+import json
+from datetime import date
+
+import pytest
+from flask import current_app as app
+
+from my_library.db.models import Author, Book
+from my_library.spec.auto import CompiledDump
+
+from tests.mixins import AppTest
+
+
+class TestCompiledDump(AppTest):
+
+    authors = [
+        Author(name='Simone de Beauvoir', birth=date(1908, 1, 9)),
+        Author(
+            name='Albert Camus',
+            birth=date(1913, 11, 7),
+            death=date(1960, 1, 4),
+        ),
+    ]
+
+    books = [
+        Book(title='Pyrrhus et Cinéas', published=1944, authors=authors),
+        Book(title='Untitled', authors=[]),
+    ]
+
+    @pytest.fixture(scope='class', autouse=True)
+    def add_books(self, setup_app):
+        for book in self.books:
+            app.db.session.add(book)
+        app.db.session.commit()
+        yield
+        for book in self.books:
+            app.db.session.delete(book)
+        for author in self.authors:
+            app.db.session.delete(author)
+        app.db.session.commit()
+
+    @pytest.mark.parametrize('model, attr', (
+        (Author, 'authors'),
+        (Book, 'books'),
+    ))
+    @pytest.mark.parametrize('many', (False, True))
+    def test_matches_schema(self, model, attr, many):
+        """Test that compiled and schema dumps are byte-for-byte equal."""
+        items = getattr(self, attr)
+        obj = items if many else items[0]
+        context = {'limit': 5, 'total': 10, 'next': None} if many else None
+        with app.test_request_context():
+            expected, errors = model.spec(
+                context=context, many=many
+            ).dump(obj)
+            actual = model.dumper().dump(obj, many=many, context=context)
+        assert not errors
+        assert json.dumps(actual, default=str) == json.dumps(
+            expected, default=str
+        )
+
+    def test_only(self):
+        """Test that compiled dumps respect the field set."""
+        with app.test_request_context():
+            dumped = Book.dumper(only=('id', 'title')).dump(self.books[0])
+        assert dumped == {'id': self.books[0].id, 'title': 'Pyrrhus et Cinéas'}
+
+    def test_order(self):
+        """Test that keys follow the table's columns, whatever ``only``."""
+        expected = [
+            'id', 'created', 'updated', 'title', 'published', 'authors',
+            'href',
+        ]
+        with app.test_request_context():
+            dumped = Book.dumper().dump(self.books[0])
+            schema_dumped, _ = Book.spec().dump(self.books[0])
+            sparse = Book.dumper(only={'title', 'href', 'id'}).dump(
+                self.books[0]
+            )
+        assert list(dumped) == expected
+        assert list(schema_dumped) == expected
+        assert list(sparse) == ['id', 'title', 'href']
+
+    def test_cached(self):
+        """Test that dump functions are compiled once per field set."""
+        assert Book.dumper() is CompiledDump.for_schema(Book.spec)
+        assert Book.dumper(('id',)) is Book.dumper(['id'])
+        assert Book.dumper(('id',)) is not Book.dumper()
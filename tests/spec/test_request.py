@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Test request parameter parsing."""
+
+from __future__ import absolute_import, unicode_literals
+
+from datetime import date, datetime, time
+from decimal import Decimal
+
+import pytest
+
+from my_library.spec.request import (
+    cursor_value,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+class TestCursorValue(object):
+
+    @pytest.mark.parametrize('value', (
+        1,
+        'title',
+        True,
+        2.5,
+        Decimal('2.50'),
+        date(1813, 5, 5),
+        datetime(2018, 4, 1, 12, 30),
+        datetime(2018, 4, 1, 12, 30, 15, 250),
+        time(12, 30),
+    ))
+    def test_round_trip(self, value):
+        """Test that encoded values are decoded as their columns' type."""
+        (decoded,) = decode_cursor(encode_cursor([value]))
+        assert cursor_value(decoded, type(value)) == value
+
+    @pytest.mark.parametrize('value, python_type', (
+        (None, int),
+        ({'a': 1}, int),
+        ('abc', int),
+        (1.5, int),
+        (True, int),
+        (2 ** 70, int),
+        (1, bool),
+        (1, str),
+        ('abc', Decimal),
+        ([], float),
+        ('2018-13-01', date),
+        ('2018-04-01', datetime),
+        (1, date),
+    ))
+    def test_invalid(self, value, python_type):
+        with pytest.raises(ValueError):
+            cursor_value(value, python_type)
@@ -0,0 +1,117 @@
+"""Test response compression."""
+
+from __future__ import absolute_import, unicode_literals
+
+import gzip
+import zlib
+
+import pytest
+from flask import Flask, Response, jsonify
+
+from my_library.compression import Compression
+
+
+@pytest.fixture
+def compression():
+    return Compression(level=6, min_size=100, cache_size=2)
+
+
+@pytest.fixture
+def client(compression):
+    app = Flask(__name__)
+    compression.init_app(app)
+    body = {'items': [{'id': i, 'title': 'Book'} for i in range(50)]}
+
+    @app.route('/big')
+    def big():
+        response = jsonify(body)
+        response.set_etag('abc')
+        return response
+
+    @app.route('/untagged')
+    def untagged():
+        return jsonify(body)
+
+    @app.route('/small')
+    def small():
+        return jsonify({})
+
+    @app.route('/binary')
+    def binary():
+        return Response(b'\0' * 1000, mimetype='application/octet-stream')
+
+    @app.route('/streamed')
+    def streamed():
+        return Response(
+            ('"{}"'.format(i) for i in range(100)),
+            mimetype='application/json',
+        )
+
+    return app.test_client()
+
+
+def get(client, path, encoding='gzip'):
+    return client.get(path, headers={'Accept-Encoding': encoding})
+
+
+class TestCompression(object):
+
+    @pytest.mark.parametrize('encoding, decompress', (
+        ('gzip', gzip.decompress),
+        ('deflate', zlib.decompress),
+        ('deflate, gzip;q=0.5', zlib.decompress),
+    ))
+    def test_compressed(self, client, encoding, decompress):
+        """Test that responses are compressed with the best encoding."""
+        plain = client.get('/big')
+        resp = get(client, '/big', encoding)
+        assert resp.headers['Content-Encoding'] == encoding.split(',')[0]
+        assert 'Accept-Encoding' in resp.headers['Vary']
+        assert decompress(resp.data) == plain.data
+        assert len(resp.data) < len(plain.data)
+
+    def test_etag_weakened(self, client):
+        """Test that compressed responses carry weak ETags."""
+        assert client.get('/big').headers['ETag'] == '"abc"'
+        assert get(client, '/big').headers['ETag'] == 'W/"abc"'
+
+    @pytest.mark.parametrize('path, encoding', (
+        ('/big', 'identity'),
+        ('/big', 'gzip;q=0'),
+        ('/small', 'gzip'),
+        ('/binary', 'gzip'),
+    ))
+    def test_not_compressed(self, client, path, encoding):
+        """Test responses which must not be compressed."""
+        resp = get(client, path, encoding)
+        assert 'Content-Encoding' not in resp.headers
+
+    def test_streamed(self, client):
+        """Test that streamed responses are compressed as they stream."""
+        plain = client.get('/streamed')
+        resp = get(client, '/streamed')
+        assert resp.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(resp.data) == plain.data
+
+    def test_cached(self, client, compression, monkeypatch):
+        """Test that bodies are compressed once per ETag."""
+        calls = []
+        compress = compression.compress
+
+        def counting(data, encoding):
+            calls.append(encoding)
+            return compress(data, encoding)
+
+        monkeypatch.setattr(compression, 'compress', counting)
+        for path in ('/big', '/big', '/untagged', '/untagged'):
+            assert get(client, path).headers['Content-Encoding'] == 'gzip'
+        get(client, '/big', 'deflate')
+        assert calls == ['gzip', 'gzip', 'gzip', 'deflate']
+        compression.clear()
+        get(client, '/big')
+        assert len(calls) == 5
+
+    def test_level_zero(self, client, compression):
+        """Test that compression is disabled at level 0."""
+        compression.level = 0
+        assert 'Content-Encoding' not in get(client, '/big').headers
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Test exporting models to files."""
+
+from __future__ import absolute_import, unicode_literals
+
+import csv
+import gzip
+import io
+import json
+from collections import OrderedDict
+from datetime import date
+from os import path
+
+import pytest
+from flask import current_app as app
+
+from my_library.cli import export_command
+from my_library.db.models import Author, Book
+from my_library.export import Exporter, checkpoint_path, read_checkpoint
+
+from tests.mixins import AppTest
+
+
+class Interrupted(Exception):
+    """Raised to interrupt an export."""
+
+
+def read(output, compress=False):
+    """Return the text of an export."""
+    opener = gzip.open if compress else io.open
+    with opener(output, 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+class ExportTest(AppTest):
+
+    @pytest.fixture(scope='class', autouse=True)
+    def add_books(self, setup_app):
+        session = app.db.session
+        author = Author(name='Søren Kierkegaard', birth=date(1813, 5, 5))
+        session.add(author)
+        session.add_all(
+            Book(title='Book, "{}"'.format(i), authors=[author])
+            for i in range(25)
+        )
+        session.commit()
+        author_id = author.id
+        session.expunge_all()
+        yield
+        author = session.query(Author).get(author_id)
+        for book in author.books:
+            session.delete(book)
+        session.delete(author)
+        session.commit()
+
+    @pytest.fixture
+    def items(self):
+        """The dumped books, in id order."""
+        with app.test_request_context():
+            books = app.db.session.query(Book).order_by(Book.id)
+            return [Book.dumper().dump_one(book) for book in books]
+
+    @pytest.fixture
+    def exporter(self):
+        def exporter(format='ndjson', compress=False):
+            return Exporter(app.db.session, Book, format, compress, 10)
+        return exporter
+
+
+class TestExport(ExportTest):
+
+    def export(self, exporter, output, **kwargs):
+        with app.test_request_context():
+            return exporter.export(str(output), **kwargs)
+
+    @pytest.mark.parametrize('compress', (False, True))
+    def test_ndjson(self, exporter, items, tmpdir, compress):
+        """Test that each row is exported as a line of its dump."""
+        output = tmpdir.join('books.ndjson')
+        assert self.export(exporter(compress=compress), output) == len(items)
+        lines = read(str(output), compress).splitlines()
+        assert [json.loads(line) for line in lines] == items
+        assert not path.exists(checkpoint_path(str(output)))
+
+    def test_csv(self, exporter, items, tmpdir):
+        """Test that rows are exported after a single header row."""
+        output = tmpdir.join('books.csv')
+        self.export(exporter('csv', compress=True), output)
+        rows = list(csv.DictReader(io.StringIO(read(str(output), True))))
+        assert [row['title'] for row in rows] == [
+            item['title'] for item in items
+        ]
+        assert json.loads(rows[0]['authors']) == items[0]['authors']
+
+    def test_unknown_format(self):
+        with pytest.raises(ValueError):
+            Exporter(app.db.session, Book, 'xml')
+
+    @pytest.mark.parametrize('format', ('ndjson', 'csv'))
+    @pytest.mark.parametrize('compress', (False, True))
+    def test_resume(self, exporter, tmpdir, format, compress):
+        """Test that an interrupted export resumes from its checkpoint."""
+        complete = tmpdir.join('complete')
+        output = tmpdir.join('resumed')
+        self.export(exporter(format, compress), complete)
+        written = []
+
+        def interrupt(last_id, offset, rows):
+            written.append(rows)
+            if len(written) == 2:
+                raise Interrupted()
+
+        with pytest.raises(Interrupted):
+            self.export(exporter(format, compress), output, on_batch=interrupt)
+        checkpoint = read_checkpoint(str(output))
+        assert checkpoint['rows'] == 20
+        # Bytes written after the checkpoint are discarded.
+        with io.open(str(output), 'ab') as f:
+            f.write(b'partial')
+
+        count = self.export(exporter(format, compress), output, resume=True)
+        assert count == 5
+        assert output.read_binary() == complete.read_binary()
+        assert read_checkpoint(str(output)) is None
+
+    def test_resume_columns(self, exporter, items, tmpdir, monkeypatch):
+        """Test that resumed CSV rows follow the columns of the header."""
+        output = tmpdir.join('books.csv')
+
+        def interrupt(last_id, offset, rows):
+            raise Interrupted()
+
+        with pytest.raises(Interrupted):
+            self.export(exporter('csv'), output, on_batch=interrupt)
+        assert read_checkpoint(str(output))['columns'] == list(items[0])
+
+        # Dumps of another process may have their keys in another order.
+        resumed = exporter('csv')
+        batches = resumed.batches
+        monkeypatch.setattr(resumed, 'batches', lambda after: (
+            [OrderedDict(reversed(list(item.items()))) for item in batch]
+            for batch in batches(after)
+        ))
+        self.export(resumed, output, resume=True)
+        text = read(str(output))
+        assert text.splitlines()[0] == ','.join(items[0])
+        rows = list(csv.DictReader(io.StringIO(text)))
+        assert [row['id'] for row in rows] == [
+            str(item['id']) for item in items
+        ]
+        assert [row['title'] for row in rows] == [
+            item['title'] for item in items
+        ]
+
+    def test_resume_other_export(self, exporter, tmpdir):
+        """Test that checkpoints of different exports are rejected."""
+        output = tmpdir.join('books')
+
+        def interrupt(last_id, offset, rows):
+            raise Interrupted()
+
+        with pytest.raises(Interrupted):
+            self.export(exporter(), output, on_batch=interrupt)
+        with pytest.raises(ValueError):
+            self.export(exporter('csv'), output, resume=True)
+
+    def test_no_checkpoint(self, exporter, items, tmpdir):
+        """Test that resuming without a checkpoint exports everything."""
+        output = tmpdir.join('books.ndjson')
+        output.write('stale\n')
+        assert self.export(exporter(), output, resume=True) == len(items)
+        assert 'stale' not in read(str(output))
+
+
+class TestExportCommand(ExportTest):
+
+    @pytest.fixture(autouse=True)
+    def ascii_locale(self, monkeypatch):
+        """Let click run in test environments with an ASCII locale."""
+        monkeypatch.setattr(
+            'click.core._verify_python_env', lambda: None, raising=False
+        )
+
+    def invoke(self, *args):
+        runner = app.test_cli_runner()
+        return runner.invoke(export_command, args, catch_exceptions=False)
+
+    def test_command(self, items, tmpdir):
+        """Test that the format and compression follow the extension."""
+        output = str(tmpdir.join('books.csv.gz'))
+        result = self.invoke('books', output, '--batch-size', '7')
+        assert result.exit_code == 0
+        assert 'Exported 25 Book rows' in result.output
+        rows = list(csv.DictReader(io.StringIO(read(output, True))))
+        assert len(rows) == len(items)
+
+    def test_stdout(self, items):
+        result = self.invoke('Book', '-', '--format', 'ndjson')
+        assert result.exit_code == 0
+        lines = [
+            line for line in result.output.splitlines()
+            if line.startswith('{')
+        ]
+        assert [json.loads(line) for line in lines] == items
+
+    def test_unknown_model(self, tmpdir):
+        result = self.invoke('shelves', str(tmpdir.join('out')))
+        assert result.exit_code == 2
+        assert 'authors' in result.output
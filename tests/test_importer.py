@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""Test importing models from files."""
+
+from __future__ import absolute_import, unicode_literals
+
+import io
+import json
+from datetime import date
+
+import pytest
+from flask import current_app as app
+
+from my_library.cli import import_command
+from my_library.db.models import Author, Book
+from my_library.export import Exporter
+from my_library.importer import (
+    IdAllocator,
+    Importer,
+    batched,
+    read_csv,
+    read_ndjson,
+)
+
+from tests.mixins import AppTest
+
+
+class ImportTest(AppTest):
+
+    @pytest.fixture(autouse=True)
+    def clean(self, setup_app):
+        """Delete the rows imported by each test."""
+        yield
+        session = app.db.session
+        session.rollback()
+        for model in (Book, Author):
+            for item in session.query(model):
+                session.delete(item)
+        session.commit()
+
+    @pytest.fixture
+    def author_id(self):
+        session = app.db.session
+        author = Author(name='Jean-Paul Sartre', birth=date(1905, 6, 21))
+        session.add(author)
+        session.commit()
+        return author.id
+
+    def books(self):
+        """Return the imported books' titles and authors' names."""
+        app.db.session.expire_all()
+        return [
+            (book.title, [author.name for author in book.authors])
+            for book in app.db.session.query(Book).order_by(Book.id)
+        ]
+
+
+class TestImporter(ImportTest):
+
+    def importer(self, model=Book, **kwargs):
+        kwargs.setdefault('batch_size', 2)
+        kwargs.setdefault('transaction_size', 3)
+        return Importer(app.db.session, model, **kwargs)
+
+    def test_insert(self, author_id):
+        """Test that items are inserted with links to related ids."""
+        items = [
+            {'title': 'La Nausée', 'published': 1938, 'authors': [author_id]},
+            {'title': 'Huis Clos', 'authors': [{'id': author_id}]},
+            {'title': 'Anonymous'},
+        ]
+        counts = self.importer().run(items)
+        assert counts == {
+            'created': 3, 'updated': 0, 'invalid': 0, 'related': 0
+        }
+        assert self.books() == [
+            ('La Nausée', ['Jean-Paul Sartre']),
+            ('Huis Clos', ['Jean-Paul Sartre']),
+            ('Anonymous', []),
+        ]
+
+    def test_related_by_name(self, author_id):
+        """Test that related items are found, or created once, by name."""
+        kierkegaard = {'name': 'Søren Kierkegaard', 'birth': '1813-05-05'}
+        items = [
+            {'title': 'Either/Or', 'authors': [kierkegaard]},
+            {'title': 'Fear and Trembling', 'authors': ['Søren Kierkegaard']},
+            {'title': 'Repetition', 'authors': [kierkegaard]},
+            {'title': 'Being', 'authors': ['Jean-Paul Sartre', kierkegaard]},
+        ]
+        counts = self.importer().run(items)
+        assert counts['created'] == 4
+        assert counts['related'] == 1
+        assert app.db.session.query(Author).count() == 2
+        assert self.books()[-1] == (
+            'Being', ['Jean-Paul Sartre', 'Søren Kierkegaard']
+        )
+
+    def test_invalid(self, author_id):
+        """Test that invalid items are reported, and others written."""
+        importer = self.importer()
+        items = [
+            {'title': 'Nameless', 'authors': [{'name': 'No Birth'}]},
+            {'published': 1843},
+            {'title': 'Unknown', 'authors': [author_id + 1000]},
+            'not an item',
+            {'title': 'Valid'},
+        ]
+        counts = importer.run(items)
+        assert counts['created'] == 1
+        assert counts['invalid'] == 4
+        assert [index for index, _ in importer.errors] == [0, 1, 2, 3]
+        assert 'birth' in importer.errors[0][1]['authors'][0]
+        assert 'title' in importer.errors[1][1]
+        assert self.books() == [('Valid', [])]
+
+    def test_update(self, author_id):
+        """Test that items with existing ids are updated."""
+        self.importer().run([{'title': 'Draft', 'authors': [author_id]}])
+        (book,) = app.db.session.query(Book).all()
+        counts = self.importer().run([
+            {'id': book.id, 'title': 'Final', 'authors': []},
+            {'id': book.id + 10, 'title': 'Given id'},
+            {'title': 'Next'},
+        ])
+        assert counts['created'] == 2
+        assert counts['updated'] == 1
+        ids = [id for id, in app.db.session.query(Book.id).order_by(Book.id)]
+        assert ids == [book.id, book.id + 10, book.id + 11]
+        assert self.books()[0] == ('Final', [])
+
+    def test_no_links(self, author_id):
+        """Test that links may be left out, e.g. to import in any order."""
+        items = [{'title': 'Book', 'authors': [author_id + 1000]}]
+        counts = self.importer(links=False).run(items)
+        assert counts['created'] == 1
+        assert self.books() == [('Book', [])]
+
+    def test_skip(self):
+        """Test that skipped items are not imported."""
+        items = [{'title': str(i)} for i in range(5)]
+        self.importer().run(items, skip=3)
+        assert [title for title, _ in self.books()] == ['3', '4']
+
+    def test_commits(self):
+        """Test that transactions are committed every transaction_size."""
+        committed = []
+        items = [{'title': str(i)} for i in range(7)]
+        self.importer().run(items, on_commit=committed.append)
+        assert committed == [4, 7]
+
+    def test_rollback(self):
+        """Test that uncommitted items are rolled back on errors."""
+        def items():
+            for i in range(5):
+                yield {'title': str(i)}
+            raise RuntimeError()
+
+        with pytest.raises(RuntimeError):
+            self.importer().run(items())
+        assert len(self.books()) == 4
+
+    def test_round_trip(self, author_id, tmpdir):
+        """Test that exported books are imported as they were."""
+        self.importer().run([
+            {'title': 'Book, "{}"'.format(i), 'authors': [author_id]}
+            for i in range(3)
+        ])
+        books = self.books()
+        output = str(tmpdir.join('books.csv'))
+        with app.test_request_context():
+            Exporter(app.db.session, Book, 'csv').export(output)
+        for book in app.db.session.query(Book):
+            app.db.session.delete(book)
+        app.db.session.commit()
+        with io.open(output, encoding='utf-8', newline='') as lines:
+            counts = self.importer().run(read_csv(lines, Book))
+        assert counts['created'] == 3
+        assert self.books() == books
+
+
+class TestReaders(object):
+
+    def test_ndjson(self):
+        lines = ['{"title": "a"}\n', '\n', '{"title": "b"}\n']
+        assert list(read_ndjson(lines)) == [{'title': 'a'}, {'title': 'b'}]
+
+    def test_csv(self):
+        """Test that empty cells are null, and relationships decoded."""
+        lines = io.StringIO(
+            'title,published,authors\r\n'
+            '"a, b",,"[1,{""name"":""x""}]"\r\n'
+        )
+        assert list(read_csv(lines, Book)) == [{
+            'title': 'a, b',
+            'published': None,
+            'authors': [1, {'name': 'x'}],
+        }]
+
+    def test_batched(self):
+        assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+class TestIdAllocator(ImportTest):
+
+    def test_allocate(self, author_id):
+        """Test that ids follow the table's, and those of the import."""
+        allocator = IdAllocator(app.db.session, Author.__table__)
+        allocator.see(author_id + 5)
+        assert allocator.allocate(2) == [author_id + 6, author_id + 7]
+        allocator.see(author_id + 20)
+        assert allocator.allocate(1) == [author_id + 21]
+
+
+class TestImportCommand(ImportTest):
+
+    @pytest.fixture(autouse=True)
+    def ascii_locale(self, monkeypatch):
+        """Let click run in test environments with an ASCII locale."""
+        monkeypatch.setattr(
+            'click.core._verify_python_env', lambda: None, raising=False
+        )
+
+    def test_command(self, tmpdir):
+        """Test that items are imported, and the rate reported."""
+        path = tmpdir.join('books.ndjson')
+        path.write_binary(''.join(
+            json.dumps({'title': str(i), 'authors': [
+                {'name': 'Søren Kierkegaard', 'birth': '1813-05-05'}
+            ]}) + '\n'
+            for i in range(5)
+        ).encode('utf-8') + b'{}\n')
+        runner = app.test_cli_runner()
+        result = runner.invoke(
+            import_command,
+            ['books', str(path), '--batch-size', '2'],
+            catch_exceptions=False,
+        )
+        assert result.exit_code == 0
+        assert 'Imported 6 Book items' in result.output
+        assert '5 created, 0 updated, 1 invalid, 1 related' in result.output
+        assert 'rows/s' in result.output
+        assert 'Item 5:' in result.output
+        assert len(self.books()) == 5
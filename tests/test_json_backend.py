@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Test JSON backends."""
+
+from __future__ import absolute_import, unicode_literals
+
+import json
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from uuid import UUID
+
+import pytest
+from flask import Flask, current_app as app
+
+from my_library.db.models import Author
+from my_library.json_backend import (
+    BACKENDS,
+    EXTENSION,
+    JSONBackend,
+    current_backend,
+    get_backend,
+)
+from my_library.resources.books import BooksResource
+
+from tests.client import Client
+from tests.mixins import AppTest
+
+
+def installed():
+    """Return the names of the installed backends."""
+    names = []
+    for name in BACKENDS:
+        try:
+            get_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+VALUE = {
+    'title': 'Ønskebørn, "Either/Or"',
+    'href': '/books/1',
+    'birth': date(1813, 5, 5),
+    'created': datetime(2018, 4, 1, 12, 30, 15, 250, tzinfo=timezone.utc),
+    'naive': datetime(2018, 4, 1, 12, 30),
+    'at': time(9, 15),
+    'price': Decimal('12.5'),
+    'uuid': UUID('12345678123456781234567812345678'),
+    'nested': [{'id': 1, 'ok': True, 'none': None, 'ratio': 0.25}],
+}
+
+
+class TestBackends(object):
+
+    @pytest.mark.parametrize('name', installed())
+    def test_same_text(self, name):
+        """Test that every backend encodes values to the same text."""
+        assert get_backend(name).dumps(VALUE) == get_backend('json').dumps(
+            VALUE
+        )
+
+    @pytest.mark.parametrize('name', installed())
+    def test_encoding(self, name):
+        """Test that dates, decimals and UUIDs are encoded."""
+        backend = get_backend(name)
+        text = backend.dumps(VALUE)
+        assert '"/books/1"' in text
+        assert 'Ønskebørn' in text
+        decoded = backend.loads(text)
+        assert decoded['birth'] == '1813-05-05'
+        assert decoded['created'] == '2018-04-01T12:30:15.000250+00:00'
+        assert decoded['naive'] == '2018-04-01T12:30:00'
+        assert decoded['at'] == '09:15:00'
+        assert decoded['price'] == 12.5
+        assert decoded['uuid'] == '12345678-1234-5678-1234-567812345678'
+        assert decoded == backend.loads(text.encode('utf-8'))
+
+    @pytest.mark.parametrize('name', installed())
+    def test_unsupported(self, name):
+        """Test that values which can't be encoded raise TypeError."""
+        with pytest.raises(TypeError):
+            get_backend(name).dumps({'value': object()})
+
+    def test_settings(self):
+        """Test that keyword arguments are passed to the standard library."""
+        text = get_backend().dumps({'birth': date(1813, 5, 5)}, indent=2)
+        assert text == '{\n  "birth": "1813-05-05"\n}'
+
+    def test_auto(self):
+        """Test that the first installed backend is used by default."""
+        assert get_backend().name == installed()[0]
+        assert get_backend('auto') is get_backend(installed()[0])
+
+    def test_unknown(self):
+        with pytest.raises(ValueError):
+            get_backend('simplejson')
+
+    def test_current(self):
+        """Test that the app's backend is current, or else the stdlib's."""
+        assert current_backend().name == 'json'
+        flask_app = Flask(__name__)
+        backend = JSONBackend('spy', json.dumps, json.loads)
+        backend.init_app(flask_app)
+        with flask_app.app_context():
+            assert current_backend() is backend
+        with Flask(__name__).app_context():
+            assert current_backend().name == 'json'
+
+
+class TestAppBackend(AppTest):
+
+    @pytest.fixture
+    def spy(self, monkeypatch):
+        """Count the values encoded by the app's backend."""
+        backend = app.extensions[EXTENSION]
+        encoded = []
+
+        def dumps(obj):
+            encoded.append(obj)
+            return json.dumps(obj)
+
+        monkeypatch.setattr(backend, '_dumps', dumps)
+        return encoded
+
+    def test_responses(self, spy):
+        """Test that responses are encoded with the app's backend."""
+        resp = Client(app).get(BooksResource.path)
+        assert resp.status_code == 200
+        assert spy == [resp.json()]
+
+    def test_streamed(self, spy):
+        """Test that streamed responses are encoded with the backend."""
+        resp = Client(app).get(BooksResource.path + '?stream=true')
+        assert resp.json()['items'] == []
+        assert spy
+
+    def test_models(self, spy):
+        """Test that model specs encode and decode with the backend."""
+        author = Author(name='Søren Kierkegaard', birth=date(1813, 5, 5))
+        assert Author.spec.Meta.json_module is app.extensions[EXTENSION]
+        fields = ('name', 'birth')
+        text, errors = author.dumps(only=fields)
+        assert not errors
+        assert spy == [{'name': author.name, 'birth': '1813-05-05'}]
+        loaded, errors = author.loads(
+            text, only=fields, session=app.db.session
+        )
+        assert not errors
+        assert loaded.birth == author.birth
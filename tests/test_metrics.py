@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Test the metrics endpoint."""
+
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+from flask import Flask, current_app as app
+from prometheus_client import values
+from prometheus_client.parser import text_string_to_metric_families
+
+from my_library.metrics import EXTENSION, Metrics
+from my_library.resources.books import BooksResource
+
+from tests.client import Client
+from tests.http import Status
+from tests.mixins import AppTest
+
+
+def samples(text):
+    """Return the samples of exposed metrics, by name and labels."""
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(text)
+        for sample in family.samples
+    }
+
+
+def labels(**kwargs):
+    return tuple(sorted(kwargs.items()))
+
+
+class TestMetrics(AppTest):
+
+    def scrape(self):
+        resp = Client(app).get(app.extensions[EXTENSION].path)
+        assert Status.good(resp)
+        assert resp.headers['Content-Type'].startswith('text/plain')
+        return samples(resp.get_data(as_text=True))
+
+    def test_requests(self):
+        """Test that requests are counted and observed by endpoint."""
+        get = labels(endpoint='books', method='GET')
+        before = self.scrape()
+        assert Status.good(Client(app).get(BooksResource.path))
+        after = self.scrape()
+
+        def delta(name, **extra):
+            key = (name, tuple(sorted(get + tuple(extra.items()))))
+            return after[key] - before.get(key, 0)
+
+        assert delta('http_requests_total', status='200') == 1
+        assert delta('http_request_duration_seconds_count') == 1
+        assert delta('http_request_duration_seconds_sum') > 0
+        assert delta('http_response_size_bytes_count') == 1
+        assert delta('http_request_db_seconds_sum') > 0
+        assert delta('http_request_serialization_seconds_count') == 1
+        assert after[('http_requests_in_progress', get)] == 0
+
+    def test_unknown_endpoint(self):
+        """Test that unrouted requests share a label."""
+        Client(app).get('/no/such/path')
+        after = self.scrape()
+        key = labels(endpoint='unknown', method='GET', status='404')
+        assert after[('http_requests_total', key)] >= 1
+
+    def test_metrics_not_observed(self):
+        self.scrape()
+        assert not any(
+            dict(key).get('endpoint') == EXTENSION
+            for _, key in self.scrape()
+        )
+
+
+class TestMultiprocess(object):
+
+    @pytest.fixture
+    def multiprocess(self, monkeypatch, tmpdir):
+        """Write metrics to files, as if from process ``pids[0]``."""
+        monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmpdir))
+        pids = [1001]
+        monkeypatch.setattr(
+            values, 'ValueClass', values.MultiProcessValue(lambda: pids[0])
+        )
+        return pids
+
+    def test_aggregation(self, multiprocess):
+        """Test that the metrics of all processes are exposed."""
+        metrics_app = Flask(__name__)
+        metrics_app.add_url_rule('/ping', 'ping', lambda: 'pong')
+        Metrics().init_app(metrics_app)
+        client = metrics_app.test_client()
+        client.get('/ping')
+        # Another worker process serves the next request.
+        multiprocess[0] = 1002
+        client.get('/ping')
+        exposed = samples(client.get('/metrics').get_data(as_text=True))
+        key = labels(endpoint='ping', method='GET', status='200')
+        assert exposed[('http_requests_total', key)] == 2
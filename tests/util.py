@@ -1,11 +1,14 @@
 """Test utilities."""
 
+from contextlib import contextmanager
 from os import environ, path, mkdir
 from shlex import split
 from uuid import uuid4
 from subprocess import Popen
 from sys import exit
 
+from sqlalchemy import event
+
 
 REPO_DIR = path.abspath(
     path.join(path.realpath(path.dirname(__file__)), '..')
@@ -37,3 +40,21 @@ def local_db():
         pass
     environ['DB_HOST'] = DB_PATH
     environ['DB_ENGINE'] = 'sqlite'
+
+
+@contextmanager
+def count_queries(engine):
+    """Count the statements executed against the engine.
+
+    Yields a list, to which each executed statement is appended.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+"""Benchmark hot paths of the application.
+
+Benchmarks run against an in-memory SQLite database populated with
+generated books and authors.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import random
+import shutil
+import tempfile
+import threading
+from datetime import date
+from os import environ, path
+from timeit import default_timer
+
+import click
+from sqlalchemy.exc import OperationalError
+
+
+def make_app():
+    """Return an application backed by a fresh in-memory database."""
+    environ['DB_ENGINE'] = 'memory'
+    from my_library.app import create_app
+    from my_library.db.models.base import Base
+    app = create_app()
+    with app.app_context():
+        Base.metadata.create_all(app.db.engine)
+    return app
+
+
+def make_file_app(directory, profile, pool_size=0):
+    """Return an application backed by a fresh SQLite database file."""
+    environ['DB_ENGINE'] = 'sqlite'
+    environ['DB_POOL_SIZE'] = str(pool_size)
+    environ['DB_HOST'] = path.join(directory, '{}.sqlite'.format(profile))
+    environ['SQLITE_PROFILE'] = profile
+    from my_library.app import create_app
+    from my_library.db.models.base import Base
+    app = create_app()
+    with app.app_context():
+        Base.metadata.create_all(app.db.engine)
+    return app
+
+
+def populate(app, rows, authors_per_book=2):
+    """Insert ``rows`` books, each with ``authors_per_book`` authors."""
+    models = app.db.models
+    authors = [
+        models.Author(name='Author {}'.format(i), birth=date(1900, 1, 1))
+        for i in range(max(rows // 10, authors_per_book))
+    ]
+    app.db.session.add_all(authors)
+    for i in range(rows):
+        app.db.session.add(
+            models.Book(
+                title='Book {}'.format(i),
+                published=1900 + i % 100,
+                authors=[
+                    authors[(i + j) % len(authors)]
+                    for j in range(authors_per_book)
+                ],
+            )
+        )
+    app.db.session.commit()
+
+
+def timed(func, repeat):
+    """Return the best wall time of ``repeat`` calls to ``func``."""
+    best = None
+    for _ in range(repeat):
+        start = default_timer()
+        func()
+        elapsed = default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(name, seconds, rows, baseline=None):
+    """Echo a benchmark result line."""
+    line = '{:<24} {:>9.1f} ms {:>12,.0f} rows/s'.format(
+        name, seconds * 1000, rows / seconds
+    )
+    if baseline is not None:
+        line += '  ({:.1f}x)'.format(baseline / seconds)
+    click.echo(line)
+
+
+@click.group()
+def cli():
+    """Run benchmarks."""
+
+
+@cli.command()
+@click.option('--rows', default=10000, help='rows per page')
+@click.option('--repeat', default=5, help='timing repetitions')
+def serialization(rows, repeat):
+    """Compare marshmallow and compiled dumps of a collection page."""
+    app = make_app()
+    with app.app_context():
+        populate(app, rows)
+        Book = app.db.models.Book
+        page = (
+            app.db.session.query(Book)
+            .options(*Book.eager_options)
+            .limit(rows)
+            .all()
+        )
+        context = {'limit': rows, 'offset': 0, 'total': rows}
+        with app.test_request_context():
+            schema_result = Book.spec(context=context, many=True).dump(page)
+            compiled_result = Book.dumper().dump(
+                page, many=True, context=context
+            )
+            assert schema_result.data == compiled_result
+
+            marshmallow = timed(
+                lambda: Book.spec(context=context, many=True).dump(page),
+                repeat,
+            )
+            compiled = timed(
+                lambda: Book.dumper().dump(page, many=True, context=context),
+                repeat,
+            )
+    report('marshmallow', marshmallow, rows)
+    report('compiled', compiled, rows, baseline=marshmallow)
+
+
+@cli.command()
+@click.option('--rows', default=1000, help='rows per page')
+@click.option('--repeat', default=5, help='timing repetitions')
+def reads(rows, repeat):
+    """Compare ORM and record loading of a collection page request."""
+    from my_library.resources.books import BooksResource
+    from my_library.resources.resource import ModelResource
+    app = make_app()
+    with app.app_context():
+        populate(app, rows)
+        client = app.test_client()
+        path = '{}?limit={}&stream=false'.format(BooksResource.path, rows)
+
+        def get(fast):
+            ModelResource.fast_reads = fast
+            app.db.session.remove()
+            return client.get(path).get_data()
+
+        try:
+            assert get(False) == get(True)
+            orm = timed(lambda: get(False), repeat)
+            fast = timed(lambda: get(True), repeat)
+        finally:
+            ModelResource.fast_reads = True
+    report('orm', orm, rows)
+    report('records', fast, rows, baseline=orm)
+
+
+@cli.command('json')
+@click.option('--sizes', default='20,100,1000,10000',
+              help='comma-separated page sizes')
+@click.option('--repeat', default=5, help='timing repetitions')
+def json_(sizes, repeat):
+    """Compare JSON backends encoding dumped collection pages."""
+    from my_library.json_backend import BACKENDS, get_backend
+    sizes = [int(size) for size in sizes.split(',')]
+    backends = []
+    for name in BACKENDS:
+        try:
+            backends.append(get_backend(name))
+        except ImportError:
+            click.echo('{:<24} not installed'.format(name))
+    app = make_app()
+    with app.app_context():
+        populate(app, max(sizes))
+        Book = app.db.models.Book
+        with app.test_request_context():
+            books = (
+                app.db.session.query(Book)
+                .options(*Book.eager_options)
+                .limit(max(sizes))
+                .all()
+            )
+            pages = {
+                size: Book.dumper().dump(
+                    books[:size],
+                    many=True,
+                    context={'limit': size, 'offset': 0, 'total': size},
+                )
+                for size in sizes
+            }
+    for size in sizes:
+        page = pages[size]
+        click.echo('{} rows ({:,} bytes):'.format(
+            size, len(backends[-1].dumps(page).encode('utf-8'))
+        ))
+        baseline = timed(lambda: backends[-1].dumps(page), repeat)
+        for backend in backends:
+            assert backend.dumps(page) == backends[-1].dumps(page)
+            report(
+                '  ' + backend.name,
+                timed(lambda: backend.dumps(page), repeat),
+                size,
+                baseline=baseline,
+            )
+
+
+def run_concurrently(app, readers, writers, seconds, rows):
+    """Read and update random books from threads for ``seconds``.
+
+    :returns: the numbers of reads, writes, and lock errors
+    :rtype: tuple
+    """
+    Book = app.db.models.Book
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = default_timer() + seconds
+
+    def work(write):
+        done = errors = 0
+        with app.app_context():
+            session = app.db.session
+            while default_timer() < deadline:
+                book_id = random.randint(1, rows)
+                try:
+                    book = session.query(Book).get(book_id)
+                    if write:
+                        book.published = 1900 + done % 100
+                    session.commit()
+                    done += 1
+                except OperationalError:
+                    session.rollback()
+                    errors += 1
+            session.remove()
+        with lock:
+            counts['writes' if write else 'reads'] += done
+            counts['errors'] += errors
+
+    threads = [
+        threading.Thread(target=work, args=(write,))
+        for write in [False] * readers + [True] * writers
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts['reads'], counts['writes'], counts['errors']
+
+
+@cli.command('sqlite')
+@click.option('--rows', default=1000, help='books in the database')
+@click.option('--readers', default=4, help='reading threads')
+@click.option('--writers', default=1, help='writing threads')
+@click.option('--seconds', default=5.0, help='duration of each run')
+@click.option('--pool-size', default=0,
+              help='per-thread connections kept (0 connects per checkout)')
+def sqlite(rows, readers, writers, seconds, pool_size):
+    """Compare concurrent SQLite throughput of the pragma profiles."""
+    directory = tempfile.mkdtemp()
+    baseline = None
+    try:
+        for profile in ('default', 'throughput'):
+            app = make_file_app(directory, profile, pool_size)
+            with app.app_context():
+                populate(app, rows)
+                app.db.session.remove()
+            reads, writes, errors = run_concurrently(
+                app, readers, writers, seconds, rows
+            )
+            total = (reads + writes) / seconds
+            line = '{:<12} {:>9,.0f} reads/s {:>9,.0f} writes/s'.format(
+                profile, reads / seconds, writes / seconds
+            )
+            line += ' {:>6} lock errors'.format(errors)
+            if baseline is not None:
+                line += '  ({:.1f}x)'.format(total / baseline)
+            baseline = baseline or total
+            click.echo(line)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    cli()  # pylint: disable=E1120